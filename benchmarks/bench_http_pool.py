@@ -0,0 +1,98 @@
+"""
+Latency of LLM calls with and without a pooled HTTP client.
+
+Sends the same prompts to the local mock LLM server in three ways:
+
+- cold: a new HTTP client (and connection) for every call
+- litellm: LiteLLM defaults, with the clients it caches internally
+- pooled: the ClientPool used by screening sessions
+
+and reports p50/p99 latency. The mock server speaks plain HTTP, so TLS
+handshakes, which a cold client pays against a real provider, are not
+included: the gap with a hosted API is larger.
+
+    python benchmarks/bench_http_pool.py --calls 500
+"""
+
+import argparse
+import datetime
+import json
+from pathlib import Path
+import time
+
+import httpx
+import numpy as np
+import openai
+
+import screenie
+from screenie.clients import ClientPool
+import screenie.llm as llm
+from screenie.mock import MockLLMServer
+from screenie.recipes import Model, Recipe
+
+
+RESULTS_FILE = Path(__file__).parent / "results" / "http_pool.jsonl"
+
+CREDENTIALS = {"api_key": "mock-key"}
+
+
+def measure(recipe, calls: int, client_kwargs) -> list[float]:
+    latencies = []
+    for i in range(calls):
+        kwargs, cleanup = client_kwargs()
+        start = time.perf_counter()
+        llm.send_prompt(recipe, f"Title: study {i}", CREDENTIALS, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        cleanup()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock LLM latency in seconds")
+    args = parser.parse_args()
+
+    result = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "version": screenie.__version__,
+        "calls": args.calls,
+        "mock_latency": args.latency,
+    }
+
+    with MockLLMServer(latency=args.latency) as server:
+        recipe = Recipe(model=Model(model="openai/mock", base_url=server.base_url), prompt="", criteria="")
+        pool = ClientPool()
+
+        def cold():
+            http_client = httpx.Client()
+            client = openai.OpenAI(api_key=CREDENTIALS["api_key"], base_url=server.base_url, http_client=http_client)
+            return {"client": client}, client.close
+
+        def litellm_default():
+            return {}, lambda: None
+
+        def pooled():
+            return pool.request_kwargs(recipe.model, CREDENTIALS), lambda: None
+
+        # Warm up imports and caches
+        measure(recipe, 5, litellm_default)
+
+        for name, client_kwargs in (("cold", cold), ("litellm", litellm_default), ("pooled", pooled)):
+            latencies = measure(recipe, args.calls, client_kwargs)
+            result[f"{name}_p50_ms"] = 1000 * float(np.percentile(latencies, 50))
+            result[f"{name}_p99_ms"] = 1000 * float(np.percentile(latencies, 99))
+            print(f"{name:<8} p50 {result[f'{name}_p50_ms']:7.2f} ms   p99 {result[f'{name}_p99_ms']:7.2f} ms")
+
+        pool.close()
+
+    improvement = 1 - result["pooled_p50_ms"] / result["cold_p50_ms"]
+    print(f"Pooled p50 is {improvement:.0%} lower than with a cold client per call")
+
+    RESULTS_FILE.parent.mkdir(exist_ok=True)
+    with open(RESULTS_FILE, "a") as f:
+        f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
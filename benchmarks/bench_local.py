@@ -0,0 +1,162 @@
+"""
+Screening throughput of a local model on CPU against a hosted model.
+
+Screens the same synthetic studies through the pipeline used by
+`screenie run`, once per backend:
+
+- local: an OpenAI-compatible server on this machine, e.g. llama.cpp
+      llama-server -m qwen2.5-1.5b-instruct-q4_k_m.gguf --parallel 4 --port 8080
+  screened with a [local] recipe: constrained JSON output and one request in
+  flight per server slot
+- hosted: a hosted model, with the credentials of the config file
+
+and reports studies per second, time per request, parsing errors and cost.
+Without --local-url the local server is emulated by the mock LLM server with
+--latency, to check the benchmark itself.
+
+    python benchmarks/bench_local.py --local-url http://127.0.0.1:8080/v1 --hosted-model gpt-4o-mini
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+from pathlib import Path
+import platform
+import tempfile
+import time
+
+import screenie
+from screenie.db import Database
+from screenie.mock import MockLLMServer
+from screenie.session import ScreeningSession
+from screenie.studies import Study
+
+
+RESULTS_FILE = Path(__file__).parent / "results" / "local.jsonl"
+
+RECIPE = """\
+[model]
+model = "{model}"
+{base_url}temperature = 0
+max_tokens = 200
+
+[criteria]
+text = "Include studies that evaluate LLMs for screening."
+
+[prompt]
+text = \"\"\"
+Criteria: $criteria
+Title: $title
+Abstract: $abstract
+\"\"\"
+{local}"""
+
+
+def make_database(path: Path, size: int):
+    Database(path).init()
+    db = Database(path)
+    bib_file = path.parent / "studies.bib"
+    bib_file.write_text("@article{synthetic}")
+    file_id = db.save_file(str(bib_file))
+    studies = [
+        Study(
+            title=f"Synthetic study number {i} on grazing and language models",
+            authors="Author, A; Author, B",
+            year=1990 + i % 35,
+            abstract=f"Abstract of study {i}. " + "Lorem ipsum dolor sit amet. " * 20,
+            journal="Journal of Benchmarks",
+            url=f"https://example.org/study/{i}"
+        )
+        for i in range(size)
+    ]
+    db.save_studies(file_id, studies)
+    db.commit()
+    db.close()
+
+
+def run_backend(tmp: Path, name: str, model: str, base_url: str, size: int, local: bool, credentials: dict = None) -> dict:
+    db_file = tmp / f"{name}.db"
+    make_database(db_file, size)
+
+    recipe_file = tmp / f"{name}.toml"
+    recipe_file.write_text(RECIPE.format(
+        model=model,
+        base_url=f'base_url = "{base_url}"\n' if base_url else "",
+        local="\n[local]\n" if local else ""
+    ))
+
+    with ScreeningSession(str(db_file), credentials=credentials) as session:
+        session.load_recipe(str(recipe_file))
+        pipeline = session.pipeline()
+
+        async def run():
+            return [outcome async for outcome in pipeline.run()]
+
+        start = time.perf_counter()
+        outcomes = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        metrics = session.metrics
+
+    requests = metrics.done + metrics.errors
+    return {
+        "backend": name,
+        "model": model,
+        "studies": len(outcomes),
+        "concurrency": pipeline.concurrency,
+        "seconds": elapsed,
+        "studies_per_sec": len(outcomes) / elapsed,
+        "request_seconds": metrics.phase_seconds.get("llm", 0.0) / max(requests, 1),
+        "errors": metrics.errors,
+        "cost": metrics.cost,
+    }
+
+
+def report(result: dict):
+    print(
+        f"{result['backend']:<7} {result['model']:<28} j={result['concurrency']:<3} "
+        f"{result['studies_per_sec']:7.2f} studies/s | {result['request_seconds']:6.2f} s/request | "
+        f"{result['errors']} errors | ${result['cost']:.4f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--studies", type=int, default=100)
+    parser.add_argument("--local-url", default=None, help="Base URL of the local server. Default: the mock server")
+    parser.add_argument("--local-model", default="openai/local")
+    parser.add_argument("--hosted-model", default=None, help="Hosted model to compare with, e.g. gpt-4o-mini")
+    parser.add_argument("--latency", type=float, default=0.5, help="Latency of the mock server, without --local-url")
+    args = parser.parse_args()
+
+    run = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "version": screenie.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="screenie-bench-") as tmp:
+        tmp = Path(tmp)
+        if args.local_url:
+            results.append(run_backend(tmp, "local", args.local_model, args.local_url, args.studies, local=True))
+        else:
+            with MockLLMServer(latency=args.latency, slots=4) as server:
+                results.append(run_backend(tmp, "mock", "openai/mock", server.base_url, args.studies, local=True))
+        report(results[-1])
+
+        if args.hosted_model:
+            results.append(run_backend(tmp, "hosted", args.hosted_model, None, args.studies, local=False))
+            report(results[-1])
+
+    RESULTS_FILE.parent.mkdir(exist_ok=True)
+    with open(RESULTS_FILE, "a") as f:
+        for result in results:
+            f.write(json.dumps({**run, **result}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
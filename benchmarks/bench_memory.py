@@ -0,0 +1,109 @@
+"""
+Memory used by imported studies, per record.
+
+Validates synthetic parsed entries (like the dicts rispy returns) the way
+imports did before StudyRecord, one Study model per entry with the parsed
+entries alive until the end, and the way they do now, in bulk into
+StudyRecords while the parsed entries are freed. For each, it reports the
+memory still held by the validated studies and the peak while validating,
+per record, measured with tracemalloc. Each mode runs in its own process.
+
+    python benchmarks/bench_memory.py --records 1000000
+"""
+
+import argparse
+import datetime
+import json
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import screenie
+from screenie.studies import Study, drain, normalize_entry, validate_studies
+
+
+RESULTS_FILE = Path(__file__).parent / "results" / "memory.jsonl"
+
+
+def parsed_entries(records: int) -> list[dict]:
+    """Entries as returned by the RIS reader"""
+    return [
+        {
+            "type_of_reference": "JOUR",
+            "primary_title": f"Synthetic study number {i} on grazing and language models",
+            "authors": f"Author, A{i}; Author, B",
+            "year": str(1990 + i % 35),
+            "journal_name": "Journal of Benchmarks",
+            "urls": [f"https://example.org/study/{i}"],
+            "url": f"https://example.org/study/{i}",
+            "abstract": f"Abstract of study {i}. " + "Lorem ipsum dolor sit amet. " * 20,
+        }
+        for i in range(records)
+    ]
+
+
+def validate_models(entries: list[dict]) -> list[Study]:
+    """Validation before StudyRecord: a model per entry, parsed and normalized dicts alive together"""
+    normalized = [normalize_entry(entry) for entry in entries]
+    return [Study(**entry) for entry in normalized]
+
+
+def measure(mode: str, records: int) -> dict:
+    entries = parsed_entries(records)
+    # Strings are shared by the entries and the studies. Count only what validation adds
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == "before":
+        studies = validate_models(entries)
+    else:
+        studies, _ = validate_studies(drain(entries))
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len(studies) == records
+    return {
+        "mode": mode,
+        "records": records,
+        "seconds": seconds,
+        "held_bytes_per_record": current / records,
+        "peak_bytes_per_record": peak / records,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--single", choices=["before", "after"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(measure(args.single, args.records)))
+        return
+
+    run = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "version": screenie.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+    RESULTS_FILE.parent.mkdir(exist_ok=True)
+
+    for mode in ("before", "after"):
+        cmd = [sys.executable, __file__, "--single", mode, "--records", str(args.records)]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        result = {**run, **json.loads(output.strip().splitlines()[-1])}
+        print(
+            f"{mode:<7} {result['records']:,} records | held {result['held_bytes_per_record']:6.0f} B/record | "
+            f"peak {result['peak_bytes_per_record']:6.0f} B/record | {result['seconds']:.1f} s"
+        )
+
+        with open(RESULTS_FILE, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Load test of the screening pipeline against the local mock LLM server.
+
+For each database size it measures import, pending fetch, screening and
+export, and reports throughput, percentiles of the time per LLM request and
+of the interval between screened studies, peak RSS and database size. Screening
+goes through the concurrent pipeline used by `screenie run`. Each size runs in its own process, so peak RSS is not
+inherited from the previous size. Results are appended to
+benchmarks/results/pipeline.jsonl to track regressions over time.
+
+    python benchmarks/bench_pipeline.py --sizes 1000 100000 1000000 --screen 500
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+from pathlib import Path
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import screenie
+from screenie.db import Database
+from screenie.mock import MockLLMServer
+from screenie.session import ScreeningSession
+
+
+MOCK_CREDENTIALS = {"api_key": "mock-key"}
+
+RESULTS_FILE = Path(__file__).parent / "results" / "pipeline.jsonl"
+
+RECIPE = """\
+[model]
+model = "openai/mock"
+base_url = "{base_url}"
+temperature = 0
+
+[criteria]
+text = "Include studies that evaluate LLMs for screening."
+
+[prompt]
+text = \"\"\"
+Criteria: $criteria
+Title: $title
+Authors: $authors
+Year: $year
+Abstract: $abstract
+\"\"\"
+"""
+
+
+def write_ris(path: Path, size: int):
+    """Write a synthetic RIS file with `size` records"""
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(size):
+            f.write(
+                "TY  - JOUR\n"
+                f"T1  - Synthetic study number {i} on grazing and language models\n"
+                f"AU  - Author, A{i}\n"
+                "AU  - Author, B\n"
+                f"PY  - {1990 + i % 35}\n"
+                "JO  - Journal of Benchmarks\n"
+                f"UR  - https://example.org/study/{i}\n"
+                f"AB  - Abstract of study {i}. " + "Lorem ipsum dolor sit amet. " * 20 + "\n"
+                "ER  - \n"
+            )
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024**2 if platform.system() == "Darwin" else rss / 1024
+
+
+def run_size(size: int, n_screen: int, latency: float, concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="screenie-bench-") as tmp:
+        return measure(Path(tmp), size, n_screen, latency, concurrency)
+
+
+def measure(tmp: Path, size: int, n_screen: int, latency: float, concurrency: int) -> dict:
+    ris_file = tmp / "studies.ris"
+    db_file = tmp / "bench.db"
+    write_ris(ris_file, size)
+
+    Database(db_file).init()
+    session = ScreeningSession(db_file, credentials=MOCK_CREDENTIALS)
+    timings = {}
+
+    start = time.perf_counter()
+    session.import_(str(ris_file))
+    timings["import"] = time.perf_counter() - start
+
+    intervals = []
+    with MockLLMServer(latency=latency) as server:
+        recipe_file = tmp / "recipe.toml"
+        recipe_file.write_text(RECIPE.format(base_url=server.base_url))
+        session.load_recipe(str(recipe_file))
+
+        start = time.perf_counter()
+        studies_ids = session.pending(n_screen)
+        timings["pending_fetch"] = time.perf_counter() - start
+
+        pipeline = session.pipeline(studies_ids, concurrency)
+        session.metrics.keep_samples("llm")
+
+        async def run():
+            last = time.perf_counter()
+            async for outcome in pipeline.run():
+                now = time.perf_counter()
+                intervals.append(now - last)
+                last = now
+
+        start = time.perf_counter()
+        asyncio.run(run())
+        timings["screening"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    session.export("csv", str(tmp / "export.csv"))
+    timings["export"] = time.perf_counter() - start
+    session.close()
+
+    metrics = session.metrics
+    return {
+        "size": size,
+        "screened": len(intervals),
+        "mock_latency": latency,
+        "concurrency": concurrency,
+        "seconds": timings,
+        "studies_per_sec": {
+            "import": size / timings["import"],
+            "pending_fetch": len(studies_ids) / timings["pending_fetch"],
+            "screening": len(intervals) / timings["screening"],
+            "export": size / timings["export"],
+        },
+        "request_p50": float(np.percentile(metrics.samples["llm"], 50)),
+        "request_p99": float(np.percentile(metrics.samples["llm"], 99)),
+        "interval_p50": float(np.percentile(intervals, 50)),
+        "interval_p99": float(np.percentile(intervals, 99)),
+        "phase_seconds": metrics.phase_seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "db_size_mb": db_file.stat().st_size / 1024**2,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--screen", type=int, default=500, help="Studies to screen at each size")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock LLM latency in seconds")
+    parser.add_argument("--concurrency", "-j", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_size(args.single, args.screen, args.latency, args.concurrency)))
+        return
+
+    run = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "version": screenie.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+    RESULTS_FILE.parent.mkdir(exist_ok=True)
+
+    for size in args.sizes:
+        cmd = [
+            sys.executable, __file__, "--single", str(size), "--screen", str(args.screen),
+            "--latency", str(args.latency), "--concurrency", str(args.concurrency)
+        ]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        result = {**run, **json.loads(output.strip().splitlines()[-1])}
+
+        rates = ", ".join(f"{stage} {rate:,.0f}/s" for stage, rate in result["studies_per_sec"].items())
+        print(f"{size:>9,} studies | {rates}")
+        print(
+            f"          request p50 {result['request_p50'] * 1000:.1f} ms, "
+            f"p99 {result['request_p99'] * 1000:.1f} ms, j={result['concurrency']} | "
+            f"interval p50 {result['interval_p50'] * 1000:.1f} ms, "
+            f"p99 {result['interval_p99'] * 1000:.1f} ms | "
+            f"peak RSS {result['peak_rss_mb']:.0f} MB | DB {result['db_size_mb']:.1f} MB"
+        )
+
+        with open(RESULTS_FILE, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
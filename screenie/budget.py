@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import re
+
+import litellm
+
+
+# Authors are joined with "; " in RIS files and with " and " in BibTeX files
+AUTHOR_SEPARATOR = re.compile(r"\s*;\s*|\s+and\s+")
+
+TRUNCATION_MARK = " [...]"
+
+# Packed studies kept, the most recently used. Enough for the studies in flight
+PACKED_CACHE_SIZE = 1024
+
+
+def truncate_authors(authors: str, max_authors: int) -> tuple[str, bool]:
+    """Keep the first authors and add "et al.". Return the authors and if they were truncated"""
+    names = [name for name in AUTHOR_SEPARATOR.split(authors) if name]
+    if len(names) <= max_authors:
+        return authors, False
+
+    return "; ".join(names[:max_authors]) + " et al.", True
+
+
+class Packer():
+    """
+    Fit the fields of studies to the token budget of a recipe.
+
+    Fields are cut with the tokenizer of the recipe model. The last packed
+    studies are cached, so a study prompted again soon (votes, escalations,
+    retries) is not tokenized again. Only the names of the truncated fields
+    are kept for every study.
+    """
+
+    def __init__(self, recipe, cache_size: int = PACKED_CACHE_SIZE):
+        self.model = recipe.model.model
+        self.budget = recipe.budget
+        self.cache_size = cache_size
+        self._packed = OrderedDict()
+        self._truncated = {}
+        self._field_lists = {}  # One list per combination of truncated fields, shared by the studies
+
+
+    def truncate_tokens(self, text: str, max_tokens: int) -> tuple[str, bool]:
+        """Cut a text to some tokens. Return the text and if it was truncated"""
+        tokens = litellm.encode(model=self.model, text=text)
+        if len(tokens) <= max_tokens:
+            return text, False
+
+        return litellm.decode(model=self.model, tokens=tokens[:max_tokens]).rstrip() + TRUNCATION_MARK, True
+
+
+    def _fit(self, study: dict) -> tuple[dict, list[str]]:
+        packed = dict(study)
+        truncated = []
+
+        if self.budget.max_authors is not None:
+            packed['authors'], cut = truncate_authors(packed['authors'], self.budget.max_authors)
+            if cut:
+                truncated.append('authors')
+
+        for field, max_tokens in self.budget.max_tokens.items():
+            if not isinstance(packed.get(field), str):
+                continue
+            packed[field], cut = self.truncate_tokens(packed[field], max_tokens)
+            if cut and field not in truncated:
+                truncated.append(field)
+
+        return packed, truncated
+
+
+    def pack(self, study_id: int, study: dict) -> dict:
+        """Study with its fields fitted to the budget"""
+        if self.budget is None:
+            return study
+
+        if study_id in self._packed:
+            self._packed.move_to_end(study_id)
+            return self._packed[study_id]
+
+        packed, truncated = self._fit(study)
+        if truncated:
+            self._truncated[study_id] = self._field_lists.setdefault(tuple(truncated), truncated)
+        self._packed[study_id] = packed
+        if len(self._packed) > self.cache_size:
+            self._packed.popitem(last=False)
+
+        return packed
+
+
+    def truncated(self, study_id: int) -> list[str]:
+        """Fields of a packed study that were truncated. None if none was"""
+        return self._truncated.get(study_id)
@@ -0,0 +1,80 @@
+import math
+import re
+from typing import Optional
+
+import litellm
+
+import screenie.llm as llm
+
+
+# Text before the value of the verdict in the JSON output
+VERDICT_KEY = re.compile(r'"verdict"\s*:\s*"?\s*$')
+
+
+def logprob_confidence(response: dict) -> Optional[float]:
+    """
+    Probability the model gave to the verdict token, from the logprobs of the first choice.
+    None if the response has no logprobs.
+    """
+    logprobs = response['choices'][0].get('logprobs') or {}
+    text = ""
+    for token in logprobs.get('content') or []:
+        if token['token'].strip(' "') in ("0", "1") and VERDICT_KEY.search(text):
+            return math.exp(token['logprob'])
+        text += token['token']
+
+    return None
+
+
+def supports_logprobs(model: str) -> Optional[bool]:
+    """Check if LiteLLM can request logprobs from a model. None if the provider is unknown"""
+    try:
+        params = litellm.get_supported_openai_params(model=model)
+    except Exception:
+        return None
+    if params is None:
+        return None
+    return "logprobs" in params
+
+
+def check_confidence(recipe):
+    """Check the first model of a cascade can give the confidence it uses. Raise ValueError if not"""
+    if not recipe.cascade or recipe.cascade.confidence != "logprobs":
+        return
+    model = recipe.model.model
+    if supports_logprobs(model) is False:
+        raise ValueError(
+            f"The model {model} doesn't return logprobs. "
+            "Set confidence = \"self_reported\" in the [cascade] section"
+        )
+
+
+def confidence(cascade, response: dict, output: dict) -> Optional[float]:
+    """Confidence of the verdict of a response, as set by the cascade. None if unknown"""
+    if cascade.confidence == "logprobs":
+        return logprob_confidence(response)
+    return output.get('confidence')
+
+
+def escalation_reason(cascade, study: dict, response: dict) -> tuple[Optional[dict], Optional[str]]:
+    """
+    Parse the response of the first model and decide if the study goes to the second one.
+    Return the parsed output (None if it failed) and why it is escalated (None if it isn't).
+    Studies without a known confidence are escalated.
+    """
+    try:
+        output = llm.parse_response(response)
+    except Exception:
+        return None, "unparsable"
+
+    text = f"{study['title']}\n{study['abstract']}"
+    if any(re.search(pattern, text, re.IGNORECASE) for pattern in cascade.escalate_match):
+        return output, "match"
+    if cascade.escalate_includes and output['verdict'] == 1:
+        return output, "include"
+
+    score = confidence(cascade, response, output)
+    if score is None or score < cascade.min_confidence:
+        return output, "low_confidence"
+
+    return output, None
@@ -5,20 +5,26 @@ LLM-assisted systematic review screening tool
 A command-line interface for managing research study screening databases.
 """
 
+import asyncio
 import os
 from pathlib import Path
 import platform
+import signal
 import sqlite3
 import subprocess
 import sys
 
 import click
 
+from screenie.clients import ClientPool
 import screenie.config as config
 from screenie.db import Database
-import screenie.llm as llm
-import screenie.studies as studies
-import screenie.recipes as recipes
+from screenie.errors import ConfigError, ScreenieError
+from screenie.metrics import format_duration, setup_logging
+from screenie.mock import MockLLMServer
+from screenie.session import ScreeningSession
+import screenie.reparse as reparse
+import screenie.shards as shards
 
 
 # Helper functions
@@ -36,92 +42,102 @@ def validate_toml_file(ctx, param, value):
     return value
 
 
-def _read_recipe(recipe):
-    try:
-        run_recipe = recipes.read_recipe(recipe)
-    except KeyError as keyerr:
-        click.secho(f"Error in the definition of recipe: {recipe}", err=True, fg="red")
-        click.echo(f"Missing field: {keyerr}")
-        sys.exit(1)
-
-    return run_recipe
-
-
-def _register_recipe(project_db, recipe, run_recipe):
-    file_id = project_db.fetch_file_id(recipe)
-    recipe_id = project_db.fetch_recipe_id(run_recipe)
-
-    if not file_id and project_db.is_filename_used(recipe):
-        click.secho(
-            "Error: A recipe with the same filename already exists in the database, "
-            "but its contents are different. Please use a unique filename or update the existing recipe.",
-            err=True,
-            fg="red"
-        )
-        sys.exit(1)
-    elif not file_id:
-        file_id = project_db.save_file(recipe)
-        recipe_id = project_db.save_recipe(run_recipe, file_id)
-
-    return file_id, recipe_id
-
-
-def _set_env_model_keys(run_recipe):
-    # TODO: This may fail because the user put a wrong model name or something else. Check using litellm.models_list()
-    try:
-        config.load_model_keys(run_recipe.model.model)
-    except ValueError as e:
-        click.secho(e, err=True, fg="red")
+def selection_options(command):
+    """Add the --where and --match options, to work on a subset of the studies"""
+    command = click.option(
+        "--match",
+        default=None,
+        help="Only studies matching this full-text query over title, abstract, journal and authors "
+             "(SQLite FTS5 syntax, e.g. 'title:\"meta-analysis\"')."
+    )(command)
+    command = click.option(
+        "--where",
+        default=None,
+        help="Only studies meeting this SQL condition over their columns (e.g. 'year >= 2015')."
+    )(command)
+    return command
+
+
+def _fail(error):
+    """Report an error and exit"""
+    click.secho(f"Error: {error}", err=True, fg="red")
+    if isinstance(error, ConfigError):
         click.echo("Edit configuration running: \n\tscreenie config")
-        sys.exit(1)
-
+    sys.exit(1)
 
 
-def _fetch_pending_studies(project_db, recipe_id, limit):
-    studies_ids = project_db.fetch_pending_studies_ids(recipe_id, limit)
+def _report_outcome(outcome):
+    if outcome["error"]:
+        click.secho(f"{outcome['error']} (study {outcome['study_id']})", err=True, fg="red")
+        return
 
-    if len(studies_ids) == 0:
-        click.echo("All studies have been screened. No pending studies found.")
-        sys.exit(0)
+    # TODO: mejorar mensajes
+    click.echo(f"Study: {outcome['title']}\n")
+    click.echo(f"Verdict: {outcome['verdict']}")
+    if outcome.get("agreement") is not None:
+        click.echo(f"Agreement: {outcome['agreement']:.0%}")
+    click.echo(f"Reason: {outcome['reason']}\n")
 
-    if len(studies_ids) < limit:
-        click.echo(f"Note: Only {len(studies_ids)} studies pending (requested {limit})")
 
-    return studies_ids
+def _report_progress(metrics, metrics_file):
+    click.secho(metrics.progress_line(), fg="cyan")
+    if metrics_file:
+        metrics.write_openmetrics(metrics_file)
 
 
-def _screen_study(project_db, run_recipe, recipe_id, study_id):
-    study = project_db.fetch_study(study_id)
+async def _run_pipeline(pipeline, metrics, metrics_file):
+    """Report the outcomes of a pipeline. Ctrl+C stops it cleanly"""
+    def interrupt():
+        if pipeline.stopping:
+            click.secho("\nCancelling the requests in flight.", err=True, fg="yellow")
+        else:
+            click.secho("\nStopping: waiting for the requests in flight. Press Ctrl+C again to cancel them.", err=True, fg="yellow")
+        pipeline.interrupt()
 
-    # TODO: Add option to retry a few times or just skip. This can be at this stage or during parsing, which is prone to error
+    loop = asyncio.get_running_loop()
     try:
-        response = llm.call_llm(run_recipe, study)
-    except Exception as e:
-        click.echo(f"Error calling llm: {e}", err=True)
-        sys.exit(1)
-
-    llm_output = llm.parse_response(response)
+        loop.add_signal_handler(signal.SIGINT, interrupt)
+    except NotImplementedError:
+        pass  # Windows
 
-    call_id = project_db.save_llm_call(
-            response = response,
-            recipe_id = recipe_id,
-            study_id = study_id
+    try:
+        async for outcome in pipeline.run():
+            _report_outcome(outcome)
+            _report_progress(metrics, metrics_file)
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except NotImplementedError:
+            pass
+
+
+def _report_cascade(metrics, model):
+    click.echo(
+        f"Escalated {metrics.escalated} of {metrics.done} studies to {model} "
+        f"({metrics.escalated / metrics.done:.1%})"
     )
-    suggestion_id = project_db.save_result(
-            recipe_id = recipe_id,
-            study_id = study_id,
-            call_id = call_id,
-            verdict = llm_output['verdict'],
-            reason = llm_output['reason']
+    click.echo(
+        f"Cost ${metrics.cost:.4f}, ${metrics.baseline_cost:.4f} with {model} alone "
+        f"(saved ${metrics.cost_saved:.4f})"
     )
-    # Commit at this stage. If things worked, start saving results
-    project_db.commit()
 
-    # TODO: mejorar mensajes
-    click.echo(f"Study: {study['title']}\n")
-    click.echo(f"Verdict: {llm_output['verdict']}")
-    click.echo(f"Reason: {llm_output['reason']}\n")
 
+def _report_dry_run(metrics, model, dump_file):
+    total_seconds = sum(metrics.phase_seconds.values())
+
+    click.echo(f"\nDry run of {metrics.done} studies with {model}\n")
+    click.echo(f"{'Stage':<15}{'Total (s)':>12}{'Per study (ms)':>17}{'Share':>8}")
+    for phase, seconds in metrics.phase_seconds.items():
+        per_study = 1000 * seconds / max(metrics.done, 1)
+        share = seconds / total_seconds if total_seconds else 0
+        click.echo(f"{phase:<15}{seconds:>12.3f}{per_study:>17.2f}{share:>8.1%}")
+
+    click.echo(f"\nInput tokens: {metrics.input_tokens:,}")
+    click.echo(f"Output tokens (estimated): {metrics.output_tokens:,}")
+    click.echo(f"Estimated cost: ${metrics.cost:.4f}")
+    click.echo(f"Local pipeline throughput (mock LLM): {metrics.done / total_seconds if total_seconds else 0:.1f} studies/s")
+    if dump_file:
+        click.echo(f"Requests written to {dump_file}")
 
 
 @click.group()
@@ -180,29 +196,23 @@ def config_edit():
 def import_file(input_file, database):
     """Import studies from bibliography file to database."""
     try:
-        studies_list, errors = studies.import_studies(input_file=input_file)
-    except ValueError as e:
+        with ScreeningSession(database) as session:
+            imported, errors = session.import_(input_file)
+    except ScreenieError as e:
         click.secho(f"Error: {e}", err=True, fg="red")
         return
+    except sqlite3.Error as e:
+        click.secho(f"Database error: {e}", err=True, fg="red")
+        sys.exit(1)
 
-    click.echo(f"Total entries: {len(studies_list) + len(errors)}")
-    click.secho(f"Valid studies: {len(studies_list)}", fg="green")
+    click.echo(f"Total entries: {imported + len(errors)}")
+    click.secho(f"Valid studies: {imported}", fg="green")
     click.secho(f"Invalid studies: {len(errors)}", fg="red")
 
-    if not studies_list:
+    if not imported:
         click.secho("No valid studies to import.", fg="yellow")
         return
-    
-    try:
-        project_db = Database(database)
-        file_id = project_db.save_file(input_file)
-        imported_count = project_db.save_studies(file_id=file_id, studies_list=studies_list)
-        project_db.commit()
-        project_db.close()
-    except Exception as e:
-        click.secho(f"Database error: {e}", err=True, fg="red")
-        sys.exit(1)
-        
+
     click.secho(f"Done.")
 
 
@@ -226,36 +236,148 @@ def import_file(input_file, database):
         type=click.IntRange(min=1),
         help="Maximum number of studies to process in this run." 
 )
+@click.option(
+        "--prioritize",
+        "-p",
+        is_flag=True,
+        help="Screen first the studies most likely to be included, ranked with previous verdicts."
+)
+@click.option(
+        "--retrain-every",
+        default=20,
+        show_default=True,
+        type=click.IntRange(min=1),
+        help="With --prioritize, retrain the ranker after this many screened studies."
+)
+@click.option(
+        "--stop-recall",
+        default=None,
+        type=click.FloatRange(min=0, max=1, min_open=True),
+        help="With --prioritize, stop when the estimated recall reaches this value (e.g. 0.95)."
+)
+@click.option(
+        "--concurrency",
+        "-j",
+        default=None,
+        type=click.IntRange(min=1),
+        help="Requests in flight at the same time [default: 4, or the parallel slots of a local server]. "
+             "Not used with --prioritize, voting or cascade."
+)
+@click.option(
+        "--write-batch",
+        default=50,
+        show_default=True,
+        type=click.IntRange(min=1),
+        help="Results saved per database transaction, at most."
+)
+@click.option(
+        "--log-file",
+        default=None,
+        type=click.Path(dir_okay=False, writable=True),
+        help="Write structured JSON-lines logs, with per-phase timings, to this file."
+)
+@click.option(
+        "--metrics-file",
+        default=None,
+        type=click.Path(dir_okay=False, writable=True),
+        help="Keep the run metrics in this file, in OpenMetrics text format."
+)
+@click.option(
+        "--max-connections",
+        default=20,
+        show_default=True,
+        type=click.IntRange(min=1),
+        help="Maximum number of HTTP connections to the LLM provider."
+)
+@click.option(
+        "--http2/--no-http2",
+        default=True,
+        show_default=True,
+        help="Use HTTP/2 with the LLM provider when available."
+)
 @click.option(
         "--dry-run",
         "-d",
         is_flag=True,
-        help="Simulate the run without calling the LLM or saving results."
+        help="Run the pipeline with a mock LLM: render prompts, count tokens and estimate cost. Nothing is saved."
+)
+@selection_options
+@click.option(
+        "--dump-requests",
+        default=None,
+        type=click.Path(dir_okay=False, writable=True),
+        help="With --dry-run, write the rendered requests to this JSONL file."
 )
-def screen_studies(recipe, database , limit, dry_run):
+def screen_studies(recipe, database, limit, prioritize, retrain_every, stop_recall, concurrency, write_batch, log_file, metrics_file, max_connections, http2, dry_run, where, match, dump_requests):
     """Screen studies using LLM assistance."""
 
-    project_db = Database(database)
+    if log_file:
+        setup_logging(log_file)
 
-    # TODO implement dry-run
-    if dry_run:
-        print("haha dry run")
-        sys.exit(1)
-
-    # Read recipe from file. Then register it in the database.
-    # If already exists, get its IDs
-    run_recipe = _read_recipe(recipe)
-    file_id, recipe_id = _register_recipe(project_db, recipe, run_recipe)
+    try:
+        clients = ClientPool(max_connections=max_connections, http2=http2)
+        session = ScreeningSession(database, clients=clients)
+        session.select(where, match)
+        session.load_recipe(recipe, commit=not dry_run)
+    except (ScreenieError, sqlite3.Error) as e:
+        _fail(e)
+
+    if session.inherited:
+        click.echo(f"Reused {session.inherited} results of the parent recipe")
+    if session.excluded:
+        click.echo(f"Prefilter excluded {session.excluded} pending studies")
 
-    # With model from recipe, set model keys as env variables
-    _set_env_model_keys(run_recipe)        
+    if dry_run:
+        model = session.recipe.model.model
+        studies_ids = session.pending(limit)
+        with click.progressbar(length=len(studies_ids), label="Dry run") as bar:
+            metrics = session.dry_run(studies_ids, dump_requests, progress=bar.update)
+        _report_dry_run(metrics, model, dump_requests)
+        session.close()
+        return
 
-    studies_ids = _fetch_pending_studies(project_db, recipe_id, limit)
-    for study_id in studies_ids:
-        _screen_study(project_db, run_recipe, recipe_id, study_id)
+    try:
+        pipeline = None
+        if prioritize:
+            outcomes = session.screen_prioritized(limit, retrain_every, stop_recall)
+        elif session.recipe.voting or session.recipe.cascade:
+            outcomes = session.screen(limit)
+        else:
+            pipeline = session.pipeline(limit, concurrency, write_batch)
+
+        metrics = session.metrics
+        if metrics.total == 0:
+            click.echo("All studies have been screened. No pending studies found.")
+            session.close()
+            sys.exit(0)
+
+        if metrics.total < limit:
+            click.echo(f"Note: Only {metrics.total} studies pending (requested {limit})")
+
+        if pipeline:
+            asyncio.run(_run_pipeline(pipeline, metrics, metrics_file))
+        else:
+            for outcome in outcomes:
+                _report_outcome(outcome)
+                _report_progress(metrics, metrics_file)
+    except (ScreenieError, sqlite3.Error) as e:
+        session.close()
+        _fail(e)
+
+    if metrics.stopped_at_recall is not None:
+        click.secho(f"Estimated recall {metrics.stopped_at_recall:.3f} reached the threshold. Stopping.", fg="green")
+
+    if session.recipe.cascade and metrics.done:
+        _report_cascade(metrics, session.recipe.cascade.model.model)
+
+    click.secho(
+        f"Screened {metrics.done} studies in {format_duration(metrics.elapsed)} "
+        f"({metrics.included} included, {metrics.errors} errors, ${metrics.cost:.4f})",
+        fg="green"
+    )
 
     # Close before end
-    project_db.close()
+    session.close()
     return
 
 
@@ -275,7 +397,8 @@ def screen_studies(recipe, database , limit, dry_run):
     type=click.Path(writable=True),
     help="Path to save the exported file (extension will be added automatically)."
 )
-def export(db_path, output_format, output_file):
+@selection_options
+def export(db_path, output_format, output_file, where, match):
     """Export all studies and screening results"""
     if output_file is None:
         output_file = os.path.splitext(os.path.basename(db_path))[0]
@@ -286,11 +409,208 @@ def export(db_path, output_format, output_file):
 
     # TODO: Ask to overwrite if file exists
 
-    db.export_results(db_path, output_format, output_file)
+    with ScreeningSession(db_path) as session:
+        try:
+            session.select(where, match)
+        except ScreenieError as e:
+            _fail(e)
+        session.export(output_format, output_file)
     click.echo(f"Exported results to {output_file} ({output_format})")
 
 
-# TODO: commands to inspect the db
+@cli.command(name="shard")
+@click.argument("database", type=click.Path(exists=True, dir_okay=False), callback=validate_db_file)
+@click.option("--shards", "-n", "shard_count", required=True, type=click.IntRange(min=2), help="Number of shards.")
+@click.option(
+    "--output-dir", "-o",
+    default=None,
+    type=click.Path(file_okay=False, exists=True, writable=True),
+    help="Directory for the shards. Defaults to the directory of the database."
+)
+def shard(database, shard_count, output_dir):
+    """Split a database into self-contained shards, to screen them on different machines."""
+    try:
+        paths = shards.shard(database, shard_count, output_dir)
+    except ScreenieError as e:
+        _fail(e)
+
+    for path in paths:
+        click.echo(path)
+    click.secho(f"Split {database} into {len(paths)} shards. Merge them back with `screenie merge`.", fg="green")
+
+
+@cli.command(name="merge")
+@click.argument("database", type=click.Path(exists=True, dir_okay=False), callback=validate_db_file)
+@click.argument("shard_files", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+def merge(database, shard_files):
+    """Merge the results of shards back into the database they were made from."""
+    for shard_file in shard_files:
+        try:
+            counts = shards.merge(database, shard_file)
+        except ScreenieError as e:
+            _fail(e)
+
+        click.echo(
+            f"{shard_file}: {counts['results']} results, {counts['llm_calls']} LLM calls, "
+            f"{counts['votes']} votes, {counts['failures']} failures, {counts['recipes']} new recipes"
+        )
+    click.secho(f"Merged {len(shard_files)} shards into {database}", fg="green")
+
+
+@cli.command(name="reparse")
+@click.argument("database", type=click.Path(exists=True, dir_okay=False), callback=validate_db_file)
+@click.option("--recipe", "recipe_id", default=None, type=int, help="Only reparse the results of this recipe.")
+@click.option("--workers", "-j", default=None, type=click.IntRange(min=1), help="Parser processes [default: number of CPUs].")
+@click.option("--batch-size", default=2000, show_default=True, type=click.IntRange(min=1), help="LLM calls read and written at a time.")
+@click.option("--dry-run", "-d", is_flag=True, help="Only report the changes. Nothing is saved.")
+def reparse_results(database, recipe_id, workers, batch_size, dry_run):
+    """Derive the results again from the stored LLM responses, with the current parser. No LLM is called."""
+    try:
+        with click.progressbar(length=reparse.last_call_id(database), label="Reparsing") as bar:
+            report = reparse.reparse(database, recipe_id, workers, batch_size, dry_run, progress=bar.update)
+    except ScreenieError as e:
+        _fail(e)
+
+    if report["skipped_recipes"]:
+        skipped = ", ".join(map(str, report["skipped_recipes"]))
+        click.secho(f"Skipped voting recipes: {skipped}", fg="yellow")
+
+    click.echo(f"Parsed {report['calls']:,} responses")
+    click.echo(f"  Unchanged:           {report['unchanged']:,}")
+    click.echo(f"  Verdict changed:     {report['changed']:,}")
+    click.echo(f"  Only reason changed: {report['reason_changed']:,}")
+    click.echo(f"  Parsed now:          {report['recovered']:,} (had no result)")
+    click.echo(f"  Still unparsable:    {report['unparsable']:,}")
+    click.echo(f"  Unparsable now:      {report['broken']:,} (result kept)")
+
+    if report["changes"]:
+        click.secho("\nChanged verdicts:", bold=True)
+        for change in report["changes"]:
+            old = "-" if change["old"] is None else change["old"]
+            click.echo(f"  recipe {change['recipe_id']}, study {change['study_id']}: {old} -> {change['new']}")
+        more = report["changed"] + report["recovered"] - len(report["changes"])
+        if more > 0:
+            click.echo(f"  ... and {more:,} more")
+
+    if dry_run:
+        click.secho("Dry run: nothing was saved.", fg="yellow")
+
+
+@cli.command(name="mock-server")
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8000, show_default=True, type=int)
+@click.option("--latency", default=0.5, show_default=True, type=click.FloatRange(min=0), help="Mean response time in seconds.")
+@click.option("--jitter", default=0.1, show_default=True, type=click.FloatRange(min=0), help="Standard deviation of the response time.")
+@click.option("--error-rate", default=0.0, show_default=True, type=click.FloatRange(0, 1), help="Fraction of requests answered with a server error.")
+@click.option("--rate-limit-every", default=0, show_default=True, type=click.IntRange(min=0), help="Start a burst of 429 responses every this many requests (0 to disable).")
+@click.option("--rate-limit-burst", default=0, show_default=True, type=click.IntRange(min=0), help="Number of 429 responses in each burst.")
+@click.option("--malformed-rate", default=0.0, show_default=True, type=click.FloatRange(0, 1), help="Fraction of responses without a valid JSON verdict.")
+@click.option("--include-rate", default=0.1, show_default=True, type=click.FloatRange(0, 1), help="Fraction of studies the mock includes.")
+@click.option("--disagreement-rate", default=0.0, show_default=True, type=click.FloatRange(0, 1), help="Fraction of samples with the opposite verdict, to test voting.")
+def mock_server(host, port, latency, jitter, error_rate, rate_limit_every, rate_limit_burst, malformed_rate, include_rate, disagreement_rate):
+    """Run a local OpenAI-compatible mock LLM server for tests and benchmarks."""
+    server = MockLLMServer(
+        host=host,
+        port=port,
+        latency=latency,
+        jitter=jitter,
+        error_rate=error_rate,
+        rate_limit_every=rate_limit_every,
+        rate_limit_burst=rate_limit_burst,
+        malformed_rate=malformed_rate,
+        include_rate=include_rate,
+        disagreement_rate=disagreement_rate
+    )
+    click.echo(f"Mock LLM server listening on {server.base_url}")
+    click.echo('Use it in a recipe with model = "openai/mock" and base_url set to that address.')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+def _format_tokens(tokens: int) -> str:
+    if tokens >= 1_000_000:
+        return f"{tokens / 1_000_000:.1f}M"
+    if tokens >= 1_000:
+        return f"{tokens / 1_000:.1f}k"
+    return str(tokens)
+
+
+def _format_rate(rate) -> str:
+    return f"{rate:.1%}" if rate is not None else "-"
+
+
+@cli.command(name="status")
+@click.argument("database", type=click.Path(exists=True, dir_okay=False), callback=validate_db_file)
+@selection_options
+def status(database, where, match):
+    """Show the progress of every recipe in a database."""
+    with ScreeningSession(database) as session:
+        try:
+            selector = session.select(where, match)
+        except ScreenieError as e:
+            _fail(e)
+        summary = session.status()
+
+    total = summary["studies"]
+    click.echo(f"{'Selected studies' if selector else 'Studies'}: {total:,}\n")
+    if not summary["recipes"]:
+        click.echo("No recipes yet. Screen studies with `screenie run`.")
+        return
+
+    header = f"{'ID':>4}  {'Recipe':<24} {'Model':<24} {'Screened':>16} {'Included':>9} {'Failures':>8} {'Tokens in/out':>15} {'Cost':>9}"
+    click.secho(header, bold=True)
+    for row in summary["recipes"]:
+        progress = f"{row['screened']:,} ({row['screened'] / total:.0%})" if total else "0"
+        tokens = f"{_format_tokens(row['input_tokens'])}/{_format_tokens(row['output_tokens'])}"
+        cost = f"${row['cost']:.2f}"
+        click.echo(
+            f"{row['recipe_id']:>4}  {row['file'][:24]:<24} {row['model'][:24]:<24} {progress:>16} "
+            f"{_format_rate(row['include_rate']):>9} {row['failures']:>8,} {tokens:>15} {cost:>9}"
+        )
+
+
+@cli.command(name="show")
+@click.argument("database", type=click.Path(exists=True, dir_okay=False), callback=validate_db_file)
+@click.argument("recipe_id", type=int)
+@click.option("--failures", "-f", "max_failures", default=10, show_default=True, type=click.IntRange(min=0), help="Number of recent failures to show.")
+def show(database, recipe_id, max_failures):
+    """Show the details and progress of a recipe."""
+    with ScreeningSession(database) as session:
+        summary = session.status(recipe_id)
+        if not summary["recipes"]:
+            click.secho(f"Error: recipe {recipe_id} not found", err=True, fg="red")
+            sys.exit(1)
+        failures = session.failures(recipe_id, max_failures)
+
+    row = summary["recipes"][0]
+    recipe = row["recipe"]
+    features = [name for name in ("prefilter", "budget", "voting", "cascade", "lineage") if getattr(recipe, name)]
+
+    click.secho(f"Recipe {recipe_id}: {row['file']}", bold=True)
+    click.echo(f"Created:     {row['created_at']}")
+    if row["parent_id"]:
+        click.echo(f"Parent:      recipe {row['parent_id']}")
+    click.echo(f"Model:       {row['model']}")
+    if recipe.cascade:
+        click.echo(f"Escalate to: {recipe.cascade.model.model}")
+    if features:
+        click.echo(f"Sections:    {', '.join(features)}")
+
+    click.echo(f"\nScreened:    {row['screened']:,} of {summary['studies']:,} ({row['pending']:,} pending)")
+    click.echo(f"Included:    {row['included']:,} ({_format_rate(row['include_rate'])})")
+    click.echo(f"Prefilter:   {row['rule_excluded']:,} excluded")
+    click.echo(f"LLM calls:   {row['llm_calls']:,}")
+    click.echo(f"Tokens:      {row['input_tokens']:,} input, {row['output_tokens']:,} output")
+    click.echo(f"Cost:        ${row['cost']:.4f} (estimated with {row['model']})")
+    click.echo(f"Failures:    {row['failures']:,}")
+
+    if failures:
+        click.secho("\nRecent failures:", bold=True)
+        for failure in failures:
+            click.echo(f"  {failure['created_at']}  study {failure['study_id']}: {failure['stage']}: {failure['error'][:200]}")
 
 
 # Entry point
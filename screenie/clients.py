@@ -0,0 +1,90 @@
+import threading
+
+import httpx
+import litellm
+import openai
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ClientPool():
+    """
+    Pooled HTTP clients shared by all the requests of a run.
+
+    There is one client per provider endpoint (provider, base URL and API key),
+    with keep-alive connections, HTTP/2 when the h2 package is installed and
+    configurable pool limits. They are passed to LiteLLM with each request.
+
+    Only providers that LiteLLM calls through the OpenAI SDK (OpenAI and any
+    OpenAI-compatible server set with base_url) can take an external client.
+    Other providers use the clients LiteLLM caches internally.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = None,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True
+    ):
+        # By default keep all the connections alive between requests
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections or max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._clients = {}
+        self._lock = threading.Lock()
+
+
+    def _key(self, model, credentials: dict):
+        """Endpoint a request goes to, or None if it can't use a pooled client"""
+        provider = litellm.get_llm_provider(model.model)[1]
+        api_key = credentials.get("api_key")
+        if provider != "openai" or not api_key:
+            return None
+
+        return (provider, model.base_url or credentials.get("api_base"), api_key)
+
+
+    def client_for(self, model, credentials: dict, is_async: bool = False):
+        """
+        Client for a recipe Model, to pass to LiteLLM as `client`.
+        None if the provider can't use a pooled client.
+        """
+        key = self._key(model, credentials or {})
+        if key is None:
+            return None
+
+        key = (*key, is_async)
+        with self._lock:
+            if key not in self._clients:
+                provider, base_url, api_key = key[:3]
+                if is_async:
+                    http_client = httpx.AsyncClient(http2=self.http2, limits=self.limits)
+                    self._clients[key] = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+                else:
+                    http_client = httpx.Client(http2=self.http2, limits=self.limits)
+                    self._clients[key] = openai.OpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+            return self._clients[key]
+
+
+    def request_kwargs(self, model, credentials: dict, is_async: bool = False) -> dict:
+        """Extra LiteLLM arguments to send a request through the pool"""
+        client = self.client_for(model, credentials, is_async)
+        return {"client": client} if client is not None else {}
+
+
+    def close(self):
+        """Close the sync clients. Async clients are closed when garbage collected"""
+        with self._lock:
+            for key, client in self._clients.items():
+                if not key[-1]:
+                    client.close()
+            self._clients = {}
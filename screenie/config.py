@@ -1,8 +1,11 @@
 import os
 import platform
 from pathlib import Path
+import threading
 import tomllib
 
+from screenie.errors import ConfigError
+
 
 def create_config_file(config_file):
     """Create config file with API keys"""
@@ -11,6 +14,11 @@ def create_config_file(config_file):
 #
 # - Section headers (inside [brackets]) MUST match the model names used in your recipes.
 # - The keys (API_KEY, endpoint, etc.) must match what LiteLLM expects.
+#   Keys ending in API_KEY, API_BASE and API_VERSION are passed to LiteLLM as
+#   api_key, api_base and api_version, and provider settings like
+#   VERTEXAI_PROJECT or AWS_REGION_NAME as their LiteLLM arguments. Lowercase
+#   keys are passed as they are. Other keys are set as environment variables,
+#   unless they are already set.
 # - Refer to LiteLLM provider docs for the required values:
 #   https://docs.litellm.ai/docs/providers
 #
@@ -47,7 +55,7 @@ def get_config_dir():
         config_dir = Path.home() / ".config" / "screenie"
 
     if not config_dir.exists():
-        config_dir.mkdir()
+        config_dir.mkdir(parents=True)
 
     return config_dir
 
@@ -63,27 +71,135 @@ def get_config_file() -> Path:
     return config_file
 
 
-def load_config() -> str:
-    """Read config file"""
-    config_file = get_config_file()
+# Environment variables of the providers and the LiteLLM argument each one is passed as
+PROVIDER_KWARGS = {
+    "VERTEXAI_PROJECT": "vertex_project",
+    "VERTEX_PROJECT": "vertex_project",
+    "VERTEXAI_LOCATION": "vertex_location",
+    "VERTEX_LOCATION": "vertex_location",
+    "VERTEXAI_CREDENTIALS": "vertex_credentials",
+    "AWS_REGION_NAME": "aws_region_name",
+    "AWS_REGION": "aws_region_name",
+    "AWS_ACCESS_KEY_ID": "aws_access_key_id",
+    "AWS_SECRET_ACCESS_KEY": "aws_secret_access_key",
+    "AWS_SESSION_TOKEN": "aws_session_token",
+    "AWS_PROFILE_NAME": "aws_profile_name",
+    "AZURE_AD_TOKEN": "azure_ad_token",
+}
+
+
+def _litellm_name(name: str):
+    """LiteLLM argument of a config key, or None if it is only known as an environment variable"""
+    upper = name.upper()
+    if upper.endswith("API_KEY"):
+        return "api_key"
+    if upper.endswith(("API_BASE", "BASE_URL")):
+        return "api_base"
+    if upper.endswith("API_VERSION"):
+        return "api_version"
+    if upper in PROVIDER_KWARGS:
+        return PROVIDER_KWARGS[upper]
+    if name.islower():
+        return name
+    return None
+
+
+def to_litellm_kwargs(keys: dict) -> dict:
+    """
+    Convert the keys of a model section to LiteLLM arguments.
+    Keys ending in API_KEY, API_BASE (or BASE_URL) and API_VERSION become
+    api_key, api_base and api_version, the provider settings in
+    PROVIDER_KWARGS their LiteLLM argument, and lowercase keys are kept.
+    Other keys are left out: see environment_keys.
+    """
+    kwargs = {}
+    for name, value in keys.items():
+        litellm_name = _litellm_name(name)
+        if litellm_name:
+            kwargs[litellm_name] = value
+
+    return kwargs
+
+
+def environment_keys(keys: dict) -> dict:
+    """Keys of a model section that LiteLLM only reads from the environment"""
+    return {name: str(value) for name, value in keys.items() if _litellm_name(name) is None}
+
+
+class Config():
+    """
+    Configuration file, read once and kept in memory.
+    It is read again only if the file was modified.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._mtime = None
+        self._data = None
+        self._lock = threading.Lock()
+        self._environment = {}  # Environment variable -> (model, value) of the first model that needed it
+
+
+    def data(self) -> dict:
+        with self._lock:
+            mtime = self.path.stat().st_mtime_ns
+            if mtime != self._mtime:
+                with open(self.path, "rb") as f:
+                    self._data = tomllib.load(f)
+                self._mtime = mtime
+
+            return self._data
+
+
+    def model_credentials(self, model: str) -> dict:
+        """LiteLLM arguments with the credentials of a model. Pass them to each request"""
+        config = self.data()
+
+        if not config:
+            raise ValueError("No configuration file found")
+
+        if model not in config.keys():
+            raise ValueError(f"No configuration for model: {model}")
+
+        self._set_environment(model, environment_keys(config[model]))
+
+        return to_litellm_kwargs(config[model])
+
+
+    def _set_environment(self, model: str, keys: dict):
+        """
+        Set the settings that providers only read from the environment.
+        Variables already set are kept. The environment is shared by the
+        whole process, so two models can't need different values.
+        """
+        with self._lock:
+            for name, value in keys.items():
+                first = self._environment.setdefault(name, (model, value))
+                if first[1] != value:
+                    raise ConfigError(
+                        f"Models {first[0]} and {model} need different values of {name}, "
+                        "which is read from the environment. Screen them in separate runs"
+                    )
+                os.environ.setdefault(name, value)
 
-    if not config_file.exists():
-        create_config_file(config_file)
 
-    with open(config_file, 'rb') as f:
-        return tomllib.load(f)
+_config = None
 
 
-def load_model_keys(model: str):
-    """Get provider config from LiteLLM-style config"""
-    config = load_config()
-        
-    if not config:
-        raise ValueError("No configuration file found")
+def get_config() -> Config:
+    """Get the configuration of this process"""
+    global _config
+    if _config is None:
+        _config = Config(get_config_file())
+
+    return _config
+
+
+def load_config() -> dict:
+    """Read config file"""
+    return get_config().data()
 
-    if model not in config.keys():
-        raise ValueError(f"No configuration for model: {model}")
-    
-    for key, value in config[model].items():
-        os.environ[key] = value
 
+def load_model_keys(model: str) -> dict:
+    """Get the LiteLLM credentials of a model from the config file"""
+    return get_config().model_credentials(model)
@@ -7,21 +7,83 @@ import sys
 import click
 import pandas as pd
 
+from screenie.search import ALL_STUDIES, Selector
+
+
+# Imports of this many studies leave the full-text index to be rebuilt when used
+BULK_INDEX_STUDIES = 10000
+
+
+# Version of the schema. Databases with an older user_version are migrated when opened
+SCHEMA_VERSION = 2
+
+# Columns added since the first version, to tables that keep their rows: (table, column, definition)
+ADDED_COLUMNS = [
+    ("recipes", "parent_id", "INTEGER REFERENCES recipes (recipe_id)"),
+    ("recipes", "prefiltered_until", "INTEGER"),
+    ("llm_calls", "truncated", "TEXT"),
+    ("results", "agreement", "REAL"),
+    ("results", "primary_call_id", "INTEGER REFERENCES llm_calls (call_id)"),
+]
+
 
 class Database():
     def __init__(self, path):
         self.path = path
         self.con = sqlite3.connect(path)
+        if self.con.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self.create_schema()
 
 
     def init(self):
         """Create database"""
+        self.create_schema()
+        self.con.close()
+
+
+    def _columns(self, table: str) -> dict[str, bool]:
+        """Columns of a table and whether they are NOT NULL. Empty if the table doesn't exist"""
+        return {row[1]: bool(row[3]) for row in self.con.execute(f"PRAGMA table_info({table})")}
+
+
+    def create_schema(self):
+        """Create the tables, indexes and triggers that don't exist yet, migrating databases made by older versions"""
         sql_schema = "schema.sql"
-    
+        is_new = not self._columns("studies")
+        had_stats = bool(self._columns("recipe_stats"))
+
+        for table, column, definition in ADDED_COLUMNS:
+            columns = self._columns(table)
+            if columns and column not in columns:
+                self.con.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+        # results.call_id became nullable (prefilter exclusions), which needs a new table.
+        # Move the old one aside without its triggers and indexes, so the schema makes them again
+        if self._columns("results").get("call_id"):
+            self.con.execute("ALTER TABLE results RENAME TO results_migrated")
+            attached = self.con.execute("""
+                SELECT type, name FROM sqlite_master
+                WHERE tbl_name = 'results_migrated' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+            """).fetchall()
+            for kind, name in attached:
+                self.con.execute(f"DROP {kind.upper()} {name}")
+
         cur = self.con.cursor()
         with importlib.resources.open_text("screenie", sql_schema, encoding="utf-8") as f:
             cur.executescript(f.read())
-        self.con.close()
+
+        migrated = bool(self._columns("results_migrated"))
+        if migrated:
+            columns = ", ".join(c for c in self._columns("results_migrated") if c in self._columns("results"))
+            cur.execute(f"INSERT INTO results ({columns}) SELECT {columns} FROM results_migrated")
+            cur.execute("DROP TABLE results_migrated")
+
+        cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.con.commit()
+
+        if not is_new and (not had_stats or migrated):
+            # The summary tables miss what was saved before they existed
+            self.rebuild_stats()
 
     def commit(self):
         self.con.commit()
@@ -85,6 +147,10 @@ class Database():
         values (?, ?, ?, ?, ?, ?, ?, ?)
         """
         cur = self.con.cursor()
+        if len(studies_list) >= BULK_INDEX_STUDIES:
+            # Row by row, the full-text index is several times slower than the import.
+            # Build it at once the first time it is used instead
+            cur.execute("UPDATE db_stats SET value = 0 WHERE name = 'search_index'")
         cur.executemany(query, [(i.title, i.authors, i.year, i.abstract, i.journal, i.url, i.doi, file_id) for i in studies_list])
 
 
@@ -107,18 +173,119 @@ class Database():
         return json.loads(study)
     
 
-    def save_recipe(self, recipe, file_id) -> int:
-        query = "INSERT INTO recipes (content, file_id) VALUES (?, ?)"
+    def fetch_studies(self, studies_ids: list[int]) -> dict[int, dict]:
+        """Fetch the prompt fields of a group of studies, by study ID."""
+        placeholders = ", ".join("?" * len(studies_ids))
+        query = f"""
+        SELECT study_id, title, authors, year, abstract, journal, url, doi
+        FROM studies WHERE study_id IN ({placeholders})
+        """
+        cur = self.con.cursor()
+        res = cur.execute(query, list(studies_ids))
+        columns = [col[0] for col in cur.description]
+
+        return {row[0]: dict(zip(columns[1:], row[1:])) for row in res.fetchall()}
+
+
+    def save_screened(self, recipe_id, screened: list[dict]):
+        """Save a batch of LLM calls and their results in one transaction.
+
+        Each item has study_id, response, truncated and output (None if the
+        response couldn't be parsed, so only the call is saved).
+        Call IDs are assigned here, so both tables can be written with executemany.
+        """
+        cur = self.con.cursor()
+        # Take the write lock before reading the last ID
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            next_id = cur.execute("SELECT COALESCE(MAX(call_id), 0) + 1 FROM llm_calls").fetchone()[0]
+            calls, results = [], []
+            for call_id, item in enumerate(screened, start=next_id):
+                response = item['response']
+                calls.append((
+                    call_id,
+                    recipe_id,
+                    response['usage']['prompt_tokens'],
+                    response['usage']['completion_tokens'],
+                    item['study_id'],
+                    json.dumps(response),
+                    json.dumps(item['truncated']) if item['truncated'] else None
+                ))
+                if item['output'] is not None:
+                    output = item['output']
+                    results.append((recipe_id, item['study_id'], call_id, output['verdict'], output['reason']))
+
+            cur.executemany("""
+            INSERT INTO llm_calls
+            (call_id, recipe_id, input_tokens, output_tokens, study_id, full_response, truncated)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, calls)
+            cur.executemany("""
+            INSERT INTO results
+            (recipe_id, study_id, call_id, verdict, reason)
+            VALUES (?, ?, ?, ?, ?)
+            """, results)
+            self.con.commit()
+        except BaseException:
+            self.con.rollback()
+            raise
+
+
+    def save_recipe(self, recipe, file_id, parent_id=None) -> int:
+        query = "INSERT INTO recipes (content, file_id, parent_id) VALUES (?, ?, ?)"
         cur = self.con.cursor()
-        cur.execute(query, (recipe.model_dump_json(), file_id))
+        cur.execute(query, (recipe.content(), file_id, parent_id))
 
         return cur.lastrowid
 
 
+    def fetch_prefiltered_until(self, recipe_id) -> int:
+        """Last study ID the prefilter of a recipe ran on. 0 if it never ran"""
+        query = "SELECT COALESCE(prefiltered_until, 0) FROM recipes WHERE recipe_id = ?"
+        return self.con.execute(query, (recipe_id,)).fetchone()[0]
+
+
+    def save_prefiltered_until(self, recipe_id, study_id: int):
+        query = "UPDATE recipes SET prefiltered_until = ? WHERE recipe_id = ?"
+        self.con.execute(query, (study_id, recipe_id))
+
+
+    def fetch_recipe_content(self, recipe_id) -> str:
+        query = "SELECT content FROM recipes WHERE recipe_id = ?"
+        cur = self.con.cursor()
+        result = cur.execute(query, (recipe_id,)).fetchone()
+
+        if result:
+            return result[0]
+        else:
+            return None
+
+
+    def copy_results(self, from_recipe_id, to_recipe_id, exclude: set[int]) -> int:
+        """Copy the results of a recipe to another, except for some studies. Return how many were copied"""
+        cur = self.con.cursor()
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS excluded_studies (study_id INTEGER PRIMARY KEY)")
+        cur.execute("DELETE FROM excluded_studies")
+        cur.executemany("INSERT INTO excluded_studies (study_id) VALUES (?)", ((i,) for i in exclude))
+
+        query = """
+        INSERT INTO results (recipe_id, study_id, call_id, verdict, reason, agreement, primary_call_id)
+        SELECT ?, r.study_id, r.call_id, r.verdict, r.reason, r.agreement, r.primary_call_id
+        FROM results r
+        WHERE r.recipe_id = ?
+          AND r.study_id NOT IN (SELECT study_id FROM excluded_studies)
+        """
+        cur.execute(query, (to_recipe_id, from_recipe_id))
+        copied = cur.rowcount
+        cur.execute("DELETE FROM excluded_studies")
+
+        return copied
+
+
     def fetch_recipe_id(self, recipe) -> int:
         query = "SELECT recipe_id FROM recipes WHERE content = ?"
         cur = self.con.cursor()
-        result = cur.execute(query, (recipe.model_dump_json(),)).fetchone()
+        result = cur.execute(query, (recipe.content(),)).fetchone()
 
         if result:
             return result[0]
@@ -126,40 +293,66 @@ class Database():
             return None
    
 
-    def save_llm_call(self, study_id, recipe_id, response):
+    def save_llm_call(self, study_id, recipe_id, response, truncated: list[str] = None):
         model = response['model']
         input_tokens = response['usage']['prompt_tokens']
         output_tokens = response['usage']['completion_tokens']
         full_response = json.dumps(response)
+        truncated = json.dumps(truncated) if truncated else None
     
         query = """
         INSERT INTO llm_calls
-        (recipe_id, input_tokens, output_tokens, study_id, full_response)
-        VALUES (?, ?, ?, ?, ?)
+        (recipe_id, input_tokens, output_tokens, study_id, full_response, truncated)
+        VALUES (?, ?, ?, ?, ?, ?)
         """
 
         cur = self.con.cursor()
-        cur.execute(query, (recipe_id, input_tokens, output_tokens, study_id, full_response))
+        cur.execute(query, (recipe_id, input_tokens, output_tokens, study_id, full_response, truncated))
     
         return cur.lastrowid   
     
     
-    def save_result(self, recipe_id, study_id, call_id, verdict, reason):
+    def save_result(self, recipe_id, study_id, call_id, verdict, reason, agreement=None, primary_call_id=None):
         query = """
         INSERT INTO results
-        (recipe_id, study_id, call_id, verdict, reason)
-        VALUES (?, ?, ?, ?, ?)
+        (recipe_id, study_id, call_id, verdict, reason, agreement, primary_call_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
         """
         cur = self.con.cursor()
-        cur.execute(query, (recipe_id, study_id, call_id, verdict, reason))
+        cur.execute(query, (recipe_id, study_id, call_id, verdict, reason, agreement, primary_call_id))
         
         return cur.lastrowid
+
+
+    def save_votes(self, recipe_id, study_id, call_id, votes: list[tuple[int, dict]]):
+        """Save the votes parsed from the choices of a call. Takes (choice_index, vote) pairs."""
+        query = """
+        INSERT INTO votes
+        (call_id, choice_index, recipe_id, study_id, verdict, reason)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """
+        cur = self.con.cursor()
+        cur.executemany(query, [
+            (call_id, index, recipe_id, study_id, vote['verdict'], vote['reason'])
+            for index, vote in votes
+        ])
     
     
-    def export_results(self, output_format: str, output_file: str):
-        """Export all the studies and what the LLM output"""
-    
+    def save_rule_exclusions(self, recipe_id, exclusions: list[tuple[int, str]]):
+        """Save studies excluded by local rules, without LLM call. Takes (study_id, reason) pairs."""
         query = """
+        INSERT INTO results
+        (recipe_id, study_id, call_id, verdict, reason)
+        VALUES (?, ?, NULL, 0, ?)
+        """
+        cur = self.con.cursor()
+        cur.executemany(query, [(recipe_id, study_id, reason) for study_id, reason in exclusions])
+
+
+    def export_results(self, output_format: str, output_file: str, selector: Selector = ALL_STUDIES):
+        """Export the studies of the selector (all by default) and what the LLM output"""
+        condition, params = selector.sql("st.study_id")
+        query = f"""
         SELECT 
             st.study_id,
             st.title,
@@ -171,12 +364,14 @@ class Database():
             st.doi,
             r.verdict,
             r.reason,
+            r.agreement
         FROM studies AS st
         LEFT JOIN results AS r
         ON st.study_id = r.study_id
+        WHERE {condition}
         """
     
-        df = pd.read_sql_query(query, self.con)
+        df = pd.read_sql_query(query, self.con, params=params)
     
         fmt = output_format.lower()
         if fmt == "csv":
@@ -187,21 +382,282 @@ class Database():
             raise ValueError(f"Unsupported format: {output_format}")
     
     
-    def fetch_pending_studies_ids(self, recipe_id, limit: int) -> list[int]:
-        """Fetch a group of study IDs that haven't been screened yet with some recipe."""
-        query = """
+    def fetch_pending_studies_ids(self, recipe_id, limit: int = None, selector: Selector = ALL_STUDIES) -> list[int]:
+        """Fetch a group of study IDs that haven't been screened yet with some recipe.
+
+        If limit is None, fetch all of them. Only the studies of the selector are fetched.
+        """
+        condition, params = selector.sql("s.study_id")
+        query = f"""
         SELECT s.study_id
         FROM studies s
         WHERE NOT EXISTS (
             SELECT 1 FROM results r 
             WHERE r.study_id = s.study_id AND r.recipe_id = ?
         )
+        AND {condition}
         ORDER BY s.study_id
         LIMIT ?
         """
 
+        if limit is None:
+            limit = -1
+
         cur = self.con.cursor()
-        res = cur.execute(query, (recipe_id, limit,))
+        res = cur.execute(query, (recipe_id, *params, limit,))
 
         return [row[0] for row in res.fetchall()]
+
+
+    def fetch_pending_studies(self, recipe_id, after: int = 0) -> list[dict]:
+        """Fetch the fields used by the prefilter for every pending study, after some study_id."""
+        query = """
+        SELECT s.study_id, s.title, s.abstract, s.year
+        FROM studies s
+        WHERE s.study_id > ? AND NOT EXISTS (
+            SELECT 1 FROM results r
+            WHERE r.study_id = s.study_id AND r.recipe_id = ?
+        )
+        ORDER BY s.study_id
+        """
+        cur = self.con.cursor()
+        res = cur.execute(query, (after, recipe_id))
+        columns = [col[0] for col in cur.description]
+
+        return [dict(zip(columns, row)) for row in res.fetchall()]
+
+
+    def fetch_results(self, recipe_id=None, after: int = 0, limit: int = 1000) -> list[dict]:
+        """Fetch a page of results, ordered by ID, starting after some suggestion_id.
+
+        If recipe_id is None, fetch results of all recipes.
+        """
+        query = """
+        SELECT suggestion_id, recipe_id, study_id, call_id, verdict, reason, agreement, created_at
+        FROM results
+        WHERE suggestion_id > ? AND (? IS NULL OR recipe_id = ?)
+        ORDER BY suggestion_id
+        LIMIT ?
+        """
+        cur = self.con.cursor()
+        res = cur.execute(query, (after, recipe_id, recipe_id, limit))
+        columns = [col[0] for col in cur.description]
+
+        return [dict(zip(columns, row)) for row in res.fetchall()]
+
+
+    def save_failure(self, recipe_id, study_id, stage: str, error: str):
+        query = "INSERT INTO failures (recipe_id, study_id, stage, error) VALUES (?, ?, ?, ?)"
+        cur = self.con.cursor()
+        cur.execute(query, (recipe_id, study_id, stage, error))
+
+
+    def fetch_failures(self, recipe_id, limit: int = 10) -> list[dict]:
+        """Fetch the last failures of a recipe."""
+        query = """
+        SELECT failure_id, created_at, study_id, stage, error
+        FROM failures
+        WHERE recipe_id = ?
+        ORDER BY failure_id DESC
+        LIMIT ?
+        """
+        cur = self.con.cursor()
+        res = cur.execute(query, (recipe_id, limit))
+        columns = [col[0] for col in cur.description]
+
+        return [dict(zip(columns, row)) for row in res.fetchall()]
+
+
+    def _stats_query(self, selector: Selector = ALL_STUDIES) -> tuple[str, list]:
+        """Query of the recipe_stats columns, computed over the studies of the selector"""
+        condition, params = selector.sql()
+        query = f"""
+        SELECT
+            r.recipe_id,
+            COALESCE(res.screened, 0) AS screened,
+            COALESCE(res.included, 0) AS included,
+            COALESCE(res.rule_excluded, 0) AS rule_excluded,
+            COALESCE(c.llm_calls, 0) AS llm_calls,
+            COALESCE(c.input_tokens, 0) AS input_tokens,
+            COALESCE(c.output_tokens, 0) AS output_tokens,
+            COALESCE(f.failures, 0) AS failures
+        FROM recipes r
+        LEFT JOIN (
+            SELECT recipe_id, COUNT(*) AS screened, SUM(verdict) AS included,
+                   SUM(call_id IS NULL) AS rule_excluded
+            FROM results WHERE {condition} GROUP BY recipe_id
+        ) res ON res.recipe_id = r.recipe_id
+        LEFT JOIN (
+            SELECT recipe_id, COUNT(*) AS llm_calls, SUM(input_tokens) AS input_tokens,
+                   SUM(output_tokens) AS output_tokens
+            FROM llm_calls WHERE {condition} GROUP BY recipe_id
+        ) c ON c.recipe_id = r.recipe_id
+        LEFT JOIN (
+            SELECT recipe_id, COUNT(*) AS failures FROM failures WHERE {condition} GROUP BY recipe_id
+        ) f ON f.recipe_id = r.recipe_id
+        """
+        return query, params * 3
+
+
+    def rebuild_stats(self):
+        """Compute the summary tables from scratch, e.g. for databases made before they existed."""
+        cur = self.con.cursor()
+        cur.execute("DELETE FROM db_stats WHERE name = 'studies'")
+        cur.execute("INSERT INTO db_stats (name, value) SELECT 'studies', COUNT(*) FROM studies")
+        cur.execute("DELETE FROM recipe_stats")
+        query, params = self._stats_query()
+        cur.execute(f"""
+        INSERT INTO recipe_stats
+        (recipe_id, screened, included, rule_excluded, llm_calls, input_tokens, output_tokens, failures)
+        {query}
+        """, params)
+        self.con.commit()
+
+
+    def ensure_search_index(self):
+        """Build the full-text index of the studies, if they were imported before it existed."""
+        row = self.con.execute("SELECT value FROM db_stats WHERE name = 'search_index'").fetchone()
+        if row and row[0]:
+            return
+
+        self.con.execute("INSERT INTO studies_fts (studies_fts) VALUES ('rebuild')")
+        self.con.execute("""
+        INSERT INTO db_stats (name, value) VALUES ('search_index', 1)
+        ON CONFLICT (name) DO UPDATE SET value = 1
+        """)
+        self.con.commit()
+
+
+    def check_selector(self, selector: Selector):
+        """Raise sqlite3.Error if the condition or the query of a selector is not valid."""
+        condition, params = selector.sql()
+        self.con.execute(f"SELECT 1 FROM studies WHERE {condition} LIMIT 1", params).fetchall()
+
+
+    def count_studies(self, selector: Selector = ALL_STUDIES) -> int:
+        """Number of studies, from the summary tables. Selections are counted with a query."""
+        if selector:
+            condition, params = selector.sql()
+            return self.con.execute(f"SELECT COUNT(*) FROM studies WHERE {condition}", params).fetchone()[0]
+
+        row = self.con.execute("SELECT value FROM db_stats WHERE name = 'studies'").fetchone()
+        return row[0] if row else 0
+
+
+    def fetch_recipes_status(self, recipe_id=None, selector: Selector = ALL_STUDIES) -> list[dict]:
+        """Fetch each recipe with its counters, from the summary tables.
+
+        If recipe_id is None, fetch all recipes. With a selector, the counters
+        are computed over its studies instead.
+        """
+        stats, params = "recipe_stats", []
+        if selector:
+            stats, params = self._stats_query(selector)
+            stats = f"({stats})"
+
+        query = f"""
+        SELECT
+            r.recipe_id,
+            r.created_at,
+            r.parent_id,
+            r.content,
+            f.name AS file,
+            COALESCE(s.screened, 0) AS screened,
+            COALESCE(s.included, 0) AS included,
+            COALESCE(s.rule_excluded, 0) AS rule_excluded,
+            COALESCE(s.llm_calls, 0) AS llm_calls,
+            COALESCE(s.input_tokens, 0) AS input_tokens,
+            COALESCE(s.output_tokens, 0) AS output_tokens,
+            COALESCE(s.failures, 0) AS failures
+        FROM recipes r
+        JOIN files f ON f.file_id = r.file_id
+        LEFT JOIN {stats} s ON s.recipe_id = r.recipe_id
+        WHERE ? IS NULL OR r.recipe_id = ?
+        ORDER BY r.recipe_id
+        """
+        cur = self.con.cursor()
+        res = cur.execute(query, (*params, recipe_id, recipe_id))
+        columns = [col[0] for col in cur.description]
+
+        return [dict(zip(columns, row)) for row in res.fetchall()]
+
+
+    def fetch_calls_to_reparse(self, recipes_ids: list[int], after: int = 0, limit: int = 1000) -> list[dict]:
+        """Fetch a batch of the LLM calls that results come from, after some call ID.
+
+        These are the calls of the results (except voting results, which come from
+        several calls) and, for studies without a result, their last call, whose
+        response couldn't be parsed. Each has its current result, if any.
+        """
+        placeholders = ", ".join("?" * len(recipes_ids))
+        query = f"""
+        SELECT c.call_id, c.recipe_id, c.study_id, c.full_response, r.suggestion_id, r.verdict, r.reason
+        FROM llm_calls c
+        LEFT JOIN results r ON r.call_id = c.call_id
+        WHERE c.call_id > ? AND c.recipe_id IN ({placeholders})
+        AND (
+            (r.suggestion_id IS NOT NULL AND r.agreement IS NULL)
+            OR (
+                r.suggestion_id IS NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM results x WHERE x.recipe_id = c.recipe_id AND x.study_id = c.study_id
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM llm_calls l
+                    WHERE l.recipe_id = c.recipe_id AND l.study_id = c.study_id AND l.call_id > c.call_id
+                )
+            )
+        )
+        ORDER BY c.call_id
+        LIMIT ?
+        """
+        cur = self.con.cursor()
+        res = cur.execute(query, (after, *recipes_ids, limit))
+        columns = [col[0] for col in cur.description]
+
+        return [dict(zip(columns, row)) for row in res.fetchall()]
+
+
+    def update_results(self, updates: list[tuple[int, str, int]], new: list[tuple[int, int, int, int, str]]):
+        """Save re-parsed results in one transaction.
+
+        updates are (verdict, reason, suggestion_id) and new are
+        (recipe_id, study_id, call_id, verdict, reason).
+        """
+        cur = self.con.cursor()
+        try:
+            cur.executemany("UPDATE results SET verdict = ?, reason = ? WHERE suggestion_id = ?", updates)
+            cur.executemany("""
+            INSERT INTO results
+            (recipe_id, study_id, call_id, verdict, reason)
+            VALUES (?, ?, ?, ?, ?)
+            """, new)
+            self.con.commit()
+        except BaseException:
+            self.con.rollback()
+            raise
+
+
+    def fetch_studies_texts(self) -> dict[int, str]:
+        """Fetch title and abstract of every study, to be used by the ranker."""
+        query = "SELECT study_id, title || ' ' || abstract FROM studies ORDER BY study_id"
+        cur = self.con.cursor()
+
+        return dict(cur.execute(query).fetchall())
+
+
+    def fetch_verdicts(self, recipe_id) -> dict[int, int]:
+        """Fetch the verdicts already obtained with some recipe."""
+        query = "SELECT study_id, verdict FROM results WHERE recipe_id = ?"
+        cur = self.con.cursor()
+
+        return dict(cur.execute(query, (recipe_id,)).fetchall())
+
+
+    def fetch_rule_excluded_ids(self, recipe_id) -> set[int]:
+        """Fetch the studies excluded by prefilter rules, without an LLM call."""
+        query = "SELECT study_id FROM results WHERE recipe_id = ? AND call_id IS NULL"
+        cur = self.con.cursor()
+
+        return {row[0] for row in cur.execute(query, (recipe_id,))}
     
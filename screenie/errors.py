@@ -0,0 +1,38 @@
+class ScreenieError(Exception):
+    """Base class of screenie errors"""
+
+
+class RecipeError(ScreenieError):
+    """The recipe file can't be read or is not valid"""
+
+
+class RecipeConflictError(RecipeError):
+    """A different recipe with the same filename is already in the database"""
+
+
+class ConfigError(ScreenieError):
+    """The configuration for a model is missing or not valid"""
+
+
+class StudiesImportError(ScreenieError):
+    """The bibliography file can't be imported"""
+
+
+class NoRecipeError(ScreenieError):
+    """An operation needs a recipe, but none was loaded in the session"""
+
+
+class TooManyErrorsError(ScreenieError):
+    """Too many studies failed in a row, so the run was stopped"""
+
+
+class ShardError(ScreenieError):
+    """A database can't be split or a shard can't be merged"""
+
+
+class BackendError(ScreenieError):
+    """The local inference server can't be reached or is not ready"""
+
+
+class SelectorError(ScreenieError):
+    """The --where condition or the --match query of a selection is not valid"""
@@ -2,16 +2,20 @@ import json
 import re
 from string import Template
 import textwrap
-from typing import Literal
+from typing import Literal, Optional
 
 import litellm
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ValidationError, field_validator
+
+# Don't print LiteLLM help messages when a model is unknown (e.g. for cost estimation)
+litellm.suppress_debug_info = True
 
 
 class LLMResponse(BaseModel):
     """LLM output schema"""
     verdict: Literal[0, 1]
     reason: str
+    confidence: Optional[float] = None  # Only asked for by cascades with self-reported confidence
 
     @field_validator("verdict", mode="before")
     def coerce_verdict(cls, verdict):
@@ -41,22 +45,131 @@ def compile_prompt(recipe, study):
 }
 ```
 """
+    if recipe.cascade and recipe.cascade.confidence == "self_reported":
+        data_format = data_format.replace(
+            '"reason": "{explanation supporting the decision}"',
+            '"reason": "{explanation supporting the decision}",\n    "confidence": "{0 to 1, how sure you are of the verdict}"'
+        )
 
     return filled_prompt + data_format
 
 
-def call_llm(recipe, study):
-    msg = compile_prompt(recipe, study)
-    usr_config = recipe.model.model_dump()
+# Study fields a prompt can use, besides $criteria
+PROMPT_FIELDS = ("title", "authors", "year", "abstract", "journal", "url", "doi")
+
+
+def check_prompt(recipe):
+    """Render the prompt of a recipe once. Raise ValueError if it has an unknown or invalid placeholder"""
+    try:
+        compile_prompt(recipe, dict.fromkeys(PROMPT_FIELDS, ""))
+    except KeyError as e:
+        raise ValueError(f"Unknown placeholder ${e.args[0]} in the prompt") from e
+
+
+def output_schema(recipe) -> dict:
+    """JSON schema of the output asked for in the prompt"""
+    properties = {
+        "verdict": {"type": "integer", "enum": [0, 1]},
+        "reason": {"type": "string"},
+    }
+    if recipe.cascade and recipe.cascade.confidence == "self_reported":
+        properties["confidence"] = {"type": "number"}
+
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def response_format(recipe) -> dict:
+    """
+    OpenAI response_format that constrains the output to the schema.
+    Local servers (llama.cpp, vLLM, Ollama) turn it into a grammar, so the
+    model can only write valid JSON.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "screening", "schema": output_schema(recipe), "strict": True},
+    }
+
+
+def model_config(recipe, model=None) -> dict:
+    """LiteLLM arguments of the model of the recipe, or of another Model"""
+    usr_config = (model or recipe.model).model_dump()
+    if model is None and recipe.local and recipe.local.constrained:
+        usr_config["response_format"] = response_format(recipe)
+
+    return usr_config
+
+
+def build_messages(msg: str) -> list[dict]:
+    return [{"role": "user", "content": msg}]
+
+
+def send_prompt(recipe, msg: str, credentials: dict = None, model=None, **kwargs) -> dict:
+    """Send an already compiled prompt to the model of the recipe, or to another Model.
+
+    Credentials (api_key, api_base, ...) are passed with the request instead of
+    through environment variables. Extra keyword arguments are passed to
+    LiteLLM (e.g. mock_response) and override the recipe parameters (e.g. n)
+    """
+    usr_config = model_config(recipe, model)
     
     response = litellm.completion(
-        messages = [{"role": "user", "content": msg}],
-        **usr_config  
+        messages = build_messages(msg),
+        **{**usr_config, **(credentials or {}), **kwargs}
+    )
+
+    return response.model_dump()
+
+
+async def asend_prompt(recipe, msg: str, credentials: dict = None, model=None, **kwargs) -> dict:
+    """Async version of send_prompt"""
+    usr_config = model_config(recipe, model)
+
+    response = await litellm.acompletion(
+        messages = build_messages(msg),
+        **{**usr_config, **(credentials or {}), **kwargs}
     )
 
     return response.model_dump()
 
 
+def call_llm(recipe, study, credentials: dict = None):
+    msg = compile_prompt(recipe, study)
+    return send_prompt(recipe, msg, credentials)
+
+
+def count_tokens(model: str, msg: str) -> int:
+    """Count the input tokens of a prompt with the tokenizer of the model"""
+    return litellm.token_counter(model=model, messages=build_messages(msg))
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Cost in USD of some tokens. Zero if LiteLLM doesn't know the price of the model"""
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model,
+            prompt_tokens=input_tokens,
+            completion_tokens=output_tokens
+        )
+    except Exception:
+        return 0.0
+
+    return prompt_cost + completion_cost
+
+
+def response_cost(model: str, response: dict) -> float:
+    """Cost in USD of a response"""
+    return estimate_cost(
+        model,
+        response['usage']['prompt_tokens'],
+        response['usage']['completion_tokens']
+    )
+
+
 def extract_json(text: str) -> str:
     """
     Extract the content of the first {...} JSON object in a string.
@@ -73,9 +186,30 @@ def extract_json(text: str) -> str:
     return json.dumps(json_str)
 
 
+def parse_choice(choice: dict) -> dict:
+    """Parse one choice of a response"""
+    content = choice['message']['content']
+    try:
+        # Constrained outputs are only the JSON object
+        parsed_output = LLMResponse.model_validate_json(content)
+    except ValidationError:
+        parsed_output = LLMResponse.model_validate_json(extract_json(content))
+
+    return parsed_output.model_dump(exclude_none=True)
+
+
 def parse_response(response):
     """Parse response from LLM and return it as dict"""
-    json_output = extract_json(response['choices'][0]['message']['content'])
-    parsed_output = LLMResponse.model_validate_json(json_output)
+    return parse_choice(response['choices'][0])
+
+
+def parse_votes(response) -> tuple[list[tuple[int, dict]], list[Exception]]:
+    """Parse every choice of a response. Return the valid (choice_index, vote) pairs and the parsing errors"""
+    votes, errors = [], []
+    for index, choice in enumerate(response['choices']):
+        try:
+            votes.append((index, parse_choice(choice)))
+        except Exception as e:
+            errors.append(e)
 
-    return parsed_output.model_dump()
+    return votes, errors
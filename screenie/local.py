@@ -0,0 +1,81 @@
+import time
+from typing import Optional
+
+import httpx
+
+from screenie.errors import BackendError
+
+
+# Concurrency when the server doesn't report its parallel slots
+LOCAL_CONCURRENCY = 8
+
+# Local servers don't check the API key, but the OpenAI client needs one
+LOCAL_API_KEY = "local"
+
+
+def server_root(base_url: str) -> str:
+    """Root URL of a server from its OpenAI-compatible base URL (e.g. http://host:8080/v1)"""
+    base_url = base_url.rstrip("/")
+    if base_url.endswith("/v1"):
+        base_url = base_url[:-len("/v1")]
+    return base_url
+
+
+def check_health(base_url: str, timeout: float = 5.0) -> str:
+    """
+    Check that a local server is up and its model loaded.
+
+    Servers with a /health endpoint (llama.cpp, vLLM) answer 503 while the
+    model is loading. Others (e.g. Ollama) are checked by listing their models.
+    Return the URL that answered, or raise BackendError.
+    """
+    root = server_root(base_url)
+    try:
+        response = httpx.get(f"{root}/health", timeout=timeout)
+        if response.status_code == 404:
+            response = httpx.get(f"{root}/v1/models", timeout=timeout)
+    except httpx.HTTPError as e:
+        raise BackendError(f"Local server at {base_url} can't be reached: {e}") from e
+
+    if response.status_code == 503:
+        raise BackendError(f"Local server at {base_url} is still loading the model")
+    if response.status_code != 200:
+        raise BackendError(f"Local server at {base_url} is not healthy: HTTP {response.status_code}")
+
+    return str(response.url)
+
+
+def wait_until_ready(base_url: str, timeout: float = 60.0, interval: float = 1.0) -> str:
+    """Check the health of a local server until it is ready or the timeout passes"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return check_health(base_url)
+        except BackendError:
+            if time.monotonic() + interval > deadline:
+                raise
+        time.sleep(interval)
+
+
+def server_slots(base_url: str, timeout: float = 5.0) -> Optional[int]:
+    """Requests a llama.cpp server decodes in parallel (its --parallel slots), or None if unknown"""
+    try:
+        response = httpx.get(f"{server_root(base_url)}/props", timeout=timeout)
+        slots = response.json().get("total_slots") if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError, AttributeError):
+        return None
+
+    return slots if isinstance(slots, int) and slots > 0 else None
+
+
+def default_concurrency(local, base_url: str) -> int:
+    """
+    Requests in flight for a local server.
+
+    Continuous batching decodes one request per slot in each step, so keep
+    every slot busy. More requests would only wait in the server queue while
+    their timeout runs.
+    """
+    if local.concurrency:
+        return local.concurrency
+    return server_slots(base_url) or LOCAL_CONCURRENCY
@@ -0,0 +1,223 @@
+from contextlib import contextmanager
+import datetime
+import json
+import logging
+import os
+from pathlib import Path
+import time
+
+
+logger = logging.getLogger("screenie")
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+PHASES = ("db_fetch", "prompt_render", "llm", "parse", "db_write")
+
+
+class JSONFormatter(logging.Formatter):
+    """Format log records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(log_file: str):
+    """Write structured JSON-lines logs to a file"""
+    handler = logging.FileHandler(log_file, encoding="utf-8")
+    handler.setFormatter(JSONFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def log_event(event: str, level: int = logging.INFO, **fields):
+    logger.log(level, event, extra={"fields": fields})
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+class RunMetrics():
+    """
+    Counters and per-phase timings of a screening run.
+
+    Used to show progress, to log where time goes and to dump the state of
+    the run in OpenMetrics text format.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.started = time.monotonic()
+        self.done = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.included = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.phase_seconds = {phase: 0.0 for phase in PHASES}
+        self.phase_count = {phase: 0 for phase in PHASES}
+        self.last = {}  # Timings of the study screened one at a time, in seconds
+        self.samples = {}  # Every duration of the phases given to keep_samples, in seconds
+        self.stopped_at_recall = None  # Estimated recall if a prioritized run stopped early
+        self.escalated = 0  # Studies sent to the second model of a cascade
+        self.baseline_cost = 0.0  # Estimated cost of running the second model of a cascade on everything
+
+
+    def keep_samples(self, *phases: str):
+        """Keep every duration of these phases, e.g. to take percentiles"""
+        for phase in phases:
+            self.samples.setdefault(phase, [])
+
+
+    def start_study(self):
+        """Start the timings of a study screened one at a time"""
+        self.last = {}
+
+
+    @contextmanager
+    def phase(self, name: str, timings: dict = None):
+        """
+        Time a phase of the pipeline. The time is added to the timings of a
+        study: the given ones, for studies screened concurrently, or last.
+        """
+        if timings is None:
+            timings = self.last
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + elapsed
+            self.phase_count[name] = self.phase_count.get(name, 0) + 1
+            timings[name] = timings.get(name, 0.0) + elapsed
+            if name in self.samples:
+                self.samples[name].append(elapsed)
+
+
+    def record_call(self, response: dict, cost: float):
+        self.input_tokens += response["usage"]["prompt_tokens"]
+        self.output_tokens += response["usage"]["completion_tokens"]
+        self.cost += cost
+
+
+    def record_result(self, verdict: int):
+        self.done += 1
+        self.included += verdict
+
+
+    def record_error(self):
+        self.errors += 1
+
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+    @property
+    def rate(self) -> float:
+        """Studies screened per second"""
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+
+    @property
+    def eta(self) -> float:
+        """Estimated seconds to finish, or None if unknown"""
+        if self.rate == 0:
+            return None
+        return (self.total - self.done) / self.rate
+
+
+    @property
+    def cost_saved(self) -> float:
+        """Cost saved by a cascade compared with running its second model on every study"""
+        return self.baseline_cost - self.cost
+
+
+    @property
+    def error_rate(self) -> float:
+        attempts = self.done + self.errors
+        return self.errors / attempts if attempts else 0.0
+
+
+    def progress_line(self) -> str:
+        eta = format_duration(self.eta) if self.eta is not None else "?"
+        return (
+            f"[{self.done}/{self.total}] "
+            f"{self.rate:.2f} studies/s, ETA {eta}, "
+            f"{self.errors} errors, "
+            f"{self.input_tokens + self.output_tokens:,} tokens, "
+            f"${self.cost:.4f}"
+        )
+
+
+    def summary(self) -> dict:
+        return {
+            "done": self.done,
+            "total": self.total,
+            "errors": self.errors,
+            "included": self.included,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "studies_per_second": round(self.rate, 3),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost, 6),
+            "escalated": self.escalated,
+            "phase_seconds": {k: round(v, 3) for k, v in self.phase_seconds.items()},
+        }
+
+
+    def to_openmetrics(self) -> str:
+        """Render the metrics in OpenMetrics text format"""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# TYPE screenie_{name} {kind}")
+            lines.append(f"# HELP screenie_{name} {help_text}")
+            for labels, value in samples:
+                suffix = "_total" if kind == "counter" else ""
+                lines.append(f"screenie_{name}{suffix}{labels} {value}")
+
+        metric("studies_screened", "counter", "Studies screened in this run.", [("", self.done)])
+        metric("studies_included", "counter", "Studies included in this run.", [("", self.included)])
+        metric("errors", "counter", "Studies that failed in this run.", [("", self.errors)])
+        metric("studies_remaining", "gauge", "Studies left to screen in this run.", [("", self.total - self.done)])
+        metric("tokens", "counter", "Tokens used.", [
+            ('{kind="input"}', self.input_tokens),
+            ('{kind="output"}', self.output_tokens),
+        ])
+        metric("cost_usd", "counter", "Estimated spend in USD.", [("", self.cost)])
+        metric("studies_escalated", "counter", "Studies escalated to the second model of a cascade.", [("", self.escalated)])
+        metric("studies_per_second", "gauge", "Screening throughput.", [("", self.rate)])
+        metric("phase_seconds", "counter", "Time spent in each phase of the pipeline.", [
+            (f'{{phase="{phase}"}}', seconds) for phase, seconds in self.phase_seconds.items()
+        ])
+        metric("last_update_timestamp_seconds", "gauge", "Time of the last update.", [("", time.time())])
+        lines.append("# EOF")
+
+        return "\n".join(lines) + "\n"
+
+
+    def write_openmetrics(self, path: str):
+        """Write the metrics file atomically, so scrapers never read it half-written"""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.to_openmetrics())
+        os.replace(tmp, path)
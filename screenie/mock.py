@@ -0,0 +1,205 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import random
+import threading
+import time
+import uuid
+import zlib
+
+
+class MockLLMServer():
+    """
+    Local OpenAI-compatible server that fakes LLM responses.
+
+    It answers chat completions with a screening verdict derived from the
+    prompt, so runs are reproducible. Latency, server errors, bursts of 429
+    (rate limit) responses, malformed outputs and samples that disagree with
+    the verdict can be simulated to test and benchmark the screening pipeline
+    without a paid API.
+
+    Point a recipe to it with:
+        model = "openai/mock"
+        base_url = "http://127.0.0.1:8000/v1"
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_every: int = 0,
+        rate_limit_burst: int = 0,
+        malformed_rate: float = 0.0,
+        include_rate: float = 0.1,
+        disagreement_rate: float = 0.0,
+        slots: int = None,
+        seed: int = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_burst = rate_limit_burst
+        self.malformed_rate = malformed_rate
+        self.include_rate = include_rate
+        self.disagreement_rate = disagreement_rate
+        self.slots = slots  # Reported in /props, like a llama.cpp server
+
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+    def start(self) -> str:
+        """Serve in a background thread. Return the base URL"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    def next_outcome(self) -> tuple[str, float]:
+        """Decide what the next request gets: 'ok', 'error', 'rate_limit' or 'malformed', and its delay"""
+        with self._lock:
+            count = self.requests
+            self.requests += 1
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+
+            if self.rate_limit_every and count % self.rate_limit_every < self.rate_limit_burst:
+                return "rate_limit", 0.0
+            if self._random.random() < self.error_rate:
+                return "error", delay
+            if self._random.random() < self.malformed_rate:
+                return "malformed", delay
+
+        return "ok", delay
+
+
+    def completion(self, request: dict, malformed: bool = False) -> dict:
+        """Build a chat completion for a request"""
+        prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+        digest = zlib.crc32(prompt.encode())
+        verdict = int(digest % 1000 < self.include_rate * 1000)
+
+        choices = []
+        for index in range(request.get("n") or 1):
+            with self._lock:
+                flipped = self._random.random() < self.disagreement_rate
+
+            choice = {"index": index, "finish_reason": "stop"}
+            if malformed:
+                content = "I think this study should be included, but I am not sure."
+            else:
+                value = 1 - verdict if flipped else verdict
+                reason = json.dumps(f"Mock verdict for prompt {digest:08x}")
+                tokens = ['{"verdict": ', str(value), f', "reason": {reason}}}']
+                content = "".join(tokens)
+                if request.get("logprobs"):
+                    # Confidence between 0.5 and 1, also derived from the prompt
+                    confidence = 0.5 + (digest >> 12) % 500 / 1000
+                    logprobs = [0.0, math.log(confidence), 0.0]
+                    choice["logprobs"] = {"content": [
+                        {"token": token, "logprob": logprob, "bytes": None, "top_logprobs": []}
+                        for token, logprob in zip(tokens, logprobs)
+                    ]}
+            choice["message"] = {"role": "assistant", "content": content}
+            choices.append(choice)
+
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = 20 * len(choices)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    disable_nagle_algorithm = True  # Headers and body are sent apart. Don't wait for ACKs
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+    def do_GET(self):
+        if self.path in ("/health", "/v1/health"):
+            self._send_json(200, {"status": "ok"})
+        elif self.path in ("/models", "/v1/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        elif self.path == "/props" and self.server.mock.slots:
+            self._send_json(200, {"total_slots": self.server.mock.slots})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        mock = self.server.mock
+        outcome, delay = mock.next_outcome()
+        time.sleep(delay)
+
+        if outcome == "rate_limit":
+            error = {"message": "Rate limit reached", "type": "rate_limit_error", "code": "rate_limit_exceeded"}
+            self._send_json(429, {"error": error}, headers={"Retry-After": "1"})
+        elif outcome == "error":
+            self._send_json(500, {"error": {"message": "Mock server error", "type": "server_error"}})
+        else:
+            # Constrained requests always get valid JSON, like a server sampling with a grammar
+            malformed = outcome == "malformed" and not request.get("response_format")
+            self._send_json(200, mock.completion(request, malformed=malformed))
@@ -0,0 +1,325 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from typing import AsyncIterator
+
+from screenie.db import Database
+from screenie.errors import RecipeError
+import screenie.llm as llm
+from screenie.metrics import log_event
+
+
+# Marks the end of the items in a queue
+DONE = object()
+
+# Studies read from the database at a time
+FETCH_CHUNK = 100
+
+
+class Pipeline():
+    """
+    Staged screening pipeline, so reading, LLM calls and writing overlap.
+
+        producer -> LLM workers -> parser -> writer
+
+    The producer streams pending studies and renders their prompts, a pool of
+    workers sends the requests, the parser parses the responses and the writer
+    saves them in batches with executemany. Bounded queues between the stages
+    keep a slow stage from piling up work in memory.
+
+    The database is read and written from two threads with their own
+    connections, so the event loop never waits on SQLite.
+
+    interrupt() stops the run cleanly: no new requests are sent, but the ones
+    in flight finish and every received response is saved. A second call
+    cancels the requests in flight.
+
+    Each stage sends DONE downstream when it ends, even if it fails. run()
+    watches the stages and raises the first failure.
+    """
+
+    def __init__(self, session, studies_ids: list[int], concurrency: int = 4, write_batch: int = 50):
+        recipe = session.recipe
+        if recipe.voting or recipe.cascade:
+            raise RecipeError("Recipes with voting or cascade can't be screened with the pipeline")
+
+        self.session = session
+        self.studies_ids = studies_ids
+        self.concurrency = concurrency
+        self.write_batch = write_batch
+
+        # Load them now, so a config error is raised before starting
+        self.credentials = session.credentials
+
+        self.stopping = False
+        self._cancelled = False  # The producer and the workers were cancelled
+        self._aborting = False   # A stage failed: every stage is cancelled
+        self._producer = None
+        self._workers = []
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenie-reader")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenie-writer")
+        self._reader_db = None
+        self._writer_db = None
+
+
+    def interrupt(self):
+        """Stop sending requests. If already stopping, cancel the requests in flight"""
+        if self.stopping:
+            log_event("pipeline_cancelled", logging.WARNING)
+            self._cancel()
+        else:
+            log_event("pipeline_interrupted", logging.WARNING)
+            self.stopping = True
+
+
+    def _cancel(self):
+        self._cancelled = True
+        for task in [self._producer, *self._workers]:
+            if task is not None:
+                task.cancel()
+
+
+    async def _end(self, queue: asyncio.Queue, count: int = 1):
+        """Send DONE to the next stage, unless the run is aborted and nothing reads it anymore"""
+        for _ in range(count):
+            if self._aborting:
+                return
+            await queue.put(DONE)
+
+
+    # These run in the reader and writer threads. Each thread has its own connection
+
+    def _fetch(self, studies_ids: list[int]) -> dict[int, dict]:
+        if self._reader_db is None:
+            self._reader_db = Database(self.session.db.path)
+        return self._reader_db.fetch_studies(studies_ids)
+
+
+    def _write(self, screened: list[dict]):
+        if self._writer_db is None:
+            self._writer_db = Database(self.session.db.path)
+        self._writer_db.save_screened(self.session.recipe_id, screened)
+
+
+    def _close(self, attribute: str):
+        db = getattr(self, attribute)
+        if db is not None:
+            db.close()
+
+
+    async def _produce(self, requests: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        session = self.session
+        metrics = session.metrics
+
+        try:
+            for start in range(0, len(self.studies_ids), FETCH_CHUNK):
+                if self.stopping:
+                    break
+                chunk = self.studies_ids[start:start + FETCH_CHUNK]
+                chunk_timings = {}
+                with metrics.phase("db_fetch", chunk_timings):
+                    studies = await loop.run_in_executor(self._reader, self._fetch, chunk)
+
+                for study_id in chunk:
+                    if self.stopping:
+                        break
+                    study = studies[study_id]
+                    # Timings of the study through the stages. Shared phases are split evenly
+                    timings = {"db_fetch": chunk_timings["db_fetch"] / len(chunk)}
+                    with metrics.phase("prompt_render", timings):
+                        msg = llm.compile_prompt(session.recipe, session.packer.pack(study_id, study))
+                    await requests.put((study_id, study, msg, timings))
+        finally:
+            # Cancelled with the workers, nobody would read them
+            if not self._cancelled:
+                await self._end(requests, self.concurrency)
+
+
+    async def _work(self, requests: asyncio.Queue, responses: asyncio.Queue):
+        session = self.session
+        credentials = self.credentials
+        kwargs = session.clients.request_kwargs(session.recipe.model, credentials, is_async=True)
+
+        while True:
+            item = await requests.get()
+            if item is DONE:
+                return
+            if self.stopping:
+                # Skip the requests not sent yet
+                continue
+
+            study_id, study, msg, timings = item
+            try:
+                with session.metrics.phase("llm", timings):
+                    response = await llm.asend_prompt(session.recipe, msg, credentials, **kwargs)
+            except Exception as e:
+                await responses.put((study_id, study, timings, None, e))
+                continue
+
+            await responses.put((study_id, study, timings, response, None))
+
+
+    async def _close_workers(self, responses: asyncio.Queue):
+        """End the responses once every worker ended. run() reports their failures"""
+        try:
+            await asyncio.wait(self._workers)
+        finally:
+            await self._end(responses)
+
+
+    async def _parse(self, responses: asyncio.Queue, writes: asyncio.Queue):
+        session = self.session
+        metrics = session.metrics
+        model = session.recipe.model.model
+
+        try:
+            while True:
+                item = await responses.get()
+                if item is DONE:
+                    return
+
+                study_id, study, timings, response, error = item
+                if error is not None:
+                    await writes.put({"study_id": study_id, "study": study, "timings": timings, "error": error, "stage": "calling llm"})
+                    continue
+
+                metrics.record_call(response, llm.response_cost(model, response))
+                output, error = None, None
+                try:
+                    with metrics.phase("parse", timings):
+                        output = llm.parse_response(response)
+                except Exception as e:
+                    error = e
+
+                await writes.put({
+                    "study_id": study_id,
+                    "study": study,
+                    "timings": timings,
+                    "response": response,
+                    "truncated": session.packer.truncated(study_id),
+                    "output": output,
+                    "error": error,
+                    "stage": "parsing response",
+                })
+        finally:
+            await self._end(writes)
+
+
+    async def _flush(self, batch: list[dict], outcomes: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        screened = [item for item in batch if "response" in item]
+        if screened:
+            batch_timings = {}
+            with self.session.metrics.phase("db_write", batch_timings):
+                await loop.run_in_executor(self._writer, self._write, screened)
+            for item in screened:
+                item["timings"]["db_write"] = batch_timings["db_write"] / len(screened)
+            log_event("batch_written", size=len(screened))
+
+        for item in batch:
+            await outcomes.put(item)
+
+
+    async def _write_batches(self, writes: asyncio.Queue, outcomes: asyncio.Queue):
+        batch = []
+        try:
+            while True:
+                item = await writes.get()
+                if item is DONE:
+                    break
+                batch.append(item)
+
+                # Write when the batch is full or nothing else is waiting.
+                # A batch that fails to be written is not written again
+                if len(batch) >= self.write_batch or writes.empty():
+                    full, batch = batch, []
+                    await self._flush(full, outcomes)
+
+            if batch:
+                await self._flush(batch, outcomes)
+        finally:
+            # Unbounded: never waits
+            outcomes.put_nowait(DONE)
+
+
+    def _outcome(self, item: dict) -> dict:
+        """Outcome of a saved study, updating the run metrics"""
+        session = self.session
+        if item["error"] is not None:
+            # Raises TooManyErrorsError after too many failures in a row
+            return session.record_failure(item["study_id"], item["stage"], item["error"])
+
+        return session.record_screened(item["study_id"], item["study"], item["output"], item["timings"], log={
+            "input_tokens": item['response']['usage']['prompt_tokens'],
+            "output_tokens": item['response']['usage']['completion_tokens'],
+        })
+
+
+    async def run(self) -> AsyncIterator[dict]:
+        """Screen the studies. Yield the outcome of each one once it is saved, in the order they finish"""
+        queue_size = 2 * self.concurrency
+        requests = asyncio.Queue(maxsize=queue_size)
+        responses = asyncio.Queue(maxsize=queue_size)
+        writes = asyncio.Queue(maxsize=queue_size)
+        # Unbounded, so the writer never waits on the caller to save what it has
+        outcomes = asyncio.Queue()
+
+        self._producer = asyncio.create_task(self._produce(requests))
+        self._workers = [asyncio.create_task(self._work(requests, responses)) for _ in range(self.concurrency)]
+        closer = asyncio.create_task(self._close_workers(responses))
+        parser = asyncio.create_task(self._parse(responses, writes))
+        writer = asyncio.create_task(self._write_batches(writes, outcomes))
+        stages = [self._producer, *self._workers, closer, parser, writer]
+
+        running = set(stages)
+        next_outcome = None
+        try:
+            while True:
+                next_outcome = asyncio.ensure_future(outcomes.get())
+                while not next_outcome.done():
+                    done, running = await asyncio.wait({next_outcome, *running}, return_when=asyncio.FIRST_COMPLETED)
+                    running.discard(next_outcome)
+                    _raise_failure(done - {next_outcome})
+
+                item = next_outcome.result()
+                if item is DONE:
+                    break
+                yield self._outcome(item)
+
+            # A stage can fail and still end the queues
+            _raise_failure(stages)
+        finally:
+            if next_outcome is not None:
+                next_outcome.cancel()
+            # On errors, stop sending requests but save the responses already received.
+            # If a stage failed, the ones after it can't finish: cancel them all
+            self.stopping = True
+            self._cancel()
+            if any(_failure(task) for task in stages):
+                self._aborting = True
+                for task in stages:
+                    task.cancel()
+            await asyncio.wait(stages)
+
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._reader, self._close, "_reader_db")
+            await loop.run_in_executor(self._writer, self._close, "_writer_db")
+            self._reader.shutdown()
+            self._writer.shutdown()
+
+        self.session._finish_run()
+
+
+def _failure(task: asyncio.Task):
+    """Exception a finished stage failed with, or None"""
+    if not task.done() or task.cancelled():
+        return None
+    return task.exception()
+
+
+def _raise_failure(tasks):
+    for task in tasks:
+        error = _failure(task)
+        if error is not None:
+            raise error
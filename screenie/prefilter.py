@@ -0,0 +1,61 @@
+import re
+from typing import Optional
+
+from screenie.ranking import Ranker
+
+
+def exclusion_reason(prefilter, study: dict) -> Optional[str]:
+    """Check a study against the prefilter rules. Return why it fails, or None if it passes"""
+    year = study["year"]
+    if prefilter.year_min is not None and year < prefilter.year_min:
+        return f"Prefilter: published in {year}, before {prefilter.year_min}"
+    if prefilter.year_max is not None and year > prefilter.year_max:
+        return f"Prefilter: published in {year}, after {prefilter.year_max}"
+
+    if prefilter.require_abstract and not study["abstract"].strip():
+        return "Prefilter: no abstract"
+
+    text = f"{study['title']}\n{study['abstract']}"
+    for pattern in prefilter.require:
+        if not re.search(pattern, text, re.IGNORECASE):
+            return f"Prefilter: does not match required expression '{pattern}'"
+    for pattern in prefilter.forbid:
+        if re.search(pattern, text, re.IGNORECASE):
+            return f"Prefilter: matches forbidden expression '{pattern}'"
+
+    return None
+
+
+def apply_prefilter(recipe, studies: list[dict], corpus: dict[int, str] = None) -> list[tuple[int, str]]:
+    """
+    Run the prefilter of a recipe over a list of studies.
+    Return (study_id, reason) for each excluded study.
+
+    The similarity between each abstract and the criteria is computed at once
+    for all the studies that pass the other rules. Its IDF weights come from
+    the corpus (title and abstract by study ID, e.g. every study in the
+    database), so a study gets the same similarity whatever else is pending.
+    Defaults to the given studies.
+    """
+    prefilter = recipe.prefilter
+    exclusions = []
+    passed = []
+    for study in studies:
+        reason = exclusion_reason(prefilter, study)
+        if reason:
+            exclusions.append((study["study_id"], reason))
+        else:
+            passed.append(study)
+
+    if prefilter.min_similarity is not None and passed:
+        if corpus is None:
+            corpus = {s["study_id"]: f"{s['title']} {s['abstract']}" for s in studies}
+        ranker = Ranker(corpus)
+        similarities = ranker.similarity(recipe.criteria)
+        for study in passed:
+            similarity = similarities[ranker.position[study["study_id"]]]
+            if similarity < prefilter.min_similarity:
+                reason = f"Prefilter: similarity with criteria {similarity:.3f} below {prefilter.min_similarity}"
+                exclusions.append((study["study_id"], reason))
+
+    return exclusions
@@ -0,0 +1,163 @@
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]{2,}")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split a text into lowercase word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def _row_sums(values, rows, n_rows):
+    """Sum the entries of a sparse matrix by row"""
+    return np.bincount(rows, weights=values, minlength=n_rows)
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class Ranker():
+    """
+    Rank studies by their predicted probability of inclusion.
+
+    Studies are represented as hashed TF-IDF vectors, built once for the
+    whole database. A logistic regression is trained on the verdicts already
+    known and used to score the pending studies. Retraining starts from the
+    previous weights, so refitting after a few new verdicts is cheap.
+    """
+
+    def __init__(self, documents: dict[int, str], n_features: int = 2**18):
+        self.n_features = n_features
+        self.ids = np.fromiter(documents.keys(), dtype=np.int64, count=len(documents))
+        self.position = {study_id: i for i, study_id in enumerate(documents)}
+        self.weights = None
+        self.bias = 0.0
+
+        indices = []
+        counts = []
+        lengths = []
+        for text in documents.values():
+            features = self._features(text)
+            indices.extend(features.keys())
+            counts.extend(features.values())
+            lengths.append(len(features))
+
+        n_docs = len(documents)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.rows = np.repeat(np.arange(n_docs), lengths)
+
+        # Sublinear term frequency times smoothed inverse document frequency
+        df = np.bincount(self.indices, minlength=n_features)
+        self.idf = np.log((1 + n_docs) / (1 + df)) + 1
+        data = (1 + np.log(np.asarray(counts, dtype=np.float64))) * self.idf[self.indices]
+
+        # L2-normalize each document
+        norms = np.sqrt(_row_sums(data**2, self.rows, n_docs))
+        norms[norms == 0] = 1.0
+        self.data = data / norms[self.rows]
+
+
+    def _features(self, text: str) -> Counter:
+        return Counter(zlib.crc32(token.encode()) % self.n_features for token in tokenize(text))
+
+
+    def _rows_of(self, study_ids) -> np.ndarray:
+        return np.fromiter((self.position[i] for i in study_ids), dtype=np.int64, count=len(study_ids))
+
+
+    def decision_function(self) -> np.ndarray:
+        """Linear score of every document in the corpus"""
+        values = self.data * self.weights[self.indices]
+        return _row_sums(values, self.rows, len(self.ids)) + self.bias
+
+
+    def similarity(self, text: str) -> np.ndarray:
+        """Cosine similarity between a text and every document in the corpus"""
+        query = np.zeros(self.n_features)
+        for index, count in self._features(text).items():
+            query[index] = (1 + np.log(count)) * self.idf[index]
+
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self.ids))
+
+        return _row_sums(self.data * query[self.indices], self.rows, len(self.ids)) / norm
+
+
+    def fit(self, labels: dict[int, int], iterations: int = 200, learning_rate: float = 2.0, l2: float = 1e-4) -> bool:
+        """
+        Train on known verdicts ({study_id: 0 or 1}).
+
+        Returns False if there are not verdicts of both classes yet.
+        Classes are weighted to be balanced, since inclusions are usually rare.
+        """
+        y = np.fromiter(labels.values(), dtype=np.float64, count=len(labels))
+        n_pos = y.sum()
+        if n_pos == 0 or n_pos == len(y):
+            return False
+
+        # Warm start: after the first fit a few iterations are enough
+        if self.weights is None:
+            self.weights = np.zeros(self.n_features)
+        else:
+            iterations = max(1, iterations // 4)
+
+        # Extract the rows of the labelled studies
+        position = np.full(len(self.ids), -1, dtype=np.int64)
+        position[self._rows_of(list(labels.keys()))] = np.arange(len(y))
+        sub_rows = position[self.rows]
+        mask = sub_rows >= 0
+        sub_rows = sub_rows[mask]
+        sub_indices = self.indices[mask]
+        sub_data = self.data[mask]
+
+        n = len(y)
+        sample_weight = np.where(y == 1, n / (2 * n_pos), n / (2 * (n - n_pos)))
+
+        w = self.weights
+        b = self.bias
+        for _ in range(iterations):
+            z = _row_sums(sub_data * w[sub_indices], sub_rows, n) + b
+            error = sample_weight * (_sigmoid(z) - y) / n
+            grad_w = np.bincount(sub_indices, weights=sub_data * error[sub_rows], minlength=self.n_features)
+            w = w - learning_rate * (grad_w + l2 * w)
+            b = b - learning_rate * error.sum()
+
+        self.weights = w
+        self.bias = b
+        return True
+
+
+    def predict(self, study_ids: list[int]) -> np.ndarray:
+        """Probability of inclusion for each study. All 0.5 if not trained"""
+        if self.weights is None:
+            return np.full(len(study_ids), 0.5)
+        scores = _sigmoid(self.decision_function())
+        return scores[self._rows_of(study_ids)]
+
+
+    def rank(self, study_ids: list[int]) -> tuple[list[int], np.ndarray]:
+        """Sort studies by predicted relevance, most likely inclusions first"""
+        scores = self.predict(study_ids)
+        order = np.argsort(-scores, kind="stable")
+        return [study_ids[i] for i in order], scores[order]
+
+
+def estimated_recall(labels: dict[int, int], pending_scores: np.ndarray) -> float:
+    """
+    Estimate the fraction of relevant studies already found.
+
+    Expected inclusions left in the pending pool are the sum of their predicted
+    probabilities. Balanced training inflates these probabilities, so the
+    estimate errs on the conservative (low) side.
+    """
+    found = sum(labels.values())
+    if found == 0:
+        return 0.0
+    return found / (found + float(np.sum(pending_scores)))
@@ -1,8 +1,8 @@
 from string import Template
-from typing import Optional, Union
+from typing import Literal, Optional, Union
 import tomllib
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 class Model(BaseModel):
     model: str
@@ -17,10 +17,103 @@ class Model(BaseModel):
     api_version: Optional[str] = None
 
 
+class Prefilter(BaseModel):
+    """Local rules to exclude studies before calling the LLM"""
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    require_abstract: bool = False
+    require: list[str] = []      # Regex that must all match title or abstract
+    forbid: list[str] = []       # Regex that must not match title nor abstract
+    min_similarity: Optional[float] = None  # TF-IDF cosine similarity with the criteria
+
+
+class Budget(BaseModel):
+    """Limits on the study fields inserted in the prompt"""
+    max_authors: Optional[int] = None  # Keep the first authors, then "et al."
+    max_tokens: dict[str, int] = {}    # Max tokens of each field, e.g. abstract = 400
+
+
+class Lineage(BaseModel):
+    """Parent of a recipe, whose results can be reused"""
+    parent: Union[int, str]  # Recipe ID or recipe file (relative to this recipe)
+    rescreen: Literal["includes", "all"] = "includes"  # Studies to screen again if the output can change
+    audit_fraction: float = Field(0.0, ge=0, le=1)  # Random fraction of the other studies to screen again too
+    seed: int = 0
+
+
+class Voting(BaseModel):
+    """Self-consistency voting: sample the model several times per study"""
+    min_votes: int = Field(2, ge=1)  # Votes always collected
+    max_votes: int = Field(5, ge=1)  # Votes collected at most
+    min_agreement: float = Field(1.0, gt=0, le=1)  # Stop sampling once this fraction of the votes agree
+
+    @model_validator(mode="after")
+    def check_votes(self):
+        if self.max_votes < self.min_votes:
+            raise ValueError("max_votes can't be less than min_votes")
+        return self
+
+
+class Cascade(BaseModel):
+    """Stronger model that screens again the studies the recipe model is unsure about"""
+    model: Model
+    confidence: Literal["logprobs", "self_reported"] = "logprobs"  # Where the confidence of a verdict comes from
+    min_confidence: float = Field(0.8, ge=0, le=1)  # Escalate verdicts less confident than this
+    escalate_includes: bool = False  # Escalate every study the first model includes
+    escalate_match: list[str] = []   # Escalate studies whose title or abstract match any of these regex
+
+
+class Local(BaseModel):
+    """Local inference server (llama.cpp, vLLM, Ollama...) serving the model at its base_url"""
+    constrained: bool = True      # Constrain the output to the JSON schema of the verdict
+    concurrency: Optional[int] = None  # Requests in flight. By default, the parallel slots of the server
+    health_timeout: float = 60.0  # Seconds to wait for the server to be ready (e.g. loading the model)
+
+
+# Model parameters that don't change the output of the model
+NON_OUTPUT_FIELDS = {"timeout", "base_url", "api_version"}
+
+# Local server settings that don't change the output of the model
+NON_OUTPUT_LOCAL_FIELDS = {"concurrency", "health_timeout"}
+
+
 class Recipe(BaseModel):
     model: Model
     prompt: str
     criteria: str
+    prefilter: Optional[Prefilter] = None
+    budget: Optional[Budget] = None
+    lineage: Optional[Lineage] = None
+    voting: Optional[Voting] = None
+    cascade: Optional[Cascade] = None
+    local: Optional[Local] = None
+
+    @model_validator(mode="after")
+    def check_modes(self):
+        if self.voting and self.cascade:
+            raise ValueError("A recipe can't use voting and cascade together")
+        if self.local and not self.model.base_url:
+            raise ValueError("A recipe with a local server needs the base_url of the model")
+        return self
+
+    def content(self) -> str:
+        """
+        JSON that identifies the recipe in the database.
+        Optional sections are left out when not used, so adding new sections
+        doesn't change the identity of recipes already stored.
+        """
+        unused = {name for name, value in self if value is None}
+        return self.model_dump_json(exclude=unused)
+
+
+def output_changed(parent: Recipe, child: Recipe) -> bool:
+    """Check if two recipes can give different results, ignoring their lineage and non-output parameters"""
+    def output_fields(recipe):
+        return recipe.model_dump(
+            exclude={"lineage": True, "model": NON_OUTPUT_FIELDS, "local": NON_OUTPUT_LOCAL_FIELDS}
+        )
+
+    return output_fields(parent) != output_fields(child)
 
 
 def read_recipe(file: str):
@@ -0,0 +1,151 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+from typing import Optional
+
+from screenie.db import Database
+from screenie.errors import RecipeError
+import screenie.llm as llm
+
+
+# Changed verdicts listed in the report, at most
+MAX_CHANGES = 20
+
+
+def parse_calls(calls: list[tuple[int, str]]) -> list[Optional[dict]]:
+    """Parse stored responses with the current parser. None for the ones that can't be parsed"""
+    parsed = []
+    for call_id, full_response in calls:
+        try:
+            parsed.append(llm.parse_response(json.loads(full_response)))
+        except Exception:
+            parsed.append(None)
+
+    return parsed
+
+
+def last_call_id(database: str) -> int:
+    """Last LLM call of a database, to track the progress of a reparse"""
+    db = Database(database)
+    try:
+        return db.con.execute("SELECT COALESCE(MAX(call_id), 0) FROM llm_calls").fetchone()[0]
+    finally:
+        db.close()
+
+
+def _recipes(db, recipe_id: int = None) -> tuple[list[int], list[int]]:
+    """Recipes to reparse, and the voting recipes skipped"""
+    rows = db.con.execute(
+        "SELECT recipe_id, content FROM recipes WHERE ? IS NULL OR recipe_id = ? ORDER BY recipe_id",
+        (recipe_id, recipe_id)
+    ).fetchall()
+    if recipe_id is not None and not rows:
+        raise RecipeError(f"Recipe {recipe_id} is not in the database")
+
+    recipes_ids, skipped = [], []
+    for row_id, content in rows:
+        # Voting results come from the votes of several calls
+        (skipped if json.loads(content).get("voting") else recipes_ids).append(row_id)
+
+    return recipes_ids, skipped
+
+
+def _compare(report: dict, rows: list[dict], outputs: list[Optional[dict]]) -> tuple[list, list]:
+    """Count the differences of a batch. Return the results to update and to add"""
+    updates, new = [], []
+    for row, output in zip(rows, outputs):
+        report["calls"] += 1
+        if output is None:
+            # Results that can't be parsed anymore are kept
+            report["unparsable" if row["suggestion_id"] is None else "broken"] += 1
+            continue
+
+        verdict, reason = output["verdict"], output["reason"]
+        if row["suggestion_id"] is None:
+            report["recovered"] += 1
+            new.append((row["recipe_id"], row["study_id"], row["call_id"], verdict, reason))
+        elif verdict != row["verdict"]:
+            report["changed"] += 1
+            updates.append((verdict, reason, row["suggestion_id"]))
+        elif reason != row["reason"]:
+            report["reason_changed"] += 1
+            updates.append((verdict, reason, row["suggestion_id"]))
+            continue
+        else:
+            report["unchanged"] += 1
+            continue
+
+        if len(report["changes"]) < MAX_CHANGES:
+            report["changes"].append({
+                "recipe_id": row["recipe_id"],
+                "study_id": row["study_id"],
+                "call_id": row["call_id"],
+                "old": row["verdict"],
+                "new": verdict,
+            })
+
+    return updates, new
+
+
+def reparse(
+    database: str,
+    recipe_id: int = None,
+    workers: int = None,
+    batch_size: int = 2000,
+    dry_run: bool = False,
+    progress=None
+) -> dict:
+    """
+    Derive the results again from the stored responses, with the current parser.
+    No LLM is called.
+
+    LLM calls are read in batches by call ID and parsed in worker processes
+    while the next batches are read. Only the results that change are
+    written, one transaction per batch. Studies whose responses couldn't be
+    parsed get a result if they can now. Results that can't be parsed anymore
+    are kept. Voting recipes are skipped.
+
+    If given, progress(n) is called with the call IDs advanced after each batch.
+    Return a report with the counts and the first changed verdicts.
+    """
+    workers = workers or os.cpu_count() or 1
+    report = {
+        "calls": 0, "unchanged": 0, "changed": 0, "reason_changed": 0,
+        "recovered": 0, "unparsable": 0, "broken": 0,
+        "skipped_recipes": [], "changes": [], "dry_run": dry_run,
+    }
+
+    db = Database(database)
+    try:
+        recipes_ids, report["skipped_recipes"] = _recipes(db, recipe_id)
+        if not recipes_ids:
+            return report
+
+        # Batches sent to the workers, oldest first. Enough to keep them busy
+        in_flight = deque()
+        position = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                rows = db.fetch_calls_to_reparse(recipes_ids, position, batch_size)
+                if rows:
+                    calls = [(row["call_id"], row.pop("full_response")) for row in rows]
+                    advance = rows[-1]["call_id"] - position
+                    position = rows[-1]["call_id"]
+                    in_flight.append((rows, advance, executor.submit(parse_calls, calls)))
+
+                if not in_flight:
+                    break
+                if rows and len(in_flight) < 2 * workers:
+                    continue
+
+                rows, advance, future = in_flight.popleft()
+                updates, new = _compare(report, rows, future.result())
+                if not dry_run and (updates or new):
+                    db.update_results(updates, new)
+                if progress:
+                    progress(advance)
+    finally:
+        db.close()
+
+    return report
@@ -10,7 +10,10 @@ CREATE TABLE IF NOT EXISTS recipes (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     content TEXT NOT NULL UNIQUE,
     file_id INTEGER NOT NULL,  
-    FOREIGN KEY (file_id) REFERENCES files (file_id)
+    parent_id INTEGER,  -- Recipe whose results this one reuses
+    prefiltered_until INTEGER,  -- Last study ID its prefilter ran on
+    FOREIGN KEY (file_id) REFERENCES files (file_id),
+    FOREIGN KEY (parent_id) REFERENCES recipes (recipe_id)
 );
 
 CREATE TABLE IF NOT EXISTS studies (
@@ -27,6 +30,8 @@ CREATE TABLE IF NOT EXISTS studies (
     FOREIGN KEY (file_id) REFERENCES files (file_id)
 );
 
+CREATE INDEX IF NOT EXISTS studies_year ON studies (year);
+
 CREATE TABLE IF NOT EXISTS llm_calls (
     call_id INTEGER PRIMARY KEY,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -35,6 +40,7 @@ CREATE TABLE IF NOT EXISTS llm_calls (
     recipe_id INTEGER NOT NULL,
     study_id INTEGER NOT NULL,
     full_response TEXT NOT NULL,
+    truncated TEXT,  -- JSON list of the study fields truncated to fit the recipe budget
     FOREIGN KEY (recipe_id) REFERENCES recipes (recipe_id),
     FOREIGN KEY (study_id) REFERENCES studies (study_id)
 );
@@ -44,10 +50,175 @@ CREATE TABLE IF NOT EXISTS results (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     recipe_id INTEGER NOT NULL,
     study_id INTEGER NOT NULL,
-    call_id INTEGER NOT NULL,
+    call_id INTEGER,  -- NULL for studies excluded by prefilter rules
     verdict INTEGER NOT NULL CHECK (verdict IN (0, 1)),  -- 0: Reject, 1: Accept
     reason TEXT NOT NULL,
+    agreement REAL,  -- Fraction of votes for the verdict. NULL without voting
+    primary_call_id INTEGER,  -- Call to the first model of a cascade, if the study was escalated
     FOREIGN KEY (recipe_id) REFERENCES recipes (recipe_id),
     FOREIGN KEY (study_id) REFERENCES studies (study_id),
-    FOREIGN KEY (call_id) REFERENCES llm_calls (call_id)
+    FOREIGN KEY (call_id) REFERENCES llm_calls (call_id),
+    FOREIGN KEY (primary_call_id) REFERENCES llm_calls (call_id)
+);
+
+-- Pending studies of a recipe, and results of a call, without scans
+CREATE INDEX IF NOT EXISTS results_recipe_study ON results (recipe_id, study_id);
+CREATE INDEX IF NOT EXISTS results_call ON results (call_id);
+CREATE INDEX IF NOT EXISTS llm_calls_recipe_study ON llm_calls (recipe_id, study_id);
+
+CREATE TABLE IF NOT EXISTS votes (
+    vote_id INTEGER PRIMARY KEY,
+    call_id INTEGER NOT NULL,
+    choice_index INTEGER NOT NULL,
+    recipe_id INTEGER NOT NULL,
+    study_id INTEGER NOT NULL,
+    verdict INTEGER NOT NULL CHECK (verdict IN (0, 1)),
+    reason TEXT NOT NULL,
+    FOREIGN KEY (call_id) REFERENCES llm_calls (call_id),
+    FOREIGN KEY (recipe_id) REFERENCES recipes (recipe_id),
+    FOREIGN KEY (study_id) REFERENCES studies (study_id)
+);
+
+-- Only in databases made by `screenie shard`
+CREATE TABLE IF NOT EXISTS shard_info (
+    shard_key TEXT PRIMARY KEY,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    shard_index INTEGER NOT NULL,
+    shard_count INTEGER NOT NULL,
+    max_recipe_id INTEGER NOT NULL  -- Last recipe copied from the source database
+);
+
+-- Shards already merged into this database
+CREATE TABLE IF NOT EXISTS merged_shards (
+    shard_key TEXT PRIMARY KEY,
+    merged_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    shard_index INTEGER NOT NULL,
+    shard_count INTEGER NOT NULL
+);
+
+-- Studies that failed: the LLM call or the parsing of its response
+CREATE TABLE IF NOT EXISTS failures (
+    failure_id INTEGER PRIMARY KEY,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    recipe_id INTEGER NOT NULL,
+    study_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    error TEXT NOT NULL,
+    FOREIGN KEY (recipe_id) REFERENCES recipes (recipe_id),
+    FOREIGN KEY (study_id) REFERENCES studies (study_id)
+);
+
+CREATE INDEX IF NOT EXISTS failures_recipe ON failures (recipe_id, failure_id);
+
+-- Summary tables, kept up to date by the triggers below,
+-- so status queries never scan results nor llm_calls
+CREATE TABLE IF NOT EXISTS recipe_stats (
+    recipe_id INTEGER PRIMARY KEY,
+    screened INTEGER NOT NULL DEFAULT 0,
+    included INTEGER NOT NULL DEFAULT 0,
+    rule_excluded INTEGER NOT NULL DEFAULT 0,
+    llm_calls INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (recipe_id) REFERENCES recipes (recipe_id)
+);
+
+CREATE TABLE IF NOT EXISTS db_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS studies_stats_insert AFTER INSERT ON studies BEGIN
+    INSERT INTO db_stats (name, value) VALUES ('studies', 1)
+    ON CONFLICT (name) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS studies_stats_delete AFTER DELETE ON studies BEGIN
+    UPDATE db_stats SET value = value - 1 WHERE name = 'studies';
+END;
+
+-- Full-text index of the studies, to select subsets with `--match`.
+-- It reads the text from the studies table, and the triggers keep it in sync.
+-- Bulk imports turn them off (search_index = 0) and the index is rebuilt at once when used
+CREATE VIRTUAL TABLE IF NOT EXISTS studies_fts USING fts5 (
+    title, abstract, journal, authors,
+    content = 'studies', content_rowid = 'study_id',
+    tokenize = 'porter unicode61'
 );
+
+-- Databases that already had studies need the index built
+INSERT OR IGNORE INTO db_stats (name, value) SELECT 'search_index', NOT EXISTS (SELECT 1 FROM studies);
+
+CREATE TRIGGER IF NOT EXISTS studies_fts_insert AFTER INSERT ON studies
+WHEN (SELECT value FROM db_stats WHERE name = 'search_index') BEGIN
+    INSERT INTO studies_fts (rowid, title, abstract, journal, authors)
+    VALUES (NEW.study_id, NEW.title, NEW.abstract, NEW.journal, NEW.authors);
+END;
+
+CREATE TRIGGER IF NOT EXISTS studies_fts_delete AFTER DELETE ON studies
+WHEN (SELECT value FROM db_stats WHERE name = 'search_index') BEGIN
+    INSERT INTO studies_fts (studies_fts, rowid, title, abstract, journal, authors)
+    VALUES ('delete', OLD.study_id, OLD.title, OLD.abstract, OLD.journal, OLD.authors);
+END;
+
+CREATE TRIGGER IF NOT EXISTS studies_fts_update AFTER UPDATE OF title, abstract, journal, authors ON studies
+WHEN (SELECT value FROM db_stats WHERE name = 'search_index') BEGIN
+    INSERT INTO studies_fts (studies_fts, rowid, title, abstract, journal, authors)
+    VALUES ('delete', OLD.study_id, OLD.title, OLD.abstract, OLD.journal, OLD.authors);
+    INSERT INTO studies_fts (rowid, title, abstract, journal, authors)
+    VALUES (NEW.study_id, NEW.title, NEW.abstract, NEW.journal, NEW.authors);
+END;
+
+CREATE TRIGGER IF NOT EXISTS results_stats_insert AFTER INSERT ON results BEGIN
+    INSERT INTO recipe_stats (recipe_id, screened, included, rule_excluded)
+    VALUES (NEW.recipe_id, 1, NEW.verdict, NEW.call_id IS NULL)
+    ON CONFLICT (recipe_id) DO UPDATE SET
+        screened = screened + 1,
+        included = included + excluded.included,
+        rule_excluded = rule_excluded + excluded.rule_excluded;
+END;
+
+CREATE TRIGGER IF NOT EXISTS results_stats_delete AFTER DELETE ON results BEGIN
+    UPDATE recipe_stats SET
+        screened = screened - 1,
+        included = included - OLD.verdict,
+        rule_excluded = rule_excluded - (OLD.call_id IS NULL)
+    WHERE recipe_id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS results_stats_update AFTER UPDATE OF recipe_id, verdict, call_id ON results BEGIN
+    UPDATE recipe_stats SET
+        screened = screened - 1,
+        included = included - OLD.verdict,
+        rule_excluded = rule_excluded - (OLD.call_id IS NULL)
+    WHERE recipe_id = OLD.recipe_id;
+    INSERT INTO recipe_stats (recipe_id, screened, included, rule_excluded)
+    VALUES (NEW.recipe_id, 1, NEW.verdict, NEW.call_id IS NULL)
+    ON CONFLICT (recipe_id) DO UPDATE SET
+        screened = screened + 1,
+        included = included + excluded.included,
+        rule_excluded = rule_excluded + excluded.rule_excluded;
+END;
+
+CREATE TRIGGER IF NOT EXISTS llm_calls_stats_insert AFTER INSERT ON llm_calls BEGIN
+    INSERT INTO recipe_stats (recipe_id, llm_calls, input_tokens, output_tokens)
+    VALUES (NEW.recipe_id, 1, NEW.input_tokens, NEW.output_tokens)
+    ON CONFLICT (recipe_id) DO UPDATE SET
+        llm_calls = llm_calls + 1,
+        input_tokens = input_tokens + excluded.input_tokens,
+        output_tokens = output_tokens + excluded.output_tokens;
+END;
+
+CREATE TRIGGER IF NOT EXISTS llm_calls_stats_delete AFTER DELETE ON llm_calls BEGIN
+    UPDATE recipe_stats SET
+        llm_calls = llm_calls - 1,
+        input_tokens = input_tokens - OLD.input_tokens,
+        output_tokens = output_tokens - OLD.output_tokens
+    WHERE recipe_id = OLD.recipe_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS failures_stats_insert AFTER INSERT ON failures BEGIN
+    INSERT INTO recipe_stats (recipe_id, failures) VALUES (NEW.recipe_id, 1)
+    ON CONFLICT (recipe_id) DO UPDATE SET failures = failures + 1;
+END;
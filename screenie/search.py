@@ -0,0 +1,32 @@
+class Selector():
+    """
+    Subset of the studies to screen, export or count.
+
+    `where` is an SQL condition over the columns of the studies table, e.g.
+    "year >= 2015". `match` is an FTS5 query over the title, abstract, journal
+    and authors, e.g. 'title:"meta-analysis"'. Studies must meet both.
+    """
+
+    def __init__(self, where: str = None, match: str = None):
+        self.where = where
+        self.match = match
+
+
+    def __bool__(self):
+        return bool(self.where or self.match)
+
+
+    def sql(self, column: str = "study_id") -> tuple[str, list]:
+        """SQL condition on a study ID column, and its parameters"""
+        conditions, params = [], []
+        if self.where:
+            conditions.append(f"{column} IN (SELECT study_id FROM studies WHERE {self.where})")
+        if self.match:
+            conditions.append(f"{column} IN (SELECT rowid FROM studies_fts WHERE studies_fts MATCH ?)")
+            params.append(self.match)
+
+        return " AND ".join(conditions) or "1", params
+
+
+# Every study
+ALL_STUDIES = Selector()
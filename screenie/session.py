@@ -0,0 +1,868 @@
+import asyncio
+import json
+import logging
+from pathlib import Path
+import random
+import sqlite3
+import tomllib
+from typing import Any, AsyncIterator, Generator, Iterator, NamedTuple, Optional, Union
+
+from pydantic import ValidationError
+
+from screenie.budget import Packer
+import screenie.cascade as cascade
+from screenie.clients import ClientPool
+import screenie.config as config
+from screenie.db import Database
+from screenie.errors import (
+    ConfigError,
+    NoRecipeError,
+    RecipeConflictError,
+    RecipeError,
+    SelectorError,
+    StudiesImportError,
+    TooManyErrorsError
+)
+import screenie.llm as llm
+import screenie.local as local
+from screenie.metrics import RunMetrics, log_event
+from screenie.pipeline import Pipeline
+import screenie.prefilter as prefilter
+import screenie.ranking as ranking
+import screenie.recipes as recipes
+from screenie.search import ALL_STUDIES, Selector
+import screenie.studies as studies
+import screenie.voting as voting
+
+
+# Stop a run if this many studies fail in a row (e.g. invalid API key)
+MAX_CONSECUTIVE_ERRORS = 5
+
+# Requests in flight of a pipeline with a hosted model
+DEFAULT_CONCURRENCY = 4
+
+# Output tokens per study assumed by dry runs when the recipe has no max_tokens
+DRY_RUN_OUTPUT_TOKENS = 150
+
+
+class Request(NamedTuple):
+    """LLM request of a study, to send with send_prompt or asend_prompt"""
+    msg: str
+    credentials: dict
+    model: Optional[recipes.Model] = None  # None for the recipe model
+    kwargs: Optional[dict] = None  # Extra arguments, e.g. n
+
+
+# Screens a study: yields its requests, gets their responses, returns its outcome
+Steps = Generator[Request, Any, dict]
+
+
+class ScreeningSession():
+    """
+    Long-lived screening session over one database.
+
+    Keeps the database open, the recipe compiled, the model credentials
+    loaded and a pool of HTTP clients warm, so it can be embedded in a service
+    and reused across jobs.
+    Errors are raised as subclasses of ScreenieError.
+
+        with ScreeningSession("review.db", recipe="recipe.toml") as session:
+            for outcome in session.screen(10):
+                print(outcome["verdict"], outcome["reason"])
+    """
+
+    def __init__(self, database: str, recipe: str = None, credentials: dict = None, clients: ClientPool = None):
+        self.db = Database(database)
+        self.clients = clients or ClientPool()
+        self.recipe = None
+        self.recipe_id = None
+        self.packer = None
+        self.metrics = None
+        self.excluded = 0
+        self.inherited = 0
+        self.selector = ALL_STUDIES
+        self._credentials = credentials  # Given credentials are used for every model
+        self._model_credentials = {}
+
+        if recipe:
+            self.load_recipe(recipe)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def close(self):
+        self.clients.close()
+        self.db.close()
+
+
+    def import_(self, input_file: str) -> tuple[int, list]:
+        """Import studies from a bibliography file. Return the number imported and the validation errors"""
+        try:
+            studies_list, errors = studies.import_studies(input_file=input_file)
+        except ValueError as e:
+            raise StudiesImportError(str(e)) from e
+
+        if studies_list:
+            file_id = self.db.save_file(input_file)
+            self.db.save_studies(file_id=file_id, studies_list=studies_list)
+            self.db.commit()
+
+        return len(studies_list), errors
+
+
+    def load_recipe(self, recipe_file: str, commit: bool = True) -> int:
+        """
+        Read a recipe, register it in the database and apply its prefilter.
+        Return the recipe ID.
+
+        Without commit (e.g. for a dry run), the changes are left uncommitted
+        so closing the session rolls them back.
+        """
+        try:
+            recipe = recipes.read_recipe(recipe_file)
+        except KeyError as e:
+            raise RecipeError(f"Error in the definition of recipe {recipe_file}. Missing field: {e}") from e
+        except (ValidationError, tomllib.TOMLDecodeError) as e:
+            raise RecipeError(f"Error in the definition of recipe {recipe_file}: {e}") from e
+
+        try:
+            llm.check_prompt(recipe)
+        except ValueError as e:
+            raise RecipeError(f"Error in the prompt of recipe {recipe_file}: {e}") from e
+
+        try:
+            cascade.check_confidence(recipe)
+        except ValueError as e:
+            raise RecipeError(f"Error in the cascade of recipe {recipe_file}: {e}") from e
+
+        file_id = self.db.fetch_file_id(recipe_file)
+        recipe_id = self.db.fetch_recipe_id(recipe)
+
+        if not file_id and self.db.is_filename_used(recipe_file):
+            raise RecipeConflictError(
+                "A recipe with the same filename already exists in the database, "
+                "but its contents are different. Please use a unique filename or update the existing recipe."
+            )
+        elif not file_id:
+            parent_id = self._resolve_parent(recipe, recipe_file)
+            file_id = self.db.save_file(recipe_file)
+            recipe_id = self.db.save_recipe(recipe, file_id, parent_id)
+            self.inherited = self._inherit_results(recipe, recipe_id, parent_id)
+
+        self.recipe = recipe
+        self.recipe_id = recipe_id
+        self.packer = Packer(recipe)
+        self.excluded = self._apply_prefilter()
+        if commit:
+            self.db.commit()
+
+        return recipe_id
+
+
+    def _resolve_parent(self, recipe, recipe_file: str) -> int:
+        """ID of the parent recipe declared in the lineage, or None"""
+        if not recipe.lineage:
+            return None
+
+        parent = recipe.lineage.parent
+        if isinstance(parent, int):
+            parent_id = parent if self.db.fetch_recipe_content(parent) else None
+        else:
+            parent_file = Path(recipe_file).parent / parent
+            try:
+                parent_id = self.db.fetch_recipe_id(recipes.read_recipe(parent_file))
+            except (OSError, KeyError, ValidationError, tomllib.TOMLDecodeError) as e:
+                raise RecipeError(f"Can't read the parent recipe {parent_file}: {e}") from e
+
+        if not parent_id:
+            raise RecipeError(f"The parent recipe {parent} is not in the database. Run it before its children")
+
+        return parent_id
+
+
+    def _inherit_results(self, recipe, recipe_id: int, parent_id: int) -> int:
+        """
+        Copy the results of the parent recipe that don't need to be screened again.
+        Return how many were copied.
+
+        If only parameters that don't change the output changed, all results are
+        reused. Otherwise, the studies selected by the lineage policy are left
+        pending: the parent includes (or all studies) plus a random audit sample.
+        """
+        if parent_id is None:
+            return 0
+
+        lineage = recipe.lineage
+        parent = recipes.Recipe.model_validate_json(self.db.fetch_recipe_content(parent_id))
+        verdicts = self.db.fetch_verdicts(parent_id)
+
+        rescreen = set()
+        if recipes.output_changed(parent, recipe):
+            # The prefilter of this recipe decides again on the studies excluded by rules
+            rescreen = self.db.fetch_rule_excluded_ids(parent_id)
+            if lineage.rescreen == "all":
+                rescreen |= set(verdicts)
+            else:
+                rescreen |= {study_id for study_id, verdict in verdicts.items() if verdict}
+
+            rest = sorted(set(verdicts) - rescreen)
+            audit_size = round(len(rest) * lineage.audit_fraction)
+            rescreen.update(random.Random(lineage.seed).sample(rest, audit_size))
+
+        copied = self.db.copy_results(parent_id, recipe_id, rescreen)
+        log_event("results_inherited", recipe_id=recipe_id, parent_id=parent_id, copied=copied, rescreen=len(rescreen))
+
+        return copied
+
+
+    def _apply_prefilter(self) -> int:
+        """
+        Exclude obviously irrelevant studies before any LLM call. Return how many.
+
+        The prefilter runs once per study: only on the studies imported since
+        it last ran for this recipe.
+        """
+        if not self.recipe.prefilter:
+            return 0
+
+        pending = self.db.fetch_pending_studies(self.recipe_id, after=self.db.fetch_prefiltered_until(self.recipe_id))
+        if not pending:
+            return 0
+
+        corpus = self.db.fetch_studies_texts() if self.recipe.prefilter.min_similarity is not None else None
+        exclusions = prefilter.apply_prefilter(self.recipe, pending, corpus)
+        self.db.save_rule_exclusions(self.recipe_id, exclusions)
+        self.db.save_prefiltered_until(self.recipe_id, pending[-1]["study_id"])
+        log_event("prefilter_applied", recipe_id=self.recipe_id, pending=len(pending), excluded=len(exclusions))
+
+        return len(exclusions)
+
+
+    def _require_recipe(self):
+        if self.recipe is None:
+            raise NoRecipeError("Load a recipe before screening")
+
+
+    @property
+    def credentials(self) -> dict:
+        """Credentials of the recipe model, loaded from the config file the first time"""
+        self._require_recipe()
+        # Local servers don't need credentials in the config file
+        default = {"api_key": local.LOCAL_API_KEY} if self.recipe.local else None
+        return self.credentials_for(self.recipe.model.model, default)
+
+
+    def credentials_for(self, model: str, default: dict = None) -> dict:
+        """Credentials of a model, loaded from the config file the first time"""
+        if self._credentials is not None:
+            return self._credentials
+
+        if model not in self._model_credentials:
+            try:
+                self._model_credentials[model] = config.load_model_keys(model)
+            except (ValueError, OSError) as e:
+                if default is None:
+                    raise ConfigError(str(e)) from e
+                self._model_credentials[model] = default
+
+        return self._model_credentials[model]
+
+
+    def select(self, where: str = None, match: str = None) -> Selector:
+        """
+        Only screen, export and count the studies that meet an SQL condition
+        over their columns and a full-text query. See Selector.
+        """
+        selector = Selector(where, match)
+        try:
+            if match:
+                self.db.ensure_search_index()
+            self.db.check_selector(selector)
+        except sqlite3.Error as e:
+            raise SelectorError(f"Invalid selection: {e}") from e
+
+        self.selector = selector
+        return selector
+
+
+    def pending(self, limit: int = None) -> list[int]:
+        """IDs of the studies not screened yet with the recipe, among the selected ones"""
+        self._require_recipe()
+        return self.db.fetch_pending_studies_ids(self.recipe_id, limit, self.selector)
+
+
+    def _batch_ids(self, batch: Union[int, list[int], None]) -> list[int]:
+        if batch is None or isinstance(batch, int):
+            return self.pending(batch)
+        return list(batch)
+
+
+    def _prepare(self, study_id: int) -> tuple[dict, str]:
+        with self.metrics.phase("db_fetch"):
+            study = self.db.fetch_study(study_id)
+
+        with self.metrics.phase("prompt_render"):
+            msg = llm.compile_prompt(self.recipe, self.packer.pack(study_id, study))
+
+        return study, msg
+
+
+    def _save_call(self, study_id: int, response: dict) -> int:
+        """Save an LLM call with the fields of the study that were truncated. Return its ID"""
+        return self.db.save_llm_call(
+                response = response,
+                recipe_id = self.recipe_id,
+                study_id = study_id,
+                truncated = self.packer.truncated(study_id)
+        )
+
+
+    def record_failure(self, study_id: int, stage: str, error: Exception) -> dict:
+        """
+        Count, log and save the failure of a study. Return its outcome, with
+        an error message instead of a verdict. Raise TooManyErrorsError after
+        too many failures in a row.
+        """
+        metrics = self.metrics
+        metrics.record_error()
+        metrics.consecutive_errors += 1
+        log_event("study_failed", logging.ERROR, study_id=study_id, stage=stage, error=str(error))
+        self.db.save_failure(self.recipe_id, study_id, stage, str(error))
+        self.db.commit()
+
+        if metrics.consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
+            log_event("run_aborted", logging.ERROR, **metrics.summary())
+            raise TooManyErrorsError(f"{MAX_CONSECUTIVE_ERRORS} studies failed in a row. Last error: {error}") from error
+
+        return {"study_id": study_id, "verdict": None, "reason": None, "error": f"Error {stage}: {error}"}
+
+
+    def record_screened(self, study_id: int, study: dict, output: dict, timings: dict = None, log: dict = None, **extra) -> dict:
+        """
+        Count and log a screened study, once its result is saved. Return its
+        outcome. The extra fields go in both the log and the outcome, the log
+        fields only in the log. The time spent in each phase comes from the
+        timings of the study, by default the ones of the study screened now.
+        """
+        if timings is None:
+            timings = self.metrics.last
+        self.metrics.record_result(output['verdict'])
+        self.metrics.consecutive_errors = 0
+        log_event(
+            "study_screened",
+            study_id=study_id,
+            verdict=output['verdict'],
+            phase_seconds={phase: round(seconds, 4) for phase, seconds in timings.items()},
+            **extra,
+            **(log or {})
+        )
+
+        return self._outcome(study_id, study, output, **extra)
+
+
+    def _save(self, study_id: int, study: dict, response: dict) -> dict:
+        """Parse and save a response. Return the outcome of the study"""
+        metrics = self.metrics
+        metrics.record_call(response, llm.response_cost(self.recipe.model.model, response))
+
+        try:
+            with metrics.phase("parse"):
+                llm_output = llm.parse_response(response)
+        except Exception as e:
+            # Keep the response anyway. It was paid for.
+            self._save_call(study_id, response)
+            self.db.commit()
+            return self.record_failure(study_id, "parsing response", e)
+
+        with metrics.phase("db_write"):
+            call_id = self._save_call(study_id, response)
+            self.db.save_result(
+                    recipe_id = self.recipe_id,
+                    study_id = study_id,
+                    call_id = call_id,
+                    verdict = llm_output['verdict'],
+                    reason = llm_output['reason']
+            )
+            # Commit at this stage. If things worked, start saving results
+            self.db.commit()
+
+        return self.record_screened(study_id, study, llm_output, log={
+            "input_tokens": response['usage']['prompt_tokens'],
+            "output_tokens": response['usage']['completion_tokens'],
+        })
+
+
+    def _save_votes(self, study_id: int, response: dict, votes: list[dict]) -> int:
+        """Parse and save all the votes of a response. Add them to votes and return the call ID"""
+        metrics = self.metrics
+        metrics.record_call(response, llm.response_cost(self.recipe.model.model, response))
+
+        with metrics.phase("parse"):
+            new_votes, errors = llm.parse_votes(response)
+
+        with metrics.phase("db_write"):
+            call_id = self._save_call(study_id, response)
+            self.db.save_votes(self.recipe_id, study_id, call_id, new_votes)
+
+        for error in errors:
+            log_event("vote_unparsable", logging.WARNING, study_id=study_id, call_id=call_id, error=str(error))
+        votes.extend(vote for _, vote in new_votes)
+
+        return call_id
+
+
+    def _save_majority(self, study_id: int, study: dict, votes: list[dict], call_ids: list[int]) -> dict:
+        """Save the majority verdict of the votes. Return the outcome of the study"""
+        if not votes:
+            # Keep the calls anyway. They were paid for.
+            self.db.commit()
+            return self.record_failure(study_id, "parsing response", ValueError("No valid votes"))
+
+        result = voting.tally(votes)
+        with self.metrics.phase("db_write"):
+            self.db.save_result(
+                    recipe_id = self.recipe_id,
+                    study_id = study_id,
+                    call_id = call_ids[0],
+                    verdict = result['verdict'],
+                    reason = result['reason'],
+                    agreement = result['agreement']
+            )
+            self.db.commit()
+
+        return self.record_screened(
+            study_id, study, result,
+            log={"votes": result['votes'], "requests": len(call_ids)},
+            agreement=result['agreement']
+        )
+
+
+    def _vote_steps(self, study_id: int, study: dict, msg: str) -> Steps:
+        """
+        Screen one study by self-consistency voting.
+        Requests are sent one after the other, and only while the votes don't agree enough.
+        """
+        settings = self.recipe.voting
+        votes, call_ids, requested = [], [], 0
+
+        while not voting.is_settled(votes, requested, settings):
+            n = voting.samples_to_request(requested, settings, self.recipe.model.n)
+            try:
+                response = yield Request(msg, self.credentials, kwargs={"n": n})
+            except Exception as e:
+                if not votes:
+                    self.db.commit()
+                    return self.record_failure(study_id, "calling llm", e)
+                # Decide with the votes already paid for
+                log_event("vote_failed", logging.WARNING, study_id=study_id, error=str(e))
+                break
+
+            requested += n
+            call_ids.append(self._save_votes(study_id, response, votes))
+
+        return self._save_majority(study_id, study, votes, call_ids)
+
+
+    def _first_tier_kwargs(self) -> dict:
+        """Extra arguments of the requests to the first model of a cascade"""
+        if self.recipe.cascade.confidence == "logprobs":
+            return {"logprobs": True}
+        return {}
+
+
+    def _escalate(self, study_id: int, study: dict, response: dict) -> tuple[int, dict, str]:
+        """
+        Save the response of the first model of a cascade and decide if the study is escalated.
+        Return the call ID, the parsed output and the reason to escalate (None to keep the first verdict)
+        """
+        settings = self.recipe.cascade
+        metrics = self.metrics
+        metrics.record_call(response, llm.response_cost(self.recipe.model.model, response))
+
+        with metrics.phase("parse"):
+            output, reason = cascade.escalation_reason(settings, study, response)
+
+        with metrics.phase("db_write"):
+            call_id = self._save_call(study_id, response)
+
+        if reason is None:
+            # What the second model would have cost with the same tokens
+            metrics.baseline_cost += llm.response_cost(settings.model.model, response)
+            self._save_cascade_result(study_id, call_id, output, None)
+        else:
+            metrics.escalated += 1
+
+        return call_id, output, reason
+
+
+    def _save_cascade_result(self, study_id: int, call_id: int, output: dict, primary_call_id: int):
+        with self.metrics.phase("db_write"):
+            self.db.save_result(
+                    recipe_id = self.recipe_id,
+                    study_id = study_id,
+                    call_id = call_id,
+                    verdict = output['verdict'],
+                    reason = output['reason'],
+                    primary_call_id = primary_call_id
+            )
+            self.db.commit()
+
+
+    def _save_escalated(self, study_id: int, study: dict, primary_call_id: int, reason: str, response: dict) -> dict:
+        """Save the response of the second model of a cascade. Return the outcome of the study"""
+        model = self.recipe.cascade.model.model
+        cost = llm.response_cost(model, response)
+        self.metrics.record_call(response, cost)
+        self.metrics.baseline_cost += cost
+
+        with self.metrics.phase("db_write"):
+            call_id = self._save_call(study_id, response)
+
+        try:
+            with self.metrics.phase("parse"):
+                output = llm.parse_response(response)
+        except Exception as e:
+            self.db.commit()
+            return self.record_failure(study_id, "parsing response", e)
+
+        self._save_cascade_result(study_id, call_id, output, primary_call_id)
+
+        return self.record_screened(study_id, study, output, escalated=reason)
+
+
+    def _outcome(self, study_id: int, study: dict, output: dict, **extra) -> dict:
+        return {
+            "study_id": study_id,
+            "title": study['title'],
+            "verdict": output['verdict'],
+            "reason": output['reason'],
+            "error": None,
+            **extra
+        }
+
+
+    def _cascade_steps(self, study_id: int, study: dict, msg: str) -> Steps:
+        """Screen one study with the recipe model, and with the cascade model if it is unsure"""
+        try:
+            response = yield Request(msg, self.credentials, kwargs=self._first_tier_kwargs())
+        except Exception as e:
+            return self.record_failure(study_id, "calling llm", e)
+
+        call_id, output, reason = self._escalate(study_id, study, response)
+        if reason is None:
+            return self.record_screened(study_id, study, output, escalated=None)
+
+        model = self.recipe.cascade.model
+        try:
+            response = yield Request(msg, self.credentials_for(model.model), model)
+        except Exception as e:
+            self.db.commit()
+            return self.record_failure(study_id, "calling llm", e)
+
+        return self._save_escalated(study_id, study, call_id, reason, response)
+
+
+    def _steps(self, study_id: int) -> Steps:
+        """
+        Screen one study without sending its requests: each Request is yielded,
+        and its response sent back (or its error thrown in). Return the outcome,
+        with an error message instead of a verdict if it failed.
+        screen_study and ascreen send the requests, sync or async.
+        """
+        self.metrics.start_study()
+        study, msg = self._prepare(study_id)
+        if self.recipe.voting:
+            return (yield from self._vote_steps(study_id, study, msg))
+        if self.recipe.cascade:
+            return (yield from self._cascade_steps(study_id, study, msg))
+
+        # TODO: Add option to retry a few times
+        try:
+            response = yield Request(msg, self.credentials)
+        except Exception as e:
+            return self.record_failure(study_id, "calling llm", e)
+
+        return self._save(study_id, study, response)
+
+
+    def _send_kwargs(self, request: Request, is_async: bool = False) -> dict:
+        model = request.model or self.recipe.model
+        return {
+            "credentials": request.credentials,
+            "model": request.model,
+            **(request.kwargs or {}),
+            **self.clients.request_kwargs(model, request.credentials, is_async=is_async)
+        }
+
+
+    def screen_study(self, study_id: int) -> dict:
+        """Screen one study. The outcome has an error message instead of a verdict if it failed"""
+        steps = self._steps(study_id)
+        try:
+            request = next(steps)
+            while True:
+                try:
+                    with self.metrics.phase("llm"):
+                        response = llm.send_prompt(self.recipe, request.msg, **self._send_kwargs(request))
+                except Exception as e:
+                    request = steps.throw(e)
+                else:
+                    request = steps.send(response)
+        except StopIteration as done:
+            return done.value
+
+
+    async def ascreen_study(self, study_id: int) -> dict:
+        """Async version of screen_study"""
+        steps = self._steps(study_id)
+        try:
+            request = next(steps)
+            while True:
+                try:
+                    with self.metrics.phase("llm"):
+                        response = await llm.asend_prompt(self.recipe, request.msg, **self._send_kwargs(request, is_async=True))
+                except Exception as e:
+                    request = steps.throw(e)
+                else:
+                    request = steps.send(response)
+        except StopIteration as done:
+            return done.value
+
+
+    def check_backend(self):
+        """Wait for the local server of the recipe to be ready. Raise BackendError if it isn't"""
+        self._require_recipe()
+        if self.recipe.local:
+            local.wait_until_ready(self.recipe.model.base_url, self.recipe.local.health_timeout)
+
+
+    def default_concurrency(self) -> int:
+        """Requests in flight by default: the parallel slots of a local server, or 4"""
+        self._require_recipe()
+        if self.recipe.local:
+            return local.default_concurrency(self.recipe.local, self.recipe.model.base_url)
+        return DEFAULT_CONCURRENCY
+
+
+    def _start_run(self, studies_ids: list[int], check_backend: bool = True, **fields) -> RunMetrics:
+        if studies_ids and check_backend:
+            self.check_backend()
+        self.metrics = RunMetrics(total=len(studies_ids))
+        log_event("run_started", recipe_id=self.recipe_id, total=self.metrics.total, **fields)
+        return self.metrics
+
+
+    def _finish_run(self):
+        log_event("run_finished", recipe_id=self.recipe_id, **self.metrics.summary())
+
+
+    def screen(self, batch: Union[int, list[int], None] = None) -> Iterator[dict]:
+        """
+        Screen a batch of studies: a number of pending studies, a list of study IDs,
+        or all the pending studies if None. Yield the outcome of each study.
+        """
+        self._require_recipe()
+        studies_ids = self._batch_ids(batch)
+        self._start_run(studies_ids, prioritize=False)
+        return self._screen_ids(studies_ids)
+
+
+    def _screen_ids(self, studies_ids: list[int]) -> Iterator[dict]:
+        for study_id in studies_ids:
+            yield self.screen_study(study_id)
+        self._finish_run()
+
+
+    def pipeline(self, batch: Union[int, list[int], None] = None, concurrency: int = None, write_batch: int = 50) -> Pipeline:
+        """
+        Staged pipeline to screen a batch of studies with concurrent requests.
+        Iterate it with `async for outcome in pipeline.run()`.
+        """
+        self._require_recipe()
+        studies_ids = self._batch_ids(batch)
+        if concurrency is None:
+            concurrency = self.default_concurrency()
+        pipeline = Pipeline(self, studies_ids, concurrency, write_batch)
+        # The pipeline writes with its own connection. Save the recipe first
+        self.db.commit()
+        self._start_run(studies_ids, prioritize=False, concurrency=concurrency)
+
+        return pipeline
+
+
+    def screen_prioritized(self, limit: int, retrain_every: int = 20, stop_recall: float = None) -> Iterator[dict]:
+        """
+        Screen the pending studies most likely to be included first.
+
+        The ranker is retrained with the new verdicts every `retrain_every` studies.
+        If `stop_recall` is set, stop once the estimated recall reaches it.
+        """
+        self._require_recipe()
+        pending = self.pending()
+        self._start_run(pending[:limit], prioritize=True)
+        return self._screen_prioritized(pending, limit, retrain_every, stop_recall)
+
+
+    def _screen_prioritized(self, pending, limit, retrain_every, stop_recall) -> Iterator[dict]:
+        if not pending:
+            return
+
+        ranker = ranking.Ranker(self.db.fetch_studies_texts())
+        labels = self.db.fetch_verdicts(self.recipe_id)
+
+        screened = 0
+        while pending and screened < limit:
+            trained = ranker.fit(labels)
+            pending, scores = ranker.rank(pending)
+
+            if trained and stop_recall is not None:
+                recall = ranking.estimated_recall(labels, scores)
+                if recall >= stop_recall:
+                    log_event("recall_reached", recipe_id=self.recipe_id, estimated_recall=recall)
+                    self.metrics.stopped_at_recall = recall
+                    break
+
+            batch = pending[:min(retrain_every, limit - screened)]
+            for study_id in batch:
+                outcome = self.screen_study(study_id)
+                if outcome["verdict"] is not None:
+                    labels[study_id] = outcome["verdict"]
+                yield outcome
+
+            screened += len(batch)
+            pending = pending[len(batch):]
+
+        self._finish_run()
+
+
+    async def ascreen(self, batch: Union[int, list[int], None] = None) -> AsyncIterator[dict]:
+        """Async version of screen. Yield the outcome of each study"""
+        self._require_recipe()
+        studies_ids = self._batch_ids(batch)
+        self._start_run(studies_ids, prioritize=False)
+
+        for study_id in studies_ids:
+            yield await self.ascreen_study(study_id)
+
+        self._finish_run()
+
+
+    def dry_run(self, batch: Union[int, list[int], None] = None, dump_file: str = None, progress=None) -> RunMetrics:
+        """
+        Run the whole pipeline with a mock LLM to profile it and estimate tokens and cost.
+        If given, progress(1) is called after each study.
+        Everything, including the recipe registration, is rolled back at the end,
+        so the recipe must be loaded again before screening.
+        """
+        self._require_recipe()
+        studies_ids = self._batch_ids(batch)
+        metrics = self._start_run(studies_ids, check_backend=False, dry_run=True)
+
+        model = self.recipe.model.model
+        output_tokens = self.recipe.model.max_tokens or DRY_RUN_OUTPUT_TOKENS
+        # With voting, count the requests and samples that are always sent
+        requests, samples = 1, 1
+        if self.recipe.voting:
+            samples = self.recipe.voting.min_votes
+            requests = -(-samples // (self.recipe.model.n or 1))
+        mock_response = json.dumps({"verdict": 0, "reason": "Dry run"})
+        dump = open(dump_file, "w", encoding="utf-8") if dump_file else None
+
+        try:
+            for study_id in studies_ids:
+                study, msg = self._prepare(study_id)
+
+                with metrics.phase("token_count"):
+                    input_tokens = llm.count_tokens(model, msg)
+
+                with metrics.phase("llm"):
+                    response = llm.send_prompt(self.recipe, msg, mock_response=mock_response)
+
+                with metrics.phase("parse"):
+                    llm_output = llm.parse_response(response)
+
+                with metrics.phase("db_write"):
+                    call_id = self._save_call(study_id, response)
+                    self.db.save_result(self.recipe_id, study_id, call_id, llm_output['verdict'], llm_output['reason'])
+
+                metrics.input_tokens += input_tokens * requests
+                metrics.output_tokens += output_tokens * samples
+                metrics.done += 1
+                if progress:
+                    progress(1)
+
+                if dump:
+                    request = {
+                        "study_id": study_id,
+                        "messages": llm.build_messages(msg),
+                        "input_tokens": input_tokens,
+                        "truncated": self.packer.truncated(study_id),
+                        **self.recipe.model.model_dump(exclude_none=True)
+                    }
+                    dump.write(json.dumps(request) + "\n")
+        finally:
+            if dump:
+                dump.close()
+            # Leave the database as it was
+            self.db.rollback()
+            self.recipe_id = None
+            self.recipe = None
+
+        metrics.cost = llm.estimate_cost(model, metrics.input_tokens, metrics.output_tokens)
+        log_event("dry_run_finished", **metrics.summary())
+
+        return metrics
+
+
+    async def stream_results(self, batch_size: int = 1000) -> AsyncIterator[dict]:
+        """Yield the results of the recipe (or all results if no recipe loaded), reading them in batches"""
+        after = 0
+        while True:
+            rows = self.db.fetch_results(self.recipe_id, after=after, limit=batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+            after = rows[-1]["suggestion_id"]
+            # Let other tasks run between batches
+            await asyncio.sleep(0)
+
+
+    def status(self, recipe_id: int = None) -> dict:
+        """
+        Progress of every recipe (or of one), from the summary tables, so it is
+        fast on any database size. With a selection, the selected studies are
+        counted with queries instead.
+        """
+        total = self.db.count_studies(self.selector)
+
+        recipes_status = []
+        for row in self.db.fetch_recipes_status(recipe_id, self.selector):
+            recipe = recipes.Recipe.model_validate_json(row.pop("content"))
+            model = recipe.model.model
+            row.update({
+                "recipe": recipe,
+                "model": model,
+                "pending": total - row["screened"],
+                "include_rate": row["included"] / row["screened"] if row["screened"] else None,
+                "cost": llm.estimate_cost(model, row["input_tokens"], row["output_tokens"]),
+            })
+            recipes_status.append(row)
+
+        return {"studies": total, "recipes": recipes_status}
+
+
+    def failures(self, recipe_id: int, limit: int = 10) -> list[dict]:
+        """Last failures of a recipe"""
+        return self.db.fetch_failures(recipe_id, limit)
+
+
+    def export(self, output_format: str, output_file: str):
+        """Export the selected studies (all by default) and screening results to csv or xlsx"""
+        self.db.export_results(output_format, output_file, self.selector)
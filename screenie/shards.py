@@ -0,0 +1,267 @@
+import hashlib
+from pathlib import Path
+import sqlite3
+import uuid
+
+from screenie.db import Database
+from screenie.errors import ShardError
+
+
+# Multiplicative hash (Knuth) to spread consecutive study IDs over the shards
+HASH_MULTIPLIER = 2654435761
+HASH_RANGE = 2**32
+
+
+def shard_of(study_id: int, shard_count: int) -> int:
+    """Shard of a study: its hash range out of shard_count equal ranges"""
+    return (study_id * HASH_MULTIPLIER) % HASH_RANGE * shard_count // HASH_RANGE
+
+
+# Same as shard_of, in SQL. Parameters: shard_count, shard_index
+SHARD_CONDITION = f"(study_id * {HASH_MULTIPLIER}) % {HASH_RANGE} * ? / {HASH_RANGE} = ?"
+
+
+def content_hash(content) -> str:
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha256(content).hexdigest()
+
+
+def _columns(con, schema: str, table: str) -> list[str]:
+    return [row[1] for row in con.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _copy(con, table: str, where: str = "", params: tuple = ()):
+    """Copy the columns both databases have from the attached src database"""
+    src_columns = set(_columns(con, "src", table))
+    columns = ", ".join(c for c in _columns(con, "main", table) if c in src_columns)
+    con.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} {where}", params)
+
+
+def _max_id(con, schema: str, table: str, column: str) -> int:
+    return con.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {schema}.{table}").fetchone()[0]
+
+
+def shard(database: str, shard_count: int, output_dir: str = None) -> list[Path]:
+    """
+    Split a database into self-contained shards by study ID hash range.
+
+    Each shard has all the files and recipes, and the studies of its range
+    with their LLM calls, results, votes and failures. IDs are kept, so `merge` can
+    tell the rows copied from the database from the ones made in the shard.
+    Return the paths of the shards.
+    """
+    if shard_count < 2:
+        raise ShardError("The number of shards must be at least 2")
+
+    source = Path(database)
+    output_dir = Path(output_dir) if output_dir else source.parent
+    paths = [output_dir / f"{source.stem}.shard-{i + 1}-of-{shard_count}.db" for i in range(shard_count)]
+    for path in paths:
+        if path.exists():
+            raise ShardError(f"{path} already exists")
+
+    src = sqlite3.connect(source)
+    max_recipe_id = _max_id(src, "main", "recipes", "recipe_id")
+    src.close()
+
+    for index, path in enumerate(paths):
+        Database(path).init()
+        con = sqlite3.connect(path)
+        con.execute("ATTACH DATABASE ? AS src", (str(source),))
+
+        in_shard = f"WHERE {SHARD_CONDITION}"
+        params = (shard_count, index)
+        _copy(con, "files")
+        _copy(con, "recipes")
+        _copy(con, "studies", in_shard, params)
+        _copy(con, "llm_calls", in_shard, params)
+        _copy(con, "results", in_shard, params)
+        if _columns(con, "src", "votes"):
+            _copy(con, "votes", in_shard, params)
+        if _columns(con, "src", "failures"):
+            _copy(con, "failures", in_shard, params)
+
+        con.execute(
+            """
+            INSERT INTO shard_info (shard_key, shard_index, shard_count, max_recipe_id)
+            VALUES (?, ?, ?, ?)
+            """,
+            (uuid.uuid4().hex, index + 1, shard_count, max_recipe_id)
+        )
+        con.commit()
+        con.execute("DETACH DATABASE src")
+        con.close()
+
+    return paths
+
+
+def _map_recipes(con, info: dict) -> dict[int, int]:
+    """
+    Map the recipes of the attached shard to recipes of the main database, by content.
+    Recipes made in the shard are added. Return shard recipe ID -> main recipe ID.
+    """
+    mapping = {}
+    rows = con.execute("SELECT recipe_id, created_at, content, file_id, parent_id FROM sh.recipes ORDER BY recipe_id")
+    for recipe_id, created_at, content, file_id, parent_id in rows.fetchall():
+        if recipe_id <= info["max_recipe_id"]:
+            # Copied when sharding: must be the same recipe in both databases
+            main = con.execute("SELECT content FROM main.recipes WHERE recipe_id = ?", (recipe_id,)).fetchone()
+            if main is None or content_hash(main[0]) != content_hash(content):
+                raise ShardError(
+                    f"Recipe {recipe_id} is different in the shard. Was it made from another database?"
+                )
+            mapping[recipe_id] = recipe_id
+            continue
+
+        existing = con.execute("SELECT recipe_id FROM main.recipes WHERE content = ?", (content,)).fetchone()
+        if existing:
+            mapping[recipe_id] = existing[0]
+            continue
+
+        # New recipe in the shard. Add it with its file
+        name, file_content, file_created = con.execute(
+            "SELECT name, content, created_at FROM sh.files WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        main_file = con.execute("SELECT file_id FROM main.files WHERE content = ?", (file_content,)).fetchone()
+        if main_file:
+            main_file_id = main_file[0]
+        else:
+            try:
+                cur = con.execute(
+                    "INSERT INTO main.files (name, content, created_at) VALUES (?, ?, ?)",
+                    (name, file_content, file_created)
+                )
+            except sqlite3.IntegrityError as e:
+                raise ShardError(f"Recipe file {name} of the shard conflicts with a different file: {e}") from e
+            main_file_id = cur.lastrowid
+
+        cur = con.execute(
+            "INSERT INTO main.recipes (created_at, content, file_id, parent_id) VALUES (?, ?, ?, ?)",
+            (created_at, content, main_file_id, mapping.get(parent_id, parent_id))
+        )
+        mapping[recipe_id] = cur.lastrowid
+
+    return mapping
+
+
+# Rows of the attached shard that were copied from the main database keep its ID and study
+COPIED = "EXISTS (SELECT 1 FROM main.{table} x WHERE x.{key} = {alias}.{key} AND x.study_id = {alias}.study_id)"
+
+
+def merge(database: str, shard_path: str) -> dict:
+    """
+    Fold the new LLM calls, results, votes and failures of a shard back into the database it was made from.
+
+    IDs made in the shard are remapped: recipes by content and calls to new
+    IDs after the last call of the database. Results of studies already
+    screened with the same recipe in the database are skipped.
+    Return how many rows of each table were merged.
+    """
+    # Add the shard tables to databases made by older versions
+    Database(database).init()
+
+    con = sqlite3.connect(database)
+    con.execute("ATTACH DATABASE ? AS sh", (str(shard_path),))
+    try:
+        counts = _merge(con)
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+
+    return counts
+
+
+def _merge(con) -> dict:
+    if not _columns(con, "sh", "shard_info"):
+        raise ShardError("Not a shard made by `screenie shard`")
+
+    cur = con.execute("SELECT * FROM sh.shard_info")
+    info = dict(zip([c[0] for c in cur.description], cur.fetchone()))
+
+    merged = con.execute("SELECT 1 FROM main.merged_shards WHERE shard_key = ?", (info["shard_key"],)).fetchone()
+    if merged:
+        raise ShardError(f"Shard {info['shard_index']} of {info['shard_count']} was already merged")
+
+    new_studies = con.execute("""
+        SELECT COUNT(*) FROM sh.studies s
+        WHERE NOT EXISTS (SELECT 1 FROM main.studies x WHERE x.study_id = s.study_id AND x.url = s.url)
+    """).fetchone()[0]
+    if new_studies:
+        raise ShardError("Studies were imported into the shard. Import them into the main database instead")
+
+    last_recipe = _max_id(con, "main", "recipes", "recipe_id")
+    mapping = _map_recipes(con, info)
+    new_recipes = _max_id(con, "main", "recipes", "recipe_id") - last_recipe
+    con.execute("CREATE TEMP TABLE recipe_map (shard_id INTEGER PRIMARY KEY, main_id INTEGER NOT NULL)")
+    con.executemany("INSERT INTO recipe_map VALUES (?, ?)", mapping.items())
+
+    # New calls of the shard get IDs after the last call of the database
+    con.execute("CREATE TEMP TABLE call_map (shard_id INTEGER PRIMARY KEY, main_id INTEGER NOT NULL)")
+    con.execute(
+        f"""
+        INSERT INTO call_map
+        SELECT c.call_id, ? + ROW_NUMBER() OVER (ORDER BY c.call_id)
+        FROM sh.llm_calls c
+        WHERE NOT {COPIED.format(table="llm_calls", key="call_id", alias="c")}
+        """,
+        (_max_id(con, "main", "llm_calls", "call_id"),)
+    )
+    new_call = "COALESCE((SELECT main_id FROM call_map WHERE shard_id = {0}), {0})"
+
+    calls = con.execute("""
+        INSERT INTO main.llm_calls
+        (call_id, created_at, input_tokens, output_tokens, recipe_id, study_id, full_response, truncated)
+        SELECT cm.main_id, c.created_at, c.input_tokens, c.output_tokens,
+               m.main_id, c.study_id, c.full_response, c.truncated
+        FROM sh.llm_calls c
+        JOIN call_map cm ON cm.shard_id = c.call_id
+        JOIN recipe_map m ON m.shard_id = c.recipe_id
+    """).rowcount
+
+    results = con.execute(f"""
+        INSERT INTO main.results
+        (created_at, recipe_id, study_id, call_id, verdict, reason, agreement, primary_call_id)
+        SELECT r.created_at, m.main_id, r.study_id,
+               {new_call.format("r.call_id")}, r.verdict, r.reason, r.agreement,
+               {new_call.format("r.primary_call_id")}
+        FROM sh.results r
+        JOIN recipe_map m ON m.shard_id = r.recipe_id
+        WHERE NOT {COPIED.format(table="results", key="suggestion_id", alias="r")}
+          AND NOT EXISTS (
+              SELECT 1 FROM main.results x
+              WHERE x.recipe_id = m.main_id AND x.study_id = r.study_id
+          )
+    """).rowcount
+
+    votes = con.execute(f"""
+        INSERT INTO main.votes
+        (call_id, choice_index, recipe_id, study_id, verdict, reason)
+        SELECT {new_call.format("v.call_id")}, v.choice_index, m.main_id, v.study_id, v.verdict, v.reason
+        FROM sh.votes v
+        JOIN recipe_map m ON m.shard_id = v.recipe_id
+        WHERE NOT {COPIED.format(table="votes", key="vote_id", alias="v")}
+    """).rowcount
+
+    failures = con.execute(f"""
+        INSERT INTO main.failures
+        (created_at, recipe_id, study_id, stage, error)
+        SELECT f.created_at, m.main_id, f.study_id, f.stage, f.error
+        FROM sh.failures f
+        JOIN recipe_map m ON m.shard_id = f.recipe_id
+        WHERE NOT {COPIED.format(table="failures", key="failure_id", alias="f")}
+        ORDER BY f.failure_id
+    """).rowcount
+
+    con.execute(
+        "INSERT INTO main.merged_shards (shard_key, shard_index, shard_count) VALUES (?, ?, ?)",
+        (info["shard_key"], info["shard_index"], info["shard_count"])
+    )
+
+    return {
+        "recipes": new_recipes, "llm_calls": calls, "results": results,
+        "votes": votes, "failures": failures
+    }
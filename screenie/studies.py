@@ -1,11 +1,11 @@
 from pathlib import Path
 import sys
-from typing import Optional, List
+from typing import Iterable, Iterator, List, NamedTuple, Optional
 import unicodedata
 
 import bibtexparser
 import click
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter, ValidationError
 import rispy
 
 
@@ -20,6 +20,28 @@ class Study(BaseModel):
     doi: Optional[str] = None
 
 
+class StudyRecord(NamedTuple):
+    """
+    Compact validated study, used when importing.
+    A tuple has no per-instance dict, so a million of them take a fraction
+    of the memory of Study models.
+    """
+    title: str
+    authors: str
+    year: int
+    abstract: str
+    journal: str
+    url: str
+    doi: Optional[str] = None
+
+
+# Validates whole lists of records at once
+_records_adapter = TypeAdapter(list[StudyRecord])
+
+# Entries validated at a time
+VALIDATION_CHUNK = 10000
+
+
 def clean_strings(entry: dict) -> None:
     """Normalize all string values in-place. This helps with difficult chars and symbols"""
     for key in entry:
@@ -58,20 +80,60 @@ def normalize_entry(entry: dict) -> dict:
     return normalized_entry
 
 
-def validate_studies(studies: List[dict]) -> List[Study]:
-    valid_studies = []
+def drain(entries: list) -> Iterator:
+    """Yield the entries of a list, removing them from it, so each can be freed once used"""
+    entries.reverse()
+    while entries:
+        yield entries.pop()
+
+
+def _validate_chunk(entries: list[dict], offset: int) -> tuple[List[StudyRecord], list]:
+    """Validate entries in bulk. Return the valid records and one error per invalid entry"""
+    try:
+        return _records_adapter.validate_python(entries), []
+    except ValidationError as e:
+        problems = {}
+        for error in e.errors():
+            index, *field = error["loc"]
+            problems.setdefault(index, []).append(f"{'.'.join(map(str, field))}: {error['msg']}")
+
     errors = []
+    for index, messages in problems.items():
+        error = ValueError(f"Entry {offset + index + 1}: {'; '.join(messages)}")
+        click.echo(f"{error}")
+        errors.append(error)
 
-    # TODO: Write useful messages about what fails. Also, what to do when an entry fails? How to retry?
+    valid = [entry for index, entry in enumerate(entries) if index not in problems]
+    return _records_adapter.validate_python(valid), errors
+
+
+def validate_studies(studies: Iterable[dict]) -> tuple[List[StudyRecord], list]:
+    """
+    Validate parsed entries into StudyRecords. Return the valid records and the errors.
+    Entries are normalized and validated in chunks, so only a chunk of
+    intermediate dicts is alive at a time.
+    """
+    valid_studies = []
+    errors = []
 
-    for i, study_data in enumerate(studies):
-        try:
-            normalized_study = normalize_entry(study_data)
-            study = Study(**normalized_study)
-            valid_studies.append(study)
-        except Exception as e:
-            click.echo(f"{e}")
-            errors.append(e)
+    # TODO: What to do when an entry fails? How to retry?
+
+    chunk = []
+    offset = 0
+    for study_data in studies:
+        normalized_study = normalize_entry(study_data)
+        chunk.append({field: normalized_study[field] for field in StudyRecord._fields if field in normalized_study})
+        if len(chunk) == VALIDATION_CHUNK:
+            records, chunk_errors = _validate_chunk(chunk, offset)
+            valid_studies.extend(records)
+            errors.extend(chunk_errors)
+            offset += len(chunk)
+            chunk = []
+
+    if chunk:
+        records, chunk_errors = _validate_chunk(chunk, offset)
+        valid_studies.extend(records)
+        errors.extend(chunk_errors)
 
     return valid_studies, errors
 
@@ -103,7 +165,7 @@ def read_ris(input_file: str):
     return ris_data
 
 
-def import_studies(input_file: str) -> List[Study]:
+def import_studies(input_file: str) -> tuple[List[StudyRecord], list]:
     """Import bibliography data from a file into the database.
  
     Automatically detects the file format based on extension and uses
@@ -121,4 +183,5 @@ def import_studies(input_file: str) -> List[Study]:
     else:
         raise ValueError(f"Unsupported file format '{extension}' \nOnly .bib and .ris files are supported")
 
-    return validate_studies(imported_data)
+    # The parsed entries are freed while they are validated
+    return validate_studies(drain(imported_data))
@@ -0,0 +1,41 @@
+from collections import Counter
+
+
+def tally(votes: list[dict]) -> dict:
+    """
+    Majority verdict of some votes, with the fraction of votes that agree with it.
+    Ties include the study: a false exclusion costs more than a false inclusion.
+    The reason is the one of the first vote for the majority verdict.
+    """
+    if not votes:
+        raise ValueError("No valid votes")
+
+    counts = Counter(vote['verdict'] for vote in votes)
+    verdict = 1 if counts[1] >= counts[0] else 0
+    reason = next(vote['reason'] for vote in votes if vote['verdict'] == verdict)
+
+    return {
+        "verdict": verdict,
+        "reason": reason,
+        "agreement": counts[verdict] / len(votes),
+        "votes": len(votes),
+    }
+
+
+def is_settled(votes: list[dict], requested: int, voting) -> bool:
+    """
+    Check if a study has enough votes to stop sampling.
+    `requested` counts all the samples asked for, including the ones that couldn't be parsed.
+    Only the agreement between the votes is used: votes carry no confidence.
+    """
+    if requested >= voting.max_votes:
+        return True
+    if len(votes) < voting.min_votes:
+        return False
+
+    return tally(votes)['agreement'] >= voting.min_agreement
+
+
+def samples_to_request(requested: int, voting, n: int) -> int:
+    """Samples for the next request: n per request, without going over max_votes"""
+    return max(1, min(n or 1, voting.max_votes - requested))
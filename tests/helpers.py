@@ -0,0 +1,44 @@
+import os
+
+from screenie.db import Database
+from screenie.studies import Study
+
+
+# Recipe of the mock server. Format it with the base_url of the server
+RECIPE = """
+[model]
+model = "openai/mock"
+base_url = "{base_url}"
+
+[criteria]
+text = "Include studies about grasslands"
+
+[prompt]
+text = "$criteria\\nTitle: $title\\nAbstract: $abstract"
+"""
+
+
+def write_recipe(path: str, base_url: str):
+    with open(path, "w") as f:
+        f.write(RECIPE.format(base_url=base_url))
+
+
+def make_study(i: int, **fields) -> Study:
+    """Study number i. The given fields replace the defaults"""
+    defaults = {"title": f"Study {i}", "authors": "A", "year": 2020, "abstract": "Abstract", "journal": "J", "url": f"u{i}"}
+    return Study(**{**defaults, **fields})
+
+
+def create_database(db_path: str, studies: list[Study]) -> tuple[Database, int]:
+    """
+    Create a database with the studies, imported from a bib file next to it.
+    Return the open database, with the studies uncommitted, and the file ID of the bib file.
+    """
+    Database(db_path).init()
+    db = Database(db_path)
+    bib_path = os.path.join(os.path.dirname(db_path), "studies.bib")
+    with open(bib_path, "w") as f:
+        f.write("@article{x}")
+    file_id = db.save_file(bib_path)
+    db.save_studies(file_id, studies)
+    return db, file_id
@@ -0,0 +1,75 @@
+import unittest
+
+from screenie.budget import (
+        TRUNCATION_MARK,
+        Packer,
+        truncate_authors
+)
+from screenie.recipes import Budget, Model, Recipe
+
+
+STUDY = {
+    "title": "Grazing in grasslands",
+    "authors": "Smith, J and Doe, A and Roe, B",
+    "abstract": "word " * 200,
+    "year": 2020,
+}
+
+
+class TestTruncateAuthors(unittest.TestCase):
+
+    def test_truncate(self):
+        self.assertEqual(truncate_authors("A; B; C", 2), ("A; B et al.", True))
+        self.assertEqual(truncate_authors("Smith, J and Doe, A", 1), ("Smith, J et al.", True))
+
+
+    def test_within_budget(self):
+        self.assertEqual(truncate_authors("A; B", 2), ("A; B", False))
+
+
+class TestPacker(unittest.TestCase):
+
+    def setUp(self):
+        budget = Budget(max_authors=2, max_tokens={"abstract": 50, "title": 50})
+        self.recipe = Recipe(model=Model(model="gpt-4o"), prompt="p", criteria="c", budget=budget)
+
+
+    def test_pack(self):
+        packer = Packer(self.recipe)
+        packed = packer.pack(1, STUDY)
+
+        self.assertEqual(packed["authors"], "Smith, J; Doe, A et al.")
+        self.assertTrue(packed["abstract"].endswith(TRUNCATION_MARK))
+        self.assertLess(len(packed["abstract"]), len(STUDY["abstract"]))
+        self.assertEqual(packed["title"], STUDY["title"])
+        self.assertEqual(packer.truncated(1), ["authors", "abstract"])
+        # The original study is not changed
+        self.assertEqual(STUDY["authors"], "Smith, J and Doe, A and Roe, B")
+
+
+    def test_cache(self):
+        packer = Packer(self.recipe)
+        self.assertIs(packer.pack(1, STUDY), packer.pack(1, STUDY))
+
+
+    def test_cache_is_bounded(self):
+        packer = Packer(self.recipe, cache_size=2)
+        first = packer.pack(1, STUDY)
+        packer.pack(2, STUDY)
+        packer.pack(3, STUDY)
+
+        self.assertEqual(len(packer._packed), 2)
+        self.assertIsNot(packer.pack(1, STUDY), first)
+        # Truncated fields are kept for the studies no longer cached
+        self.assertEqual(packer.truncated(2), ["authors", "abstract"])
+
+
+    def test_no_budget(self):
+        recipe = Recipe(model=Model(model="gpt-4o"), prompt="p", criteria="c")
+        packer = Packer(recipe)
+        self.assertIs(packer.pack(1, STUDY), STUDY)
+        self.assertIsNone(packer.truncated(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import math
+import unittest
+
+from pydantic import ValidationError
+
+from screenie.cascade import (
+        check_confidence,
+        escalation_reason,
+        logprob_confidence
+)
+from screenie.recipes import Cascade, Model, Recipe
+
+
+STUDY = {"title": "Grazing in grasslands", "abstract": "A field experiment"}
+
+
+def response(content, verdict_prob=None):
+    choice = {"message": {"content": content}}
+    if verdict_prob is not None:
+        tokens = ['{"', 'verdict', '":', ' 1', ', "reason": "x"}']
+        choice["logprobs"] = {"content": [
+            {"token": token, "logprob": math.log(verdict_prob) if token == " 1" else 0.0}
+            for token in tokens
+        ]}
+    return {"choices": [choice]}
+
+
+class TestLogprobConfidence(unittest.TestCase):
+
+    def test_verdict_token(self):
+        confidence = logprob_confidence(response('{"verdict": 1, "reason": "x"}', 0.6))
+        self.assertAlmostEqual(confidence, 0.6)
+
+
+    def test_no_logprobs(self):
+        self.assertIsNone(logprob_confidence(response('{"verdict": 1, "reason": "x"}')))
+
+
+class TestEscalationReason(unittest.TestCase):
+
+    def setUp(self):
+        self.cascade = Cascade(model=Model(model="strong-model"), min_confidence=0.8)
+
+
+    def test_confident(self):
+        output, reason = escalation_reason(self.cascade, STUDY, response('{"verdict": 1, "reason": "x"}', 0.9))
+        self.assertEqual(output["verdict"], 1)
+        self.assertIsNone(reason)
+
+
+    def test_low_confidence(self):
+        _, reason = escalation_reason(self.cascade, STUDY, response('{"verdict": 1, "reason": "x"}', 0.7))
+        self.assertEqual(reason, "low_confidence")
+
+        _, reason = escalation_reason(self.cascade, STUDY, response('{"verdict": 1, "reason": "x"}'))
+        self.assertEqual(reason, "low_confidence")
+
+
+    def test_unparsable(self):
+        output, reason = escalation_reason(self.cascade, STUDY, response("I don't know", 0.9))
+        self.assertIsNone(output)
+        self.assertEqual(reason, "unparsable")
+
+
+    def test_rules(self):
+        self.cascade.escalate_includes = True
+        _, reason = escalation_reason(self.cascade, STUDY, response('{"verdict": 1, "reason": "x"}', 0.9))
+        self.assertEqual(reason, "include")
+
+        self.cascade.escalate_match = ["grazing"]
+        _, reason = escalation_reason(self.cascade, STUDY, response('{"verdict": 0, "reason": "x"}', 0.9))
+        self.assertEqual(reason, "match")
+
+
+    def test_self_reported(self):
+        self.cascade.confidence = "self_reported"
+        _, reason = escalation_reason(self.cascade, STUDY, response('{"verdict": 0, "reason": "x", "confidence": 0.95}'))
+        self.assertIsNone(reason)
+
+
+class TestCheckConfidence(unittest.TestCase):
+
+    def recipe(self, model, confidence="logprobs"):
+        cascade = Cascade(model=Model(model="openai/gpt-4o"), confidence=confidence)
+        return Recipe(model=Model(model=model), prompt="$title", criteria="c", cascade=cascade)
+
+
+    def test_logprobs_unsupported(self):
+        with self.assertRaises(ValueError) as error:
+            check_confidence(self.recipe("anthropic/claude-3-5-sonnet-20240620"))
+        self.assertIn("self_reported", str(error.exception))
+
+
+    def test_supported(self):
+        check_confidence(self.recipe("openai/gpt-4o-mini"))
+        check_confidence(self.recipe("anthropic/claude-3-5-sonnet-20240620", "self_reported"))
+
+
+    def test_min_confidence(self):
+        for value in (-0.1, 1.5):
+            with self.assertRaises(ValidationError):
+                Cascade(model=Model(model="openai/gpt-4o"), min_confidence=value)
+
+
+if __name__ == '__main__':
+    unittest.main()
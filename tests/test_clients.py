@@ -0,0 +1,44 @@
+import unittest
+
+from screenie.clients import ClientPool
+from screenie.recipes import Model
+
+
+class TestClientPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ClientPool(max_connections=4)
+
+
+    def tearDown(self):
+        self.pool.close()
+
+
+    def test_one_client_per_endpoint(self):
+        model = Model(model="openai/mock", base_url="http://127.0.0.1:8000/v1")
+        credentials = {"api_key": "key"}
+
+        client = self.pool.client_for(model, credentials)
+        self.assertIs(self.pool.client_for(model, credentials), client)
+
+        other = Model(model="openai/mock", base_url="http://127.0.0.1:9000/v1")
+        self.assertIsNot(self.pool.client_for(other, credentials), client)
+
+
+    def test_pool_limits(self):
+        self.assertEqual(self.pool.limits.max_connections, 4)
+        self.assertEqual(self.pool.limits.max_keepalive_connections, 4)
+
+
+    def test_unsupported_provider(self):
+        model = Model(model="anthropic/claude-opus-4-20250514")
+        self.assertEqual(self.pool.request_kwargs(model, {"api_key": "key"}), {})
+
+
+    def test_without_api_key(self):
+        model = Model(model="openai/gpt-4o")
+        self.assertIsNone(self.pool.client_for(model, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+
+from screenie.config import (
+        Config,
+        environment_keys,
+        to_litellm_kwargs
+)
+from screenie.errors import ConfigError
+
+
+CONFIG = """
+["openai/gpt-4o"]
+OPENAI_API_KEY = "sk-test"
+
+["azure/gpt-4o"]
+AZURE_API_KEY = "azure-key"
+AZURE_API_BASE = "https://example.openai.azure.com"
+AZURE_API_VERSION = "2024-02-01"
+
+["vertex_ai/gemini-pro"]
+GOOGLE_APPLICATION_CREDENTIALS = "/path/to/key.json"
+
+["vertex_ai/gemini-flash"]
+GOOGLE_APPLICATION_CREDENTIALS = "/path/to/other-key.json"
+"""
+
+
+class TestToLitellmKwargs(unittest.TestCase):
+
+    def test_to_litellm_kwargs(self):
+        keys = {
+            "XAI_API_KEY": "key",
+            "OLLAMA_BASE_URL": "http://localhost:11434",
+            "AZURE_API_VERSION": "v1",
+            "AWS_REGION_NAME": "us-east-1",
+        }
+        expected = {
+            "api_key": "key",
+            "api_base": "http://localhost:11434",
+            "api_version": "v1",
+            "aws_region_name": "us-east-1",
+        }
+        self.assertEqual(to_litellm_kwargs(keys), expected)
+
+
+    def test_provider_settings(self):
+        keys = {
+            "VERTEXAI_PROJECT": "my-project",
+            "VERTEXAI_LOCATION": "us-central1",
+            "GOOGLE_APPLICATION_CREDENTIALS": "/path/to/key.json",
+        }
+        self.assertEqual(to_litellm_kwargs(keys), {"vertex_project": "my-project", "vertex_location": "us-central1"})
+        self.assertEqual(environment_keys(keys), {"GOOGLE_APPLICATION_CREDENTIALS": "/path/to/key.json"})
+
+
+class TestConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(mode="w", suffix=".toml", delete=False)
+        self.tmp.write(CONFIG)
+        self.tmp.close()
+        self.config = Config(self.tmp.name)
+
+
+    def tearDown(self):
+        os.remove(self.tmp.name)
+
+
+    def test_model_credentials(self):
+        credentials = self.config.model_credentials("azure/gpt-4o")
+        self.assertEqual(credentials["api_key"], "azure-key")
+        self.assertEqual(credentials["api_base"], "https://example.openai.azure.com")
+        self.assertEqual(credentials["api_version"], "2024-02-01")
+
+
+    def test_does_not_touch_environment(self):
+        environ = dict(os.environ)
+        self.config.model_credentials("openai/gpt-4o")
+        self.assertEqual(dict(os.environ), environ)
+
+
+    def test_environment(self):
+        os.environ.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+        self.addCleanup(os.environ.pop, "GOOGLE_APPLICATION_CREDENTIALS", None)
+
+        self.config.model_credentials("vertex_ai/gemini-pro")
+        self.assertEqual(os.environ["GOOGLE_APPLICATION_CREDENTIALS"], "/path/to/key.json")
+
+        with self.assertRaises(ConfigError):
+            self.config.model_credentials("vertex_ai/gemini-flash")
+
+
+    def test_environment_already_set(self):
+        self.addCleanup(os.environ.pop, "GOOGLE_APPLICATION_CREDENTIALS", None)
+        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = "/path/to/user-key.json"
+
+        self.config.model_credentials("vertex_ai/gemini-pro")
+        self.assertEqual(os.environ["GOOGLE_APPLICATION_CREDENTIALS"], "/path/to/user-key.json")
+
+
+    def test_unknown_model(self):
+        with self.assertRaises(ValueError):
+            self.config.model_credentials("xai/grok-3-mini-beta")
+
+
+    def test_cached_until_modified(self):
+        first = self.config.data()
+        self.assertIs(self.config.data(), first)
+
+        with open(self.tmp.name, "a") as f:
+            f.write('\n["xai/grok-3-mini-beta"]\nXAI_API_KEY = "xai-key"\n')
+        stat = os.stat(self.tmp.name)
+        os.utime(self.tmp.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        self.assertEqual(self.config.model_credentials("xai/grok-3-mini-beta"), {"api_key": "xai-key"})
+
+
+if __name__ == "__main__":
+    unittest.main()
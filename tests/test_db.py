@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from screenie.db import SCHEMA_VERSION, Database
+from screenie.recipes import Model, Recipe
+from screenie.session import ScreeningSession
+
+
+# Schema of the first version, before the columns and summary tables added since
+FIRST_SCHEMA = """
+CREATE TABLE files (
+    file_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    content BLOB NOT NULL UNIQUE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE recipes (
+    recipe_id INTEGER PRIMARY KEY,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    content TEXT NOT NULL UNIQUE,
+    file_id INTEGER NOT NULL,
+    FOREIGN KEY (file_id) REFERENCES files (file_id)
+);
+CREATE TABLE studies (
+    study_id INTEGER PRIMARY KEY,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    title TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    abstract TEXT NOT NULL,
+    journal TEXT NOT NULL,
+    url TEXT NOT NULL UNIQUE,
+    doi TEXT UNIQUE,
+    file_id INTEGER NOT NULL,
+    FOREIGN KEY (file_id) REFERENCES files (file_id)
+);
+CREATE TABLE llm_calls (
+    call_id INTEGER PRIMARY KEY,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    recipe_id INTEGER NOT NULL,
+    study_id INTEGER NOT NULL,
+    full_response TEXT NOT NULL,
+    FOREIGN KEY (recipe_id) REFERENCES recipes (recipe_id),
+    FOREIGN KEY (study_id) REFERENCES studies (study_id)
+);
+CREATE TABLE results (
+    suggestion_id INTEGER PRIMARY KEY,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    recipe_id INTEGER NOT NULL,
+    study_id INTEGER NOT NULL,
+    call_id INTEGER NOT NULL,
+    verdict INTEGER NOT NULL CHECK (verdict IN (0, 1)),
+    reason TEXT NOT NULL,
+    FOREIGN KEY (recipe_id) REFERENCES recipes (recipe_id),
+    FOREIGN KEY (study_id) REFERENCES studies (study_id),
+    FOREIGN KEY (call_id) REFERENCES llm_calls (call_id)
+);
+"""
+
+
+class TestMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "old.db")
+        recipe = Recipe(model=Model(model="mock"), criteria="c", prompt="$title")
+
+        con = sqlite3.connect(self.db_path)
+        con.executescript(FIRST_SCHEMA)
+        con.execute("INSERT INTO files (name, content) VALUES ('r.toml', 'x')")
+        con.execute("INSERT INTO recipes (content, file_id) VALUES (?, 1)", (recipe.model_dump_json(),))
+        for i in range(1, 4):
+            con.execute(
+                "INSERT INTO studies (title, authors, year, abstract, journal, url, file_id) VALUES (?, 'A', 2020, 'Abs', 'J', ?, 1)",
+                (f"Study {i}", f"u{i}")
+            )
+        con.execute("INSERT INTO llm_calls (input_tokens, output_tokens, recipe_id, study_id, full_response) VALUES (10, 5, 1, 1, '{}')")
+        con.execute("INSERT INTO results (recipe_id, study_id, call_id, verdict, reason) VALUES (1, 1, 1, 1, 'Fits')")
+        con.commit()
+        con.close()
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def columns(self, db, table):
+        return {row[1]: row[3] for row in db.con.execute(f"PRAGMA table_info({table})")}
+
+
+    def test_migrate(self):
+        db = Database(self.db_path)
+
+        self.assertEqual(db.con.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+        self.assertIn("parent_id", self.columns(db, "recipes"))
+        self.assertIn("truncated", self.columns(db, "llm_calls"))
+        results = self.columns(db, "results")
+        self.assertIn("agreement", results)
+        self.assertIn("primary_call_id", results)
+        self.assertEqual(results["call_id"], 0)
+
+        # Rows are kept, and prefilter exclusions (without a call) can be saved
+        self.assertEqual(db.con.execute("SELECT study_id, call_id, verdict, reason FROM results").fetchall(), [(1, 1, 1, "Fits")])
+        db.save_result(1, 2, None, 0, "Excluded by rule")
+        db.commit()
+
+        status = db.fetch_recipes_status()[0]
+        self.assertEqual((status["screened"], status["included"], status["rule_excluded"]), (2, 1, 1))
+        self.assertEqual((status["llm_calls"], status["input_tokens"]), (1, 10))
+        self.assertEqual(db.count_studies(), 3)
+        db.close()
+
+
+    def test_migrate_once(self):
+        Database(self.db_path).close()
+
+        db = Database(self.db_path)
+        db.create_schema()
+        status = db.fetch_recipes_status()[0]
+        self.assertEqual((status["screened"], status["llm_calls"]), (1, 1))
+        db.close()
+
+
+    def test_session_status(self):
+        with ScreeningSession(self.db_path) as session:
+            status = session.status()
+
+        self.assertEqual(status["studies"], 3)
+        self.assertEqual(status["recipes"][0]["screened"], 1)
@@ -9,9 +9,14 @@ import unittest
 from litellm import completion
 
 from screenie.llm import (
+        count_tokens,
+        estimate_cost,
         extract_json,
-        parse_response
+        model_config,
+        parse_response,
+        parse_votes
 )
+from screenie.recipes import Local, Model, Recipe
 
 
 class TestExtractJSON(unittest.TestCase):
@@ -79,5 +84,53 @@ class TestParseResponse(unittest.TestCase):
         self.assertEqual(parse_response(mock_response), expected)
 
 
+    def test_parse_votes(self):
+        response = {"choices": [
+            {"message": {"content": '{"verdict": 1, "reason": "a"}'}},
+            {"message": {"content": "no json here"}},
+            {"message": {"content": '{"verdict": 0, "reason": "b"}'}},
+        ]}
+        votes, errors = parse_votes(response)
+
+        self.assertEqual(votes, [(0, {"verdict": 1, "reason": "a"}), (2, {"verdict": 0, "reason": "b"})])
+        self.assertEqual(len(errors), 1)
+
+
+    def test_parse_constrained_output(self):
+        response = {"choices": [{"message": {"content": '{"verdict": 1, "reason": "Uses {braces}"}'}}]}
+
+        self.assertEqual(parse_response(response), {"verdict": 1, "reason": "Uses {braces}"})
+
+
+class TestModelConfig(unittest.TestCase):
+
+    def test_constrained_output(self):
+        recipe = Recipe(
+            model=Model(model="openai/local", base_url="http://localhost:8080/v1"),
+            prompt="$title", criteria="c", local=Local()
+        )
+        response_format = model_config(recipe)["response_format"]
+
+        self.assertEqual(response_format["type"], "json_schema")
+        self.assertEqual(response_format["json_schema"]["schema"]["required"], ["verdict", "reason"])
+        # Not for other models, e.g. a cascade
+        self.assertNotIn("response_format", model_config(recipe, Model(model="gpt-4o")))
+        self.assertNotIn("response_format", model_config(recipe.model_copy(update={"local": None})))
+
+
+class TestTokensAndCost(unittest.TestCase):
+
+    def test_count_tokens(self):
+        self.assertGreater(count_tokens("gpt-4o", "Title: a study about grasslands"), 0)
+
+
+    def test_estimate_cost(self):
+        self.assertGreater(estimate_cost("gpt-4o", 1000, 100), 0)
+
+
+    def test_unknown_model_cost(self):
+        self.assertEqual(estimate_cost("not-a-provider/not-a-model", 1000, 100), 0.0)
+
+
 if __name__ == "__main__":
     unittest.main()
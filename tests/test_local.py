@@ -0,0 +1,52 @@
+import unittest
+
+from screenie.errors import BackendError
+import screenie.local as local
+from screenie.mock import MockLLMServer
+from screenie.recipes import Local
+
+
+class TestServerRoot(unittest.TestCase):
+
+    def test_strip_api_path(self):
+        self.assertEqual(local.server_root("http://localhost:8080/v1"), "http://localhost:8080")
+        self.assertEqual(local.server_root("http://localhost:8080/v1/"), "http://localhost:8080")
+        self.assertEqual(local.server_root("http://localhost:8080"), "http://localhost:8080")
+
+
+class TestHealth(unittest.TestCase):
+
+    def test_healthy(self):
+        with MockLLMServer() as server:
+            url = local.check_health(server.base_url)
+
+        self.assertTrue(url.endswith("/health"))
+
+
+    def test_unreachable(self):
+        with MockLLMServer() as server:
+            base_url = server.base_url
+
+        with self.assertRaises(BackendError):
+            local.check_health(base_url, timeout=1.0)
+        with self.assertRaises(BackendError):
+            local.wait_until_ready(base_url, timeout=0.2, interval=0.1)
+
+
+class TestConcurrency(unittest.TestCase):
+
+    def test_server_slots(self):
+        with MockLLMServer(slots=6) as server:
+            self.assertEqual(local.server_slots(server.base_url), 6)
+            self.assertEqual(local.default_concurrency(Local(), server.base_url), 6)
+            self.assertEqual(local.default_concurrency(Local(concurrency=2), server.base_url), 2)
+
+
+    def test_unknown_slots(self):
+        with MockLLMServer() as server:
+            self.assertIsNone(local.server_slots(server.base_url))
+            self.assertEqual(local.default_concurrency(Local(), server.base_url), local.LOCAL_CONCURRENCY)
+
+
+if __name__ == "__main__":
+    unittest.main()
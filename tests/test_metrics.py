@@ -0,0 +1,84 @@
+import json
+import logging
+import unittest
+
+from screenie.metrics import (
+        JSONFormatter,
+        RunMetrics,
+        format_duration
+)
+
+
+class TestFormatDuration(unittest.TestCase):
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(42), "42s")
+        self.assertEqual(format_duration(125), "2m05s")
+        self.assertEqual(format_duration(3 * 3600 + 7 * 60), "3h07m")
+
+
+class TestRunMetrics(unittest.TestCase):
+
+    def test_counters(self):
+        metrics = RunMetrics(total=4)
+        metrics.record_call({"usage": {"prompt_tokens": 100, "completion_tokens": 20}}, cost=0.5)
+        metrics.record_result(1)
+        metrics.record_error()
+
+        self.assertEqual(metrics.done, 1)
+        self.assertEqual(metrics.included, 1)
+        self.assertEqual(metrics.input_tokens, 100)
+        self.assertEqual(metrics.error_rate, 0.5)
+        self.assertIn("[1/4]", metrics.progress_line())
+        self.assertIn("$0.5000", metrics.progress_line())
+
+
+    def test_phase(self):
+        metrics = RunMetrics(total=1)
+        with metrics.phase("llm"):
+            pass
+        with metrics.phase("llm"):
+            pass
+
+        self.assertEqual(metrics.phase_count["llm"], 2)
+        self.assertIn("llm", metrics.last)
+
+
+    def test_samples(self):
+        metrics = RunMetrics(total=1)
+        metrics.keep_samples("llm")
+        for _ in range(3):
+            with metrics.phase("llm"):
+                pass
+        with metrics.phase("parse"):
+            pass
+
+        self.assertEqual(len(metrics.samples["llm"]), 3)
+        self.assertNotIn("parse", metrics.samples)
+
+
+    def test_openmetrics(self):
+        metrics = RunMetrics(total=2)
+        metrics.record_result(0)
+        text = metrics.to_openmetrics()
+
+        self.assertIn("screenie_studies_screened_total 1", text)
+        self.assertIn("screenie_studies_remaining 1", text)
+        self.assertIn('screenie_phase_seconds_total{phase="llm"}', text)
+        self.assertTrue(text.endswith("# EOF\n"))
+
+
+class TestJSONFormatter(unittest.TestCase):
+
+    def test_format(self):
+        record = logging.LogRecord("screenie", logging.INFO, "", 0, "study_screened", None, None)
+        record.fields = {"study_id": 3, "verdict": 1}
+        entry = json.loads(JSONFormatter().format(record))
+
+        self.assertEqual(entry["event"], "study_screened")
+        self.assertEqual(entry["level"], "info")
+        self.assertEqual(entry["study_id"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
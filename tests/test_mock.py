@@ -0,0 +1,65 @@
+import json
+import unittest
+import urllib.error
+import urllib.request
+
+from screenie.llm import parse_response
+from screenie.mock import MockLLMServer
+
+
+def post_completion(base_url, content="Title: test", n=None):
+    body = {"model": "mock", "messages": [{"role": "user", "content": content}]}
+    if n:
+        body["n"] = n
+    request = urllib.request.Request(
+        f"{base_url}/chat/completions",
+        data=json.dumps(body).encode(),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+class TestMockLLMServer(unittest.TestCase):
+
+    def test_completion(self):
+        with MockLLMServer() as server:
+            response = post_completion(server.base_url, n=2)
+
+        self.assertEqual(len(response["choices"]), 2)
+        self.assertIn(parse_response(response)["verdict"], (0, 1))
+        self.assertGreater(response["usage"]["prompt_tokens"], 0)
+
+
+    def test_deterministic_verdict(self):
+        with MockLLMServer() as server:
+            first = post_completion(server.base_url, "Same prompt")
+            second = post_completion(server.base_url, "Same prompt")
+
+        self.assertEqual(parse_response(first), parse_response(second))
+
+
+    def test_rate_limit_burst(self):
+        with MockLLMServer(rate_limit_every=3, rate_limit_burst=1) as server:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                post_completion(server.base_url)
+            self.assertEqual(context.exception.code, 429)
+
+            post_completion(server.base_url)
+            post_completion(server.base_url)
+
+
+    def test_errors_and_malformed(self):
+        with MockLLMServer(error_rate=1.0) as server:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                post_completion(server.base_url)
+            self.assertEqual(context.exception.code, 500)
+
+        with MockLLMServer(malformed_rate=1.0) as server:
+            response = post_completion(server.base_url)
+            with self.assertRaises(ValueError):
+                parse_response(response)
+
+
+if __name__ == "__main__":
+    unittest.main()
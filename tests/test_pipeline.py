@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from screenie.errors import TooManyErrorsError
+from screenie.mock import MockLLMServer
+from screenie.session import ScreeningSession
+
+from helpers import create_database, make_study, write_recipe
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "test.db")
+        recipe_path = os.path.join(self.tmp.name, "recipe.toml")
+
+        db, _ = create_database(self.db_path, [make_study(i, abstract="Grasslands") for i in range(30)])
+        db.commit()
+        db.close()
+
+        self.server = MockLLMServer(latency=0.01)
+        self.server.start()
+        write_recipe(recipe_path, self.server.base_url)
+
+        self.session = ScreeningSession(self.db_path, credentials={"api_key": "mock-key"})
+        self.session.load_recipe(recipe_path)
+
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+    def count(self, table):
+        return self.session.db.con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+    def test_run(self):
+        pipeline = self.session.pipeline(concurrency=4, write_batch=8)
+
+        async def run():
+            return [outcome async for outcome in pipeline.run()]
+
+        outcomes = asyncio.run(run())
+
+        self.assertEqual(sorted(o["study_id"] for o in outcomes), list(range(1, 31)))
+        self.assertEqual(self.session.metrics.done, 30)
+        self.assertEqual(self.count("results"), 30)
+        self.assertEqual(self.count("llm_calls"), 30)
+        self.assertEqual(self.session.pending(), [])
+
+
+    def test_phase_timings(self):
+        pipeline = self.session.pipeline(concurrency=4, write_batch=8)
+
+        async def run():
+            return [outcome async for outcome in pipeline.run()]
+
+        with self.assertLogs("screenie") as logs:
+            asyncio.run(run())
+
+        screened = [r.fields for r in logs.records if r.getMessage() == "study_screened"]
+        self.assertEqual(len(screened), 30)
+        for fields in screened:
+            self.assertEqual(
+                set(fields["phase_seconds"]),
+                {"db_fetch", "prompt_render", "llm", "parse", "db_write"}
+            )
+
+
+    def test_interrupt_saves_received_responses(self):
+        pipeline = self.session.pipeline(concurrency=4)
+
+        async def run():
+            outcomes = []
+            async for outcome in pipeline.run():
+                outcomes.append(outcome)
+                if len(outcomes) == 1:
+                    pipeline.interrupt()
+            return outcomes
+
+        outcomes = asyncio.run(run())
+
+        self.assertLess(len(outcomes), 30)
+        self.assertEqual(self.count("results"), len(outcomes))
+        self.assertEqual(self.server.requests, len(outcomes))
+
+
+    def test_too_many_errors(self):
+        self.server.error_rate = 1.0
+        pipeline = self.session.pipeline(concurrency=2)
+
+        async def run():
+            async for _ in pipeline.run():
+                pass
+
+        with self.assertRaises(TooManyErrorsError):
+            asyncio.run(run())
+
+
+    def run_failing(self, pipeline):
+        async def run():
+            async for _ in pipeline.run():
+                pass
+
+        # A failure must be raised, not hang the run
+        asyncio.run(asyncio.wait_for(run(), timeout=10))
+
+
+    def test_producer_failure(self):
+        pipeline = self.session.pipeline(concurrency=4)
+
+        def fail(studies_ids):
+            raise sqlite3.OperationalError("disk I/O error")
+        pipeline._fetch = fail
+
+        with self.assertRaises(sqlite3.OperationalError):
+            self.run_failing(pipeline)
+        self.assertEqual(self.server.requests, 0)
+
+
+    def test_writer_failure(self):
+        pipeline = self.session.pipeline(concurrency=4, write_batch=4)
+        writes = []
+
+        def fail(screened):
+            writes.append(len(screened))
+            raise sqlite3.OperationalError("database is locked")
+        pipeline._write = fail
+
+        with self.assertRaises(sqlite3.OperationalError):
+            self.run_failing(pipeline)
+        # The batch that failed is not written again
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(self.count("results"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+from screenie.prefilter import (
+        apply_prefilter,
+        exclusion_reason
+)
+from screenie.recipes import (
+        Model,
+        Prefilter,
+        Recipe
+)
+
+
+def make_study(study_id=1, title="A title", abstract="An abstract", year=2020):
+    return {"study_id": study_id, "title": title, "abstract": abstract, "year": year}
+
+
+class TestExclusionReason(unittest.TestCase):
+
+    def test_passes(self):
+        prefilter = Prefilter(year_min=2000, require=["abstract"])
+        self.assertIsNone(exclusion_reason(prefilter, make_study()))
+
+
+    def test_year_range(self):
+        prefilter = Prefilter(year_min=2000, year_max=2010)
+        self.assertIn("before 2000", exclusion_reason(prefilter, make_study(year=1999)))
+        self.assertIn("after 2010", exclusion_reason(prefilter, make_study(year=2011)))
+
+
+    def test_require_abstract(self):
+        prefilter = Prefilter(require_abstract=True)
+        self.assertEqual(exclusion_reason(prefilter, make_study(abstract="  ")), "Prefilter: no abstract")
+
+
+    def test_keywords(self):
+        prefilter = Prefilter(require=[r"language models?|LLM"], forbid=[r"\breview\b"])
+        self.assertIsNone(exclusion_reason(prefilter, make_study(title="LLM screening")))
+        self.assertIn("required", exclusion_reason(prefilter, make_study(title="Soil carbon")))
+        self.assertIn("forbidden", exclusion_reason(prefilter, make_study(title="A review of language models")))
+
+
+class TestApplyPrefilter(unittest.TestCase):
+
+    def test_similarity(self):
+        recipe = Recipe(
+            model=Model(model="test-model"),
+            prompt="",
+            criteria="Studies about language models screening abstracts",
+            prefilter=Prefilter(year_min=2000, min_similarity=0.1)
+        )
+        studies = [
+            make_study(1, "Language models for screening", "We screen abstracts"),
+            make_study(2, "Soil carbon", "Grazing and cattle"),
+            make_study(3, "Language models", "Old study", year=1990),
+        ]
+
+        excluded = dict(apply_prefilter(recipe, studies))
+
+        self.assertEqual(set(excluded), {2, 3})
+        self.assertIn("similarity", excluded[2])
+        self.assertIn("before 2000", excluded[3])
+
+
+    def test_similarity_corpus(self):
+        recipe = Recipe(
+            model=Model(model="test-model"),
+            prompt="",
+            criteria="Studies about language models screening abstracts",
+            prefilter=Prefilter(min_similarity=0.9)
+        )
+        studies = [
+            make_study(1, "Language models for screening", "We screen abstracts"),
+            make_study(2, "Soil carbon", "Grazing and cattle"),
+            make_study(3, "Language models", "Screening with models"),
+        ]
+        corpus = {s["study_id"]: f"{s['title']} {s['abstract']}" for s in studies}
+
+        # The same study gets the same similarity whatever else is pending
+        alone = dict(apply_prefilter(recipe, studies[:1], corpus))
+        together = dict(apply_prefilter(recipe, studies, corpus))
+        self.assertEqual(alone[1], together[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
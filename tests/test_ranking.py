@@ -0,0 +1,72 @@
+import unittest
+
+from screenie.ranking import (
+        Ranker,
+        estimated_recall,
+        tokenize
+)
+
+
+DOCUMENTS = {
+    1: "Large language models screen abstracts for systematic reviews",
+    2: "Grazing effects on grassland soil carbon",
+    3: "LLM screening of abstracts compared to human reviewers",
+    4: "Nitrogen fertilization and maize yield",
+    5: "Automated abstract screening with language models",
+    6: "Soil carbon stocks under cattle grazing",
+}
+
+
+class TestTokenize(unittest.TestCase):
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("LLMs, in Systematic-Reviews!"), ["llms", "in", "systematic", "reviews"])
+
+
+class TestRanker(unittest.TestCase):
+
+    def test_untrained_keeps_order(self):
+        ranker = Ranker(DOCUMENTS)
+        order, scores = ranker.rank([5, 2, 6])
+
+        self.assertEqual(order, [5, 2, 6])
+        self.assertTrue((scores == 0.5).all())
+
+
+    def test_fit_needs_both_classes(self):
+        ranker = Ranker(DOCUMENTS)
+        self.assertFalse(ranker.fit({1: 1, 3: 1}))
+        self.assertTrue(ranker.fit({1: 1, 2: 0}))
+
+
+    def test_rank_relevant_first(self):
+        ranker = Ranker(DOCUMENTS)
+        ranker.fit({1: 1, 3: 1, 2: 0, 4: 0})
+        order, scores = ranker.rank([6, 5])
+
+        self.assertEqual(order, [5, 6])
+        self.assertGreater(scores[0], scores[1])
+
+
+    def test_refit_is_incremental(self):
+        ranker = Ranker(DOCUMENTS)
+        ranker.fit({1: 1, 2: 0})
+        weights = ranker.weights.copy()
+        ranker.fit({1: 1, 2: 0, 3: 1})
+
+        self.assertFalse((ranker.weights == weights).all())
+
+
+class TestEstimatedRecall(unittest.TestCase):
+
+    def test_estimated_recall(self):
+        labels = {1: 1, 2: 0, 3: 1}
+        self.assertAlmostEqual(estimated_recall(labels, [0.5, 0.25, 0.25]), 2 / 3)
+
+
+    def test_nothing_found(self):
+        self.assertEqual(estimated_recall({1: 0}, [0.1]), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,14 @@
 import unittest
 import tempfile
 
+from pydantic import ValidationError
+
 from screenie.recipes import (
+        Lineage,
         Model,
         Recipe,
+        Voting,
+        output_changed,
         read_recipe
 )
 
@@ -74,5 +79,90 @@ text = ""
                 read_recipe(temp_file)
 
 
+    def test_read_recipe_prefilter(self):
+        toml_content = """
+[model]
+model = "minimal-model"
+
+[criteria]
+text = ""
+
+[prompt]
+text = ""
+
+[prefilter]
+year_min = 2000
+forbid = ["review"]
+"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.toml') as f:
+            f.write(toml_content)
+            f.flush()
+            temp_file = f.name
+
+            recipe = read_recipe(temp_file)
+            self.assertEqual(recipe.prefilter.year_min, 2000)
+            self.assertIsNone(recipe.prefilter.year_max)
+            self.assertEqual(recipe.prefilter.forbid, ["review"])
+
+
+class TestRecipeContent(unittest.TestCase):
+
+    def test_unused_sections_not_in_content(self):
+        recipe = Recipe(model=Model(model="test-model"), prompt="p", criteria="c")
+        self.assertNotIn("prefilter", recipe.content())
+        self.assertIn('"temperature":null', recipe.content())
+
+
+class TestOutputChanged(unittest.TestCase):
+
+    def setUp(self):
+        self.parent = Recipe(model=Model(model="test-model", timeout=10), prompt="p", criteria="c")
+
+
+    def test_non_output_parameters(self):
+        child = self.parent.model_copy(deep=True)
+        child.model.timeout = 60
+        child.model.base_url = "http://localhost:8000/v1"
+        child.lineage = Lineage(parent=1)
+        self.assertFalse(output_changed(self.parent, child))
+
+
+    def test_output_parameters(self):
+        child = self.parent.model_copy(deep=True)
+        child.model.temperature = 0.5
+        self.assertTrue(output_changed(self.parent, child))
+
+        child = self.parent.model_copy(update={"criteria": "new criteria"})
+        self.assertTrue(output_changed(self.parent, child))
+
+
+class TestLineage(unittest.TestCase):
+
+    def test_audit_fraction(self):
+        self.assertEqual(Lineage(parent=1, audit_fraction=0.1).audit_fraction, 0.1)
+        for fraction in (-0.1, 1.5):
+            with self.assertRaises(ValidationError):
+                Lineage(parent=1, audit_fraction=fraction)
+
+
+class TestVoting(unittest.TestCase):
+
+    def test_valid(self):
+        voting = Voting(min_votes=1, max_votes=1, min_agreement=0.5)
+        self.assertEqual((voting.min_votes, voting.max_votes), (1, 1))
+
+
+    def test_invalid(self):
+        for fields in (
+            {"min_votes": 0},
+            {"max_votes": 0},
+            {"min_votes": 3, "max_votes": 2},
+            {"min_agreement": 0},
+            {"min_agreement": 1.5},
+        ):
+            with self.assertRaises(ValidationError):
+                Voting(**fields)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from screenie.errors import RecipeError
+from screenie.recipes import Model, Recipe, Voting
+from screenie.reparse import parse_calls, reparse
+
+from helpers import create_database, make_study
+
+
+def response(content):
+    return {"model": "mock", "choices": [{"message": {"content": content}}], "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+
+
+class TestReparse(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "review.db")
+        db, file_id = create_database(self.db_path, [make_study(i) for i in range(5)])
+        recipe = Recipe(model=Model(model="mock"), prompt="p", criteria="c")
+        self.recipe_id = db.save_recipe(recipe, file_id)
+        voting = recipe.model_copy(update={"voting": Voting()})
+        self.voting_id = db.save_recipe(voting, db.save_file(self.db_path))
+
+        include = response('{"verdict": 1, "reason": "Yes"}')
+        # Unchanged
+        call_id = db.save_llm_call(1, self.recipe_id, include)
+        db.save_result(self.recipe_id, 1, call_id, 1, "Yes")
+        # Saved by an older parser with another verdict
+        call_id = db.save_llm_call(2, self.recipe_id, include)
+        db.save_result(self.recipe_id, 2, call_id, 0, "No")
+        # Not parsable then, parsable now: a failed call and a later one
+        db.save_llm_call(3, self.recipe_id, response("garbage"))
+        db.save_llm_call(3, self.recipe_id, include)
+        # Not parsable at all
+        db.save_llm_call(4, self.recipe_id, response("garbage"))
+        # Voting results are skipped
+        call_id = db.save_llm_call(5, self.voting_id, response('{"verdict": 0, "reason": "No"}'))
+        db.save_result(self.voting_id, 5, call_id, 1, "Majority", agreement=0.6)
+        db.commit()
+        db.close()
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def results(self):
+        con = sqlite3.connect(self.db_path)
+        rows = con.execute("SELECT recipe_id, study_id, verdict FROM results ORDER BY recipe_id, study_id").fetchall()
+        con.close()
+        return rows
+
+
+    def test_parse_calls(self):
+        outputs = parse_calls([(1, '{"choices": [{"message": {"content": "{\\"verdict\\": 0, \\"reason\\": \\"r\\"}"}}]}'), (2, "{}")])
+        self.assertEqual(outputs, [{"verdict": 0, "reason": "r"}, None])
+
+
+    def test_reparse(self):
+        report = reparse(self.db_path, workers=2, batch_size=2)
+
+        self.assertEqual(report["calls"], 4)
+        self.assertEqual(report["unchanged"], 1)
+        self.assertEqual(report["changed"], 1)
+        self.assertEqual(report["recovered"], 1)
+        self.assertEqual(report["unparsable"], 1)
+        self.assertEqual(report["skipped_recipes"], [self.voting_id])
+        self.assertEqual([(c["study_id"], c["old"], c["new"]) for c in report["changes"]], [(2, 0, 1), (3, None, 1)])
+        self.assertEqual(self.results(), [
+            (self.recipe_id, 1, 1), (self.recipe_id, 2, 1), (self.recipe_id, 3, 1), (self.voting_id, 5, 1)
+        ])
+
+        # Nothing else changes the second time
+        report = reparse(self.db_path, workers=1)
+        self.assertEqual(report["unchanged"], 3)
+        self.assertEqual(report["changes"], [])
+
+
+    def test_dry_run(self):
+        before = self.results()
+        report = reparse(self.db_path, recipe_id=self.recipe_id, workers=1, dry_run=True)
+
+        self.assertEqual(report["changed"], 1)
+        self.assertEqual(self.results(), before)
+
+
+    def test_unknown_recipe(self):
+        with self.assertRaises(RecipeError):
+            reparse(self.db_path, recipe_id=99)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from screenie.errors import SelectorError
+from screenie.search import Selector
+from screenie.session import ScreeningSession
+
+from helpers import create_database, make_study
+
+
+TITLES = ["A meta-analysis of grazing", "Grazing in grasslands", "Soil carbon meta-analysis", "Maize yield"]
+
+
+class TestSelector(unittest.TestCase):
+
+    def test_sql(self):
+        self.assertFalse(Selector())
+        self.assertEqual(Selector().sql(), ("1", []))
+
+        condition, params = Selector("year > 2000", "grazing").sql("s.study_id")
+        self.assertIn("s.study_id IN (SELECT study_id FROM studies WHERE year > 2000)", condition)
+        self.assertIn("studies_fts MATCH ?", condition)
+        self.assertEqual(params, ["grazing"])
+
+
+class TestSelection(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "review.db")
+        db, _ = create_database(self.db_path, [
+            make_study(i, title=title, year=2000 + i) for i, title in enumerate(TITLES)
+        ])
+        db.commit()
+        db.close()
+
+        self.session = ScreeningSession(self.db_path)
+
+
+    def tearDown(self):
+        self.session.close()
+        self.tmp.cleanup()
+
+
+    def selected(self, selector):
+        condition, params = selector.sql()
+        rows = self.session.db.con.execute(f"SELECT study_id FROM studies WHERE {condition} ORDER BY study_id", params)
+        return [row[0] for row in rows]
+
+
+    def test_match_and_where(self):
+        self.assertEqual(self.selected(self.session.select(match='"meta-analysis"')), [1, 3])
+        # Stemmed: grasslands matches grassland
+        self.assertEqual(self.selected(self.session.select(match="title:grassland")), [2])
+        self.assertEqual(self.selected(self.session.select(where="year >= 2001", match="grazing")), [2])
+        self.assertEqual(self.session.db.count_studies(self.session.selector), 1)
+
+
+    def test_index_follows_studies(self):
+        con = self.session.db.con
+        con.execute("UPDATE studies SET title = 'Rice yield' WHERE study_id = 1")
+        con.execute("DELETE FROM studies WHERE study_id = 3")
+
+        self.assertEqual(self.selected(Selector(match='"meta-analysis"')), [])
+        self.assertEqual(self.selected(Selector(match="yield")), [1, 4])
+
+
+    def test_index_built_for_older_databases(self):
+        con = self.session.db.con
+        con.execute("INSERT INTO studies_fts (studies_fts) VALUES ('delete-all')")
+        con.execute("UPDATE db_stats SET value = 0 WHERE name = 'search_index'")
+        con.commit()
+
+        self.assertEqual(self.selected(self.session.select(match="maize")), [4])
+
+
+    def test_bulk_import_builds_index_when_used(self):
+        db = self.session.db
+        file_id = db.con.execute("SELECT file_id FROM files").fetchone()[0]
+        studies = [
+            make_study(i, title="Bulk wetlands", url=f"bulk{i}")
+            for i in range(3)
+        ]
+        with patch("screenie.db.BULK_INDEX_STUDIES", 3):
+            db.save_studies(file_id, studies)
+        db.commit()
+
+        self.assertEqual(self.selected(Selector(match="wetlands")), [])
+        self.assertEqual(self.selected(self.session.select(match="wetlands")), [5, 6, 7])
+
+
+    def test_invalid_selection(self):
+        with self.assertRaises(SelectorError):
+            self.session.select(where="year >")
+        with self.assertRaises(SelectorError):
+            self.session.select(match='"unbalanced')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,317 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from screenie.errors import (
+        BackendError,
+        NoRecipeError,
+        RecipeError
+)
+from screenie.mock import MockLLMServer
+from screenie.session import ScreeningSession
+
+from helpers import RECIPE, create_database, make_study, write_recipe
+
+
+class TestScreeningSession(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "test.db")
+        self.recipe_path = os.path.join(self.tmp.name, "recipe.toml")
+
+        db, _ = create_database(self.db_path, [make_study(i, abstract="Grasslands") for i in range(5)])
+        db.commit()
+        db.close()
+
+        self.server = MockLLMServer()
+        self.server.start()
+        write_recipe(self.recipe_path, self.server.base_url)
+
+        self.session = ScreeningSession(self.db_path, credentials={"api_key": "mock-key"})
+
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+        self.tmp.cleanup()
+
+
+    def test_screen_without_recipe(self):
+        with self.assertRaises(NoRecipeError):
+            self.session.screen(1)
+
+
+    def test_invalid_recipe(self):
+        with open(self.recipe_path, "w") as f:
+            f.write("[model]\nmodel = 'openai/mock'\n")
+
+        with self.assertRaises(RecipeError):
+            self.session.load_recipe(self.recipe_path)
+
+
+    def test_unknown_placeholder(self):
+        with open(self.recipe_path, "w") as f:
+            f.write(RECIPE.format(base_url=self.server.base_url).replace("$title", "$titel"))
+
+        with self.assertRaises(RecipeError) as error:
+            self.session.load_recipe(self.recipe_path)
+        self.assertIn("$titel", str(error.exception))
+
+
+    def test_screen(self):
+        self.session.load_recipe(self.recipe_path)
+        outcomes = list(self.session.screen(3))
+
+        self.assertEqual(len(outcomes), 3)
+        self.assertTrue(all(outcome["error"] is None for outcome in outcomes))
+        self.assertEqual(self.session.metrics.done, 3)
+        self.assertEqual(len(self.session.pending()), 2)
+
+
+    def test_ascreen_and_stream_results(self):
+        self.session.load_recipe(self.recipe_path)
+
+        async def run():
+            outcomes = [outcome async for outcome in self.session.ascreen([1, 2])]
+            results = [result async for result in self.session.stream_results(batch_size=1)]
+            return outcomes, results
+
+        outcomes, results = asyncio.run(run())
+
+        self.assertEqual([o["study_id"] for o in outcomes], [1, 2])
+        self.assertEqual([r["study_id"] for r in results], [1, 2])
+
+
+    def test_dry_run_rolls_back(self):
+        self.session.load_recipe(self.recipe_path)
+        metrics = self.session.dry_run(2)
+
+        self.assertEqual(metrics.done, 2)
+        self.assertGreater(metrics.input_tokens, 0)
+
+        recipe_id = self.session.load_recipe(self.recipe_path)
+        self.assertEqual(recipe_id, 1)
+        self.assertEqual(len(self.session.pending()), 5)
+
+
+    def test_prefilter_runs_once(self):
+        with open(self.recipe_path, "a") as f:
+            f.write('\n[prefilter]\nforbid = ["Study 0"]\n')
+
+        self.session.load_recipe(self.recipe_path)
+        self.assertEqual(self.session.excluded, 1)
+        self.session.close()
+
+        # Committed with the recipe, and not applied again
+        self.session = ScreeningSession(self.db_path, credentials={"api_key": "mock-key"})
+        self.session.load_recipe(self.recipe_path)
+        self.assertEqual(self.session.excluded, 0)
+        self.assertEqual(len(self.session.pending()), 4)
+
+        # Only the studies imported since are checked
+        db = self.session.db
+        db.save_studies(1, [make_study(0, title="Study 0 again", abstract="Grasslands", url="new")])
+        db.commit()
+        self.session.load_recipe(self.recipe_path)
+        self.assertEqual(self.session.excluded, 1)
+        self.assertEqual(len(self.session.pending()), 4)
+
+
+    def test_voting(self):
+        with open(self.recipe_path, "a") as f:
+            f.write('\n[voting]\nmin_votes = 2\nmax_votes = 4\n')
+        self.session.load_recipe(self.recipe_path)
+        outcomes = list(self.session.screen(2))
+
+        # The mock always agrees with itself: stop after min_votes requests of one sample
+        self.assertEqual([o["agreement"] for o in outcomes], [1.0, 1.0])
+        self.assertEqual(self.server.requests, 4)
+        votes = self.session.db.con.execute("SELECT COUNT(*) FROM votes").fetchone()[0]
+        self.assertEqual(votes, 4)
+
+
+    def test_voting_phase_timings(self):
+        with open(self.recipe_path, "a") as f:
+            f.write('\n[voting]\nmin_votes = 2\nmax_votes = 4\n')
+        self.session.load_recipe(self.recipe_path)
+        with self.assertLogs("screenie") as logs:
+            list(self.session.screen(2))
+
+        screened = [r.fields for r in logs.records if r.getMessage() == "study_screened"]
+        self.assertEqual(len(screened), 2)
+        self.assertTrue(all("llm" in fields["phase_seconds"] for fields in screened))
+
+
+    def test_voting_disagreement(self):
+        self.server.disagreement_rate = 0.5
+        self.server._random.seed(1)
+        with open(self.recipe_path, "a") as f:
+            f.write('\n[voting]\nmin_votes = 2\nmax_votes = 4\n')
+        self.session.load_recipe(self.recipe_path)
+        outcomes = list(self.session.screen())
+
+        self.assertTrue(all(o["error"] is None for o in outcomes))
+        self.assertGreater(self.server.requests, 10)
+        self.assertLessEqual(self.server.requests, 20)
+
+
+    def test_cascade(self):
+        with open(self.recipe_path, "a") as f:
+            f.write(f'\n[cascade]\nmin_confidence = 0.75\n\n[cascade.model]\nmodel = "openai/strong-mock"\nbase_url = "{self.server.base_url}"\n')
+        self.session.load_recipe(self.recipe_path)
+        outcomes = list(self.session.screen())
+
+        self.assertTrue(all(o["error"] is None for o in outcomes))
+        escalated = sum(o["escalated"] is not None for o in outcomes)
+        self.assertEqual(self.session.metrics.escalated, escalated)
+        self.assertEqual(self.server.requests, 5 + escalated)
+
+        con = self.session.db.con
+        linked = con.execute("SELECT COUNT(*) FROM results WHERE primary_call_id IS NOT NULL").fetchone()[0]
+        calls = con.execute("SELECT COUNT(*) FROM llm_calls").fetchone()[0]
+        self.assertEqual(linked, escalated)
+        self.assertEqual(calls, 5 + escalated)
+
+
+    def test_ascreen_voting(self):
+        with open(self.recipe_path, "a") as f:
+            f.write('\n[voting]\nmin_votes = 2\nmax_votes = 4\n')
+        self.session.load_recipe(self.recipe_path)
+
+        async def run():
+            return [outcome async for outcome in self.session.ascreen(2)]
+
+        outcomes = asyncio.run(run())
+        self.assertEqual([o["agreement"] for o in outcomes], [1.0, 1.0])
+        self.assertEqual(self.server.requests, 4)
+
+
+    def test_ascreen_cascade(self):
+        with open(self.recipe_path, "a") as f:
+            f.write(f'\n[cascade]\nmin_confidence = 0.75\n\n[cascade.model]\nmodel = "openai/strong-mock"\nbase_url = "{self.server.base_url}"\n')
+        self.session.load_recipe(self.recipe_path)
+
+        async def run():
+            return [outcome async for outcome in self.session.ascreen()]
+
+        outcomes = asyncio.run(run())
+        self.assertTrue(all(o["error"] is None for o in outcomes))
+        escalated = sum(o["escalated"] is not None for o in outcomes)
+        self.assertEqual(self.server.requests, 5 + escalated)
+
+
+    def test_local(self):
+        with open(self.recipe_path, "a") as f:
+            f.write('\n[local]\nhealth_timeout = 1\n')
+        self.server.malformed_rate = 1.0
+        self.server.slots = 3
+        self.session.load_recipe(self.recipe_path)
+        pipeline = self.session.pipeline()
+
+        async def run():
+            return [outcome async for outcome in pipeline.run()]
+
+        outcomes = asyncio.run(run())
+
+        self.assertEqual(pipeline.concurrency, 3)
+        # Constrained outputs are always valid JSON
+        self.assertTrue(all(o["error"] is None for o in outcomes))
+
+
+    def test_local_not_ready(self):
+        with open(self.recipe_path, "a") as f:
+            f.write('\n[local]\nhealth_timeout = 0\n')
+        self.session.load_recipe(self.recipe_path)
+        self.server.stop()
+
+        with self.assertRaises(BackendError):
+            self.session.screen(1)
+        self.server = MockLLMServer()
+        self.server.start()
+
+
+    def test_budget(self):
+        with open(self.recipe_path, "a") as f:
+            f.write('\n[budget.max_tokens]\nabstract = 1\n')
+        self.session.load_recipe(self.recipe_path)
+        list(self.session.screen(1))
+
+        truncated = self.session.db.con.execute("SELECT truncated FROM llm_calls").fetchone()[0]
+        self.assertEqual(truncated, '["abstract"]')
+
+
+    def test_status(self):
+        self.session.load_recipe(self.recipe_path)
+        list(self.session.screen(3))
+        self.server.error_rate = 1.0
+        list(self.session.screen([4]))
+
+        status = self.session.status()
+        self.assertEqual(status["studies"], 5)
+        row = status["recipes"][0]
+        self.assertEqual(row["screened"], 3)
+        self.assertEqual(row["pending"], 2)
+        self.assertEqual(row["llm_calls"], 3)
+        self.assertEqual(row["failures"], 1)
+        self.assertEqual(self.session.failures(1)[0]["study_id"], 4)
+
+        # The triggers keep the same counts a full rebuild computes
+        self.session.db.rebuild_stats()
+        self.assertEqual(self.session.status(), status)
+
+
+    def test_selection(self):
+        self.session.select(where="study_id IN (2, 4)")
+        self.session.load_recipe(self.recipe_path)
+        outcomes = list(self.session.screen())
+
+        self.assertEqual([o["study_id"] for o in outcomes], [2, 4])
+        summary = self.session.status()
+        self.assertEqual(summary["studies"], 2)
+        self.assertEqual(summary["recipes"][0]["pending"], 0)
+
+
+    def test_lineage(self):
+        self.session.load_recipe(self.recipe_path)
+        list(self.session.screen())
+        verdicts = self.session.db.fetch_verdicts(1)
+
+        # Only a non-output parameter changed: reuse everything
+        child_path = os.path.join(self.tmp.name, "child.toml")
+        with open(child_path, "w") as f:
+            f.write(RECIPE.format(base_url=self.server.base_url))
+            f.write('\n[lineage]\nparent = "recipe.toml"\n')
+        with open(child_path) as f:
+            content = f.read().replace("[model]", "[model]\ntimeout = 30")
+        with open(child_path, "w") as f:
+            f.write(content)
+
+        self.session.load_recipe(child_path)
+        self.assertEqual(self.session.inherited, 5)
+        self.assertEqual(self.session.pending(), [])
+
+        # The criteria changed: screen again the parent includes and an audit sample
+        grandchild_path = os.path.join(self.tmp.name, "grandchild.toml")
+        with open(grandchild_path, "w") as f:
+            f.write(RECIPE.format(base_url=self.server.base_url).replace("grasslands", "forests"))
+            f.write('\n[lineage]\nparent = 1\naudit_fraction = 0.4\n')
+
+        self.session.load_recipe(grandchild_path)
+        includes = {study_id for study_id, verdict in verdicts.items() if verdict}
+        pending = set(self.session.pending())
+        self.assertTrue(includes <= pending)
+        self.assertEqual(len(pending), len(includes) + round((5 - len(includes)) * 0.4))
+
+
+    def test_lineage_unknown_parent(self):
+        with open(self.recipe_path, "a") as f:
+            f.write('\n[lineage]\nparent = 42\n')
+
+        with self.assertRaises(RecipeError):
+            self.session.load_recipe(self.recipe_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from screenie.db import Database
+from screenie.errors import ShardError
+from screenie.recipes import Model, Recipe
+from screenie.shards import merge, shard, shard_of
+
+from helpers import create_database, make_study
+
+
+RESPONSE = {"model": "mock", "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+
+
+def screen(db, recipe_id, studies_ids):
+    for study_id in studies_ids:
+        call_id = db.save_llm_call(study_id, recipe_id, {**RESPONSE, "study": study_id})
+        db.save_result(recipe_id, study_id, call_id, study_id % 2, f"Study {study_id}")
+    db.commit()
+
+
+class TestShards(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "review.db")
+        db, _ = create_database(self.db_path, [make_study(i) for i in range(20)])
+
+        self.recipe_path = os.path.join(self.tmp.name, "recipe.toml")
+        with open(self.recipe_path, "w") as f:
+            f.write("recipe")
+        self.recipe = Recipe(model=Model(model="mock"), prompt="p", criteria="c")
+        self.recipe_id = db.save_recipe(self.recipe, db.save_file(self.recipe_path))
+        screen(db, self.recipe_id, [1, 2, 3])
+        db.close()
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def query(self, path, sql):
+        con = sqlite3.connect(path)
+        rows = con.execute(sql).fetchall()
+        con.close()
+        return rows
+
+
+    def test_shard_partitions_studies(self):
+        paths = shard(self.db_path, 3)
+
+        studies = [{row[0] for row in self.query(path, "SELECT study_id FROM studies")} for path in paths]
+        self.assertEqual(set().union(*studies), set(range(1, 21)))
+        self.assertEqual(sum(len(s) for s in studies), 20)
+        for index, ids in enumerate(studies):
+            self.assertTrue(all(shard_of(study_id, 3) == index for study_id in ids))
+            self.assertEqual(self.query(paths[index], "SELECT COUNT(*) FROM recipes"), [(1,)])
+
+
+    def test_merge(self):
+        paths = shard(self.db_path, 2)
+
+        # Screen the pending studies of each shard, and one with a recipe made in a shard
+        for path in paths:
+            db = Database(path)
+            pending = db.fetch_pending_studies_ids(self.recipe_id)
+            screen(db, self.recipe_id, pending)
+            db.close()
+
+        db = Database(paths[0])
+        new_recipe = Recipe(model=Model(model="mock"), prompt="p", criteria="new criteria")
+        new_recipe_path = os.path.join(self.tmp.name, "new.toml")
+        with open(new_recipe_path, "w") as f:
+            f.write("new recipe")
+        new_recipe_id = db.save_recipe(new_recipe, db.save_file(new_recipe_path))
+        studies_ids = [row[0] for row in db.con.execute("SELECT study_id FROM studies LIMIT 2")]
+        screen(db, new_recipe_id, studies_ids)
+        db.close()
+
+        for path in paths:
+            merge(self.db_path, path)
+
+        results = self.query(self.db_path, """
+            SELECT r.study_id, c.study_id, r.reason
+            FROM results r JOIN llm_calls c ON c.call_id = r.call_id
+        """)
+        self.assertEqual(len(results), 22)
+        # Every result points to the call of its own study
+        self.assertTrue(all(r_study == c_study for r_study, c_study, _ in results))
+        self.assertEqual(self.query(self.db_path, "SELECT COUNT(*) FROM llm_calls"), [(22,)])
+        self.assertEqual(self.query(self.db_path, "SELECT COUNT(*) FROM recipes"), [(2,)])
+
+        with self.assertRaises(ShardError):
+            merge(self.db_path, paths[0])
+
+
+    def test_failures(self):
+        db = Database(self.db_path)
+        db.save_failure(self.recipe_id, 4, "llm", "Timeout")
+        db.commit()
+        db.close()
+        paths = shard(self.db_path, 2)
+
+        copied = [self.query(path, "SELECT study_id FROM failures") for path in paths]
+        self.assertEqual(sorted(copied), [[], [(4,)]])
+
+        # New failures of the shards, with a recipe made in a shard
+        for path in paths:
+            db = Database(path)
+            new_recipe = Recipe(model=Model(model="mock"), prompt="p", criteria="new criteria")
+            new_recipe_path = os.path.join(self.tmp.name, "new.toml")
+            with open(new_recipe_path, "w") as f:
+                f.write("new recipe")
+            new_recipe_id = db.save_recipe(new_recipe, db.save_file(new_recipe_path))
+            study_id = db.con.execute("SELECT MAX(study_id) FROM studies").fetchone()[0]
+            db.save_failure(new_recipe_id, study_id, "parse", "Invalid JSON")
+            db.commit()
+            db.close()
+
+        counts = [merge(self.db_path, path)["failures"] for path in paths]
+        self.assertEqual(counts, [1, 1])
+
+        failures = self.query(self.db_path, "SELECT recipe_id, stage FROM failures ORDER BY failure_id")
+        self.assertEqual(failures, [(1, "llm"), (2, "parse"), (2, "parse")])
+        self.assertEqual(self.query(self.db_path, "SELECT recipe_id, failures FROM recipe_stats ORDER BY recipe_id"), [(1, 1), (2, 2)])
+
+
+    def test_merge_other_database(self):
+        paths = shard(self.db_path, 2)
+        con = sqlite3.connect(self.db_path)
+        con.execute("UPDATE recipes SET content = 'changed'")
+        con.commit()
+        con.close()
+
+        with self.assertRaises(ShardError):
+            merge(self.db_path, paths[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,12 +2,17 @@ import tempfile
 import os
 import unittest
 
+from unittest.mock import patch
+
 from screenie.studies import (
+    StudyRecord,
     clean_strings,
+    drain,
     normalize_field_name,
     normalize_entry,
     read_bib,
-    read_ris
+    read_ris,
+    validate_studies
 )
 
 
@@ -48,6 +53,37 @@ class TestReaderNormalizeEntries(unittest.TestCase):
         self.assertEqual(normalize_entry(bad_names), good_names)
 
 
+class TestValidateStudies(unittest.TestCase):
+
+    def entry(self, i):
+        return {
+            "primary_title": f"Title {i}", "authors": "A; B", "year": "2020", "abstract": "Abstract",
+            "journal_name": "Journal", "url": f"u{i}", "type_of_reference": "JOUR"
+        }
+
+
+    def test_valid_entries(self):
+        studies, errors = validate_studies([self.entry(1)])
+
+        self.assertEqual(errors, [])
+        self.assertEqual(studies, [StudyRecord("Title 1", "A; B", 2020, "Abstract", "Journal", "u1")])
+
+
+    def test_invalid_entries_across_chunks(self):
+        entries = [self.entry(i) for i in range(5)]
+        del entries[1]["year"]
+        entries[3]["year"] = "unknown"
+
+        with patch("screenie.studies.VALIDATION_CHUNK", 2):
+            studies, errors = validate_studies(drain(entries))
+
+        self.assertEqual([study.url for study in studies], ["u0", "u2", "u4"])
+        self.assertEqual(len(errors), 2)
+        self.assertIn("Entry 4: year", str(errors[1]))
+        # The parsed entries were released while validating
+        self.assertEqual(entries, [])
+
+
 class TestReadBib(unittest.TestCase):
 
     def test_read_bib(self):
@@ -0,0 +1,60 @@
+import unittest
+
+from screenie.recipes import Voting
+from screenie.voting import (
+        is_settled,
+        samples_to_request,
+        tally
+)
+
+
+def votes(*verdicts):
+    return [{"verdict": v, "reason": f"reason {i}"} for i, v in enumerate(verdicts)]
+
+
+class TestTally(unittest.TestCase):
+
+    def test_majority(self):
+        result = tally(votes(0, 1, 0, 0))
+        self.assertEqual(result["verdict"], 0)
+        self.assertEqual(result["reason"], "reason 0")
+        self.assertEqual(result["agreement"], 0.75)
+        self.assertEqual(result["votes"], 4)
+
+
+    def test_tie_includes(self):
+        result = tally(votes(0, 1))
+        self.assertEqual(result["verdict"], 1)
+        self.assertEqual(result["reason"], "reason 1")
+
+
+    def test_no_votes(self):
+        with self.assertRaises(ValueError):
+            tally([])
+
+
+class TestEarlyStopping(unittest.TestCase):
+
+    def setUp(self):
+        self.voting = Voting(min_votes=2, max_votes=5, min_agreement=1.0)
+
+
+    def test_is_settled(self):
+        self.assertFalse(is_settled(votes(1), 1, self.voting))
+        self.assertTrue(is_settled(votes(1, 1), 2, self.voting))
+        self.assertFalse(is_settled(votes(1, 0), 2, self.voting))
+        self.assertTrue(is_settled(votes(1, 0, 1, 0, 1), 5, self.voting))
+
+
+    def test_unparsable_samples_count(self):
+        self.assertTrue(is_settled(votes(1), 5, self.voting))
+
+
+    def test_samples_to_request(self):
+        self.assertEqual(samples_to_request(0, self.voting, None), 1)
+        self.assertEqual(samples_to_request(0, self.voting, 3), 3)
+        self.assertEqual(samples_to_request(3, self.voting, 3), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()